@@ -1,463 +1,82 @@
-from flask import Flask, g, jsonify, request, send_from_directory
-from flask_cors import CORS
-from config import config
+# 启动计时需最先导入（仅依赖标准库），以覆盖后续各组导入的耗时
+from utils.startup import startup
 
-# 蓝图
-from routes.lesson import bp as lesson_bp
-from routes.qa import bp as qa_bp
-from routes.assignment import bp as assignment_bp
-from routes.report import bp as report_bp
-from routes.auth import bp as auth_bp
-from routes.progress import bp as progress_bp
+with startup.phase("import:flask"):
+    from flask import Flask, jsonify, request
+    from flask_cors import CORS
+
+from config import config
 
-from db import SessionLocal, init_db
+with startup.phase("import:db"):
+    from db import TimedQueuePool, engine, init_db, read_engine
 
-# 新增：AI 教师相关依赖与类（参考 test.py）
+# 蓝图
+with startup.phase("import:routes"):
+    from routes.lesson import bp as lesson_bp
+    from routes.qa import bp as qa_bp
+    from routes.assignment import bp as assignment_bp
+    from routes.report import bp as report_bp
+    from routes.auth import bp as auth_bp
+    from routes.progress import bp as progress_bp
+    from routes.playback import bp as playback_bp
+    from routes.classroom import bp as classroom_bp
+    from routes.quiz import bp as quiz_bp
+    from routes.admin import bp as admin_bp
+
+with startup.phase("import:utils"):
+    from utils.db_session import close_db, close_read_db
+    from utils.hashing import password_hasher
+    from utils.progress import progress_buffer
+    from utils.access_log import AccessLog, parse_sample_rates, pipeline
+    from utils.compression import ResponseCompressor, set_compress_cache_key
+    from utils.metrics import RequestMetrics, observe_pool_wait, registry
+    from utils.static_files import StaticManifest
+    from utils.lesson_store import json_response, lesson_store, resolve_script_path, script_version
+    from utils.script_parser import is_interaction_point, parse_script_segments
+    from utils.llm import LMService
+    from utils.playback import playback_sessions
+    from utils.classroom import classrooms
+    from utils.grading import grading_queue
+    from utils.lesson_graph import lesson_graphs
+    from utils.quiz import quiz_buffer
+    from utils.profiling import request_profiler
+    from utils.memory import compiled_caches, identity_maps, memory_sources
+
+import functools
+import logging
 import os
 import re
 import sys
 import traceback
 import socket
-from dotenv import find_dotenv, load_dotenv
-
-load_dotenv(find_dotenv())
-
-# 尝试导入 LLM 相关库，若失败则提供降级占位实现
-try:
-    from langchain_community.llms import Tongyi
-    from langchain_core.runnables import RunnableSequence
-    from langchain.prompts import PromptTemplate
-
-    class QwenTurboTongyi(Tongyi):
-        model_name: str = "qwen-turbo"
-
-    class QwenMaxTongyi(Tongyi):
-        model_name: str = "qwen-max"
-    LLM_AVAILABLE = True
-except Exception:
-    # 降级占位：当无法导入 LLM 时，返回固定回答，避免服务崩溃
-    LLM_AVAILABLE = False
-
-    class QwenTurboTongyi:
-        def __init__(self, *args, **kwargs):
-            pass
-
-        def __call__(self, prompt=None, **kwargs):
-            return "（本地未配置LLM，返回占位回答）"
-
-    class RunnableSequence:
-        def __init__(self, *args, **kwargs):
-            pass
-
-        def invoke(self, payload):
-            return "（本地未配置LLM，无法生成真实回答）"
-
-    class PromptTemplate:
-        def __init__(self, template=None, input_variables=None):
-            self.template = template
-
-# 新增：将要返回给前端的 segment 剥离敏感字段（如 answer）
-def _sanitize_segment_for_client(seg: dict):
-    # 仅复制对前端可见的字段，剔除内部字段（如 answer）
-    if not isinstance(seg, dict):
-        return seg
-    allowed = {}
-    for k, v in seg.items():
-        if k == "answer":
-            continue
-        allowed[k] = v
-    # 确保至少包含基础字段
-    allowed.setdefault("scene", seg.get("scene", ""))
-    allowed.setdefault("content", seg.get("content", ""))
-    allowed.setdefault("type", seg.get("type", "dialogue"))
-    return allowed
-
-# ===== 新增：LMService - 统一封装 LLM 初始化与调用逻辑（兼容降级） =====
-class LMService:
-    """
-    轻量封装：负责 LLM 实例化、PromptTemplate 构造及 RunnableSequence 调用细节。
-    如果环境中未安装 LLM 库，提供降级占位实现，保持返回类型为字符串。
-    """
-    def __init__(self):
-        self.available = LLM_AVAILABLE
-        if self.available:
-            # 按需初始化两个 LLM 实例（teacher 与 qa）
-            self.teacher_llm = QwenTurboTongyi(temperature=0.7)
-            self.qa_llm = QwenTurboTongyi(temperature=1)
-            # QA prompt template（保留现有字符串模板含义）
-            self.qa_template = '''
-                你的名字是AI教师,当有人问问题的时候,你都会回答{question}, 内容尽量详细
-            '''
-            try:
-                self.qa_prompt = PromptTemplate(template=self.qa_template, input_variables=["question"])
-                # RunnableSequence 的组合在不同版本上行为不同，兼容处理
-                if hasattr(RunnableSequence, "__or__"):
-                    self.qa_chain = RunnableSequence(self.qa_prompt | self.qa_llm)
-                else:
-                    self.qa_chain = RunnableSequence(self.qa_prompt, self.qa_llm)
-            except Exception:
-                # 若 PromptTemplate / RunnableSequence 初始化异常，降级为简单占位链
-                self.available = False
-                self.qa_chain = RunnableSequence()
-        else:
-            # LLM 不可用时的占位实现（与现有降级兼容）
-            self.teacher_llm = None
-            self.qa_llm = None
-            self.qa_chain = RunnableSequence()
-
-    def run_qa(self, question: str, chat_history=None, script_context=None):
-        """统一调用 QA 链并返回字符串，内部兼容 invoke 或直接调用。
-        chat_history: list of {"role","text"} 最近对话
-        script_context: list of strings（与问题相关的剧本段落）
-        """
-        if not self.available:
-            return "（本地未配置LLM，无法生成真实回答）"
-        # 构造 prompt：系统指令（教师身份） + 剧本上下文 + 聊天历史 + 本次问题
-        system_inst = ("你是课程中的 AI 教师，语气亲切、专业、适合课堂讲解。回答应参考课程剧本上下文，"
-                       "并指出若有引用剧本文本需明确标注。回答需要清晰、分步并适度举例。")
-        parts = [system_inst]
-        if script_context:
-            parts.append("以下为与问题相关的课程剧本片段（仅作参考）：")
-            for idx, sc in enumerate(script_context, 1):
-                parts.append(f"片段{idx}: {sc}")
-        if chat_history:
-            parts.append("以下为最近对话历史：")
-            for h in chat_history:
-                r = h.get("role", "user")
-                t = h.get("text", "")
-                parts.append(f"{r}: {t}")
-        parts.append("问题：" + question)
-        prompt_input = "\n\n".join(parts)
-        try:
-            # 若 qa_chain 支持 invoke
-            if hasattr(self.qa_chain, "invoke"):
-                resp = self.qa_chain.invoke({"question": prompt_input})
-            else:
-                resp = self.qa_chain({"question": prompt_input})
-            return str(resp)
-        except Exception as e:
-            return f"回答生成出错：{e}"
-# ===== end LMService =====
-
-# AI 教师实现（简化自 test.py）
-class AITeacherGame:
-    def __init__(self):
-        # 使用 LMService 统一管理 LLM/Prompt/Chain 的初始化与调用，保持原行为
-        self.lm = LMService()
-        # 兼容性：保留 teacher_llm 与 qa_chain 字段以防其他代码依赖
-        self.teacher_llm = getattr(self.lm, "teacher_llm", None)
-        self.qa_chain = getattr(self.lm, "qa_chain", None)
-
-    def load_script(self, file_path: str):
-        """读取剧本文件并分段，返回段列表"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            return self._parse_script_segments(content)
-        except FileNotFoundError:
-            return []
 
-    def _parse_script_segments(self, content: str):
-        """
-        按空行分段；若段落包含以 A. B. C. 开头的选项，则提取 choices（列表）
-        并尝试解析紧随段落中或下一行的答案标注形式：【答案: X】
-        """
-        segments = []
-        if not content:
-            return segments
-
-        # 以一个或多个空行分割段落（兼容 \r\n 与 \n）
-        parts = re.split(r'\r?\n\s*\r?\n+', content)
-
-        for part in parts:
-            text = part.strip()
-            if not text:
-                continue
-
-            # 默认
-            scene = ""
-            m = re.match(r'^\s*\[(.*?)\]\s*(.*)$', text, re.DOTALL)
-            if m:
-                scene = m.group(1).strip()
-                body = m.group(2).strip()
-            else:
-                body = text
-
-            # 查找选项行（以 A. 或 A）开头的多行选择
-            lines = [ln.strip() for ln in body.splitlines() if ln.strip()]
-            choices = []
-            answer = None
-            # collect lines starting with A. / B. / C. (允许多种格式)
-            choice_pattern = re.compile(r'^\s*([A-Z])\s*[\.：:)\-]?\s*(.+)$', re.IGNORECASE)
-            other_lines = []
-            for ln in lines:
-                cm = choice_pattern.match(ln)
-                if cm:
-                    label = cm.group(1).upper()
-                    text_choice = cm.group(2).strip().strip('"“”')
-                    choices.append({'label': label, 'text': text_choice})
-                else:
-                    other_lines.append(ln)
-
-            # 尝试从 body 中提取答案标注，格式例如：【答案:B】 或 【答案: B】 或 (答案:B)
-            ans_m = re.search(r'【\s*答案\s*[:：]\s*([A-Z])\s*】', body, re.IGNORECASE)
-            if not ans_m:
-                ans_m = re.search(r'\(答案\s*[:：]?\s*([A-Z])\)', body, re.IGNORECASE)
-            if ans_m:
-                answer = ans_m.group(1).upper()
-
-            # 如果没有在 body 找到答案，也尝试在 other_lines 的末尾（可能作者在下一行单独标注）
-            if not answer and other_lines:
-                for ol in reversed(other_lines[-2:]):
-                    ans_m2 = re.search(r'【\s*答案\s*[:：]\s*([A-Z])\s*】', ol, re.IGNORECASE) or re.search(r'\(答案\s*[:：]?\s*([A-Z])\)', ol, re.IGNORECASE)
-                    if ans_m2:
-                        answer = ans_m2.group(1).upper()
-                        break
-
-            segment = {
-                'type': 'dialogue',
-                'scene': scene,
-                'content': body,
-            }
-            if choices:
-                segment['choices'] = choices
-            if answer:
-                segment['answer'] = answer  # 仅服务器端保存，响应给前端时会剥离
-            segments.append(segment)
-
-        return segments
-
-    def is_interaction_point(self, segment):
-        interaction_keywords = ['互动提问', '提问', '问题', '选择', 'A.', 'B.', 'C.']
-        content = segment['content'] if isinstance(segment, dict) else segment
-        return any(keyword in content for keyword in interaction_keywords)
-
-    def ask_question(self, question: str):
-        """通过 qa_chain 回答问题，返回字符串（由 LMService 统一处理异常与降级）"""
-        return self.lm.run_qa(question)
+logger = logging.getLogger("app")
 
-# 实例化 AI 教师（可在模块级复用）
-teacher = AITeacherGame()
-
-# 新增：AI 教师相关依赖与类（参考 test.py）
-import os
-import re
-import sys
-import traceback
-import socket
-from dotenv import find_dotenv, load_dotenv
-
-load_dotenv(find_dotenv())
-
-# 尝试导入 LLM 相关库，若失败则提供降级占位实现
-try:
-    from langchain_community.llms import Tongyi
-    from langchain_core.runnables import RunnableSequence
-    from langchain.prompts import PromptTemplate
-
-    class QwenTurboTongyi(Tongyi):
-        model_name: str = "qwen-turbo"
-
-    class QwenMaxTongyi(Tongyi):
-        model_name: str = "qwen-max"
-    LLM_AVAILABLE = True
-except Exception:
-    # 降级占位：当无法导入 LLM 时，返回固定回答，避免服务崩溃
-    LLM_AVAILABLE = False
-
-    class QwenTurboTongyi:
-        def __init__(self, *args, **kwargs):
-            pass
-
-        def __call__(self, prompt=None, **kwargs):
-            return "（本地未配置LLM，返回占位回答）"
-
-    class RunnableSequence:
-        def __init__(self, *args, **kwargs):
-            pass
-
-        def invoke(self, payload):
-            return "（本地未配置LLM，无法生成真实回答）"
-
-    class PromptTemplate:
-        def __init__(self, template=None, input_variables=None):
-            self.template = template
-
-# 新增：将要返回给前端的 segment 剥离敏感字段（如 answer）
-def _sanitize_segment_for_client(seg: dict):
-    # 仅复制对前端可见的字段，剔除内部字段（如 answer）
-    if not isinstance(seg, dict):
-        return seg
-    allowed = {}
-    for k, v in seg.items():
-        if k == "answer":
-            continue
-        allowed[k] = v
-    # 确保至少包含基础字段
-    allowed.setdefault("scene", seg.get("scene", ""))
-    allowed.setdefault("content", seg.get("content", ""))
-    allowed.setdefault("type", seg.get("type", "dialogue"))
-    return allowed
-
-# ===== 新增：LMService - 统一封装 LLM 初始化与调用逻辑（兼容降级） =====
-class LMService:
-    """
-    轻量封装：负责 LLM 实例化、PromptTemplate 构造及 RunnableSequence 调用细节。
-    如果环境中未安装 LLM 库，提供降级占位实现，保持返回类型为字符串。
-    """
-    def __init__(self):
-        self.available = LLM_AVAILABLE
-        if self.available:
-            # 按需初始化两个 LLM 实例（teacher 与 qa）
-            self.teacher_llm = QwenTurboTongyi(temperature=0.7)
-            self.qa_llm = QwenTurboTongyi(temperature=1)
-            # QA prompt template（保留现有字符串模板含义）
-            self.qa_template = '''
-                你的名字是AI教师,当有人问问题的时候,你都会回答{question}, 内容尽量详细
-            '''
-            try:
-                self.qa_prompt = PromptTemplate(template=self.qa_template, input_variables=["question"])
-                # RunnableSequence 的组合在不同版本上行为不同，兼容处理
-                if hasattr(RunnableSequence, "__or__"):
-                    self.qa_chain = RunnableSequence(self.qa_prompt | self.qa_llm)
-                else:
-                    self.qa_chain = RunnableSequence(self.qa_prompt, self.qa_llm)
-            except Exception:
-                # 若 PromptTemplate / RunnableSequence 初始化异常，降级为简单占位链
-                self.available = False
-                self.qa_chain = RunnableSequence()
-        else:
-            # LLM 不可用时的占位实现（与现有降级兼容）
-            self.teacher_llm = None
-            self.qa_llm = None
-            self.qa_chain = RunnableSequence()
-
-    def run_qa(self, question: str, chat_history=None, script_context=None):
-        """统一调用 QA 链并返回字符串，内部兼容 invoke 或直接调用。
-        chat_history: list of {"role","text"} 最近对话
-        script_context: list of strings（与问题相关的剧本段落）
-        """
-        if not self.available:
-            return "（本地未配置LLM，无法生成真实回答）"
-        # 构造 prompt：系统指令（教师身份） + 剧本上下文 + 聊天历史 + 本次问题
-        system_inst = ("你是课程中的 AI 教师，语气亲切、专业、适合课堂讲解。回答应参考课程剧本上下文，"
-                       "并指出若有引用剧本文本需明确标注。回答需要清晰、分步并适度举例。")
-        parts = [system_inst]
-        if script_context:
-            parts.append("以下为与问题相关的课程剧本片段（仅作参考）：")
-            for idx, sc in enumerate(script_context, 1):
-                parts.append(f"片段{idx}: {sc}")
-        if chat_history:
-            parts.append("以下为最近对话历史：")
-            for h in chat_history:
-                r = h.get("role", "user")
-                t = h.get("text", "")
-                parts.append(f"{r}: {t}")
-        parts.append("问题：" + question)
-        prompt_input = "\n\n".join(parts)
-        try:
-            # 若 qa_chain 支持 invoke
-            if hasattr(self.qa_chain, "invoke"):
-                resp = self.qa_chain.invoke({"question": prompt_input})
-            else:
-                resp = self.qa_chain({"question": prompt_input})
-            return str(resp)
-        except Exception as e:
-            return f"回答生成出错：{e}"
-# ===== end LMService =====
 
 # AI 教师实现（简化自 test.py）
 class AITeacherGame:
     def __init__(self):
-        # 使用 LMService 统一管理 LLM/Prompt/Chain 的初始化与调用，保持原行为
+        # 使用 LMService 统一管理 LLM/Prompt/Chain 的初始化与调用；模型客户端在首次提问时才构造
         self.lm = LMService()
+
+    @property
+    def teacher_llm(self):
         # 兼容性：保留 teacher_llm 与 qa_chain 字段以防其他代码依赖
-        self.teacher_llm = getattr(self.lm, "teacher_llm", None)
-        self.qa_chain = getattr(self.lm, "qa_chain", None)
+        return self.lm.teacher_llm
+
+    @property
+    def qa_chain(self):
+        return self.lm.qa_chain
 
     def load_script(self, file_path: str):
-        """读取剧本文件并分段，返回段列表"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            return self._parse_script_segments(content)
-        except FileNotFoundError:
-            return []
+        """读取剧本文件并分段，返回段列表（经 lesson_store 按文件版本缓存）"""
+        return lesson_store.segments(file_path)
 
     def _parse_script_segments(self, content: str):
-        """
-        按空行分段；若段落包含以 A. B. C. 开头的选项，则提取 choices（列表）
-        并尝试解析紧随段落中或下一行的答案标注形式：【答案: X】
-        """
-        segments = []
-        if not content:
-            return segments
-
-        # 以一个或多个空行分割段落（兼容 \r\n 与 \n）
-        parts = re.split(r'\r?\n\s*\r?\n+', content)
-
-        for part in parts:
-            text = part.strip()
-            if not text:
-                continue
-
-            # 默认
-            scene = ""
-            m = re.match(r'^\s*\[(.*?)\]\s*(.*)$', text, re.DOTALL)
-            if m:
-                scene = m.group(1).strip()
-                body = m.group(2).strip()
-            else:
-                body = text
-
-            # 查找选项行（以 A. 或 A）开头的多行选择
-            lines = [ln.strip() for ln in body.splitlines() if ln.strip()]
-            choices = []
-            answer = None
-            # collect lines starting with A. / B. / C. (允许多种格式)
-            choice_pattern = re.compile(r'^\s*([A-Z])\s*[\.：:)\-]?\s*(.+)$', re.IGNORECASE)
-            other_lines = []
-            for ln in lines:
-                cm = choice_pattern.match(ln)
-                if cm:
-                    label = cm.group(1).upper()
-                    text_choice = cm.group(2).strip().strip('"“”')
-                    choices.append({'label': label, 'text': text_choice})
-                else:
-                    other_lines.append(ln)
-
-            # 尝试从 body 中提取答案标注，格式例如：【答案:B】 或 【答案: B】 或 (答案:B)
-            ans_m = re.search(r'【\s*答案\s*[:：]\s*([A-Z])\s*】', body, re.IGNORECASE)
-            if not ans_m:
-                ans_m = re.search(r'\(答案\s*[:：]?\s*([A-Z])\)', body, re.IGNORECASE)
-            if ans_m:
-                answer = ans_m.group(1).upper()
-
-            # 如果没有在 body 找到答案，也尝试在 other_lines 的末尾（可能作者在下一行单独标注）
-            if not answer and other_lines:
-                for ol in reversed(other_lines[-2:]):
-                    ans_m2 = re.search(r'【\s*答案\s*[:：]\s*([A-Z])\s*】', ol, re.IGNORECASE) or re.search(r'\(答案\s*[:：]?\s*([A-Z])\)', ol, re.IGNORECASE)
-                    if ans_m2:
-                        answer = ans_m2.group(1).upper()
-                        break
-
-            segment = {
-                'type': 'dialogue',
-                'scene': scene,
-                'content': body,
-            }
-            if choices:
-                segment['choices'] = choices
-            if answer:
-                segment['answer'] = answer  # 仅服务器端保存，响应给前端时会剥离
-            segments.append(segment)
-
-        return segments
+        return parse_script_segments(content)
 
     def is_interaction_point(self, segment):
-        interaction_keywords = ['互动提问', '提问', '问题', '选择', 'A.', 'B.', 'C.']
-        content = segment['content'] if isinstance(segment, dict) else segment
-        return any(keyword in content for keyword in interaction_keywords)
+        return is_interaction_point(segment)
 
     def ask_question(self, question: str):
         """通过 qa_chain 回答问题，返回字符串（由 LMService 统一处理异常与降级）"""
@@ -466,41 +85,98 @@ class AITeacherGame:
 # 实例化 AI 教师（可在模块级复用）
 teacher = AITeacherGame()
 
+def _pool_gauge(attr):
+    def read():
+        values = {}
+        for name, eng in (("write", engine), ("read", read_engine)):
+            fn = getattr(eng.pool, attr, None)
+            if callable(fn) and (name == "write" or eng is not engine):
+                values[(name,)] = fn()
+        return values
+    return read
+
+def _register_gauges():
+    """队列深度、连接池占用等在抓取时读取的指标"""
+    TimedQueuePool.wait_observer = observe_pool_wait
+    registry.gauge("hash_pool_pending", "等待中的密码哈希任务数", lambda: password_hasher.stats()["pending"])
+    registry.gauge("progress_buffer_pending", "写后缓冲中待落库的进度条数", lambda: progress_buffer.stats()["pending"])
+    registry.gauge("quiz_buffer_pending", "待落库的测验作答记录数", lambda: quiz_buffer.stats()["pending"])
+    registry.gauge("log_queue_depth", "日志队列中待写出的记录数", lambda: pipeline.stats()["queued"])
+    registry.gauge("log_dropped", "因队列已满被丢弃的日志记录数", lambda: pipeline.stats()["dropped"])
+    registry.gauge("playback_streams_open", "打开中的流式播放连接数", lambda: playback_sessions.stats()["open"])
+    registry.gauge("classroom_subscribers", "本进程直播课堂的订阅连接数", lambda: classrooms.stats()["subscribers"])
+    registry.gauge("grading_in_flight", "本进程正在批改的作业数", lambda: grading_queue.stats()["in_flight"])
+    registry.gauge("db_pool_checked_out", "已借出的数据库连接数", _pool_gauge("checkedout"), ("pool",))
+    registry.gauge("db_pool_overflow", "超出 pool_size 的溢出连接数", _pool_gauge("overflow"), ("pool",))
+
+def _register_memory_sources(app):
+    """/__admin/memory 统计的进程内缓存与内存存储（会话记忆 MEMORIES 在定义处登记）"""
+    memory_sources.register("lesson_store", lambda: lesson_store, lambda: lesson_store.stats()["lessons"])
+    memory_sources.register("lesson_graphs", lambda: lesson_graphs, lambda: lesson_graphs.stats()["graphs"])
+    memory_sources.register("playback_sessions", lambda: playback_sessions, lambda: playback_sessions.stats()["open"])
+    memory_sources.register("classrooms", lambda: classrooms, lambda: classrooms.stats()["rooms"])
+    memory_sources.register("progress_buffer", lambda: progress_buffer, lambda: progress_buffer.stats()["pending"])
+    memory_sources.register("quiz_buffer", lambda: quiz_buffer, lambda: quiz_buffer.stats()["pending"])
+    memory_sources.register("metrics_registry", lambda: registry)
+    memory_sources.register("llm_clients", lambda: teacher.lm)
+    memory_sources.register(
+        "sqlalchemy_compiled_cache",
+        lambda: compiled_caches(engine, read_engine),
+        lambda: sum(len(c) for c in compiled_caches(engine, read_engine)),
+    )
+    memory_sources.register("sqlalchemy_identity_maps", identity_maps, lambda: sum(map(len, identity_maps())))
+    compressor = app.extensions.get("compressor")
+    if compressor is not None:
+        memory_sources.register("compressed_responses", lambda: compressor, lambda: compressor.stats()["entries"])
+    manifest = app.extensions["static_manifest"]
+    memory_sources.register("static_manifest", lambda: manifest, lambda: len(manifest.assets))
+
 def create_app():
+    # 日志写出在后台线程完成，请求线程只做非阻塞入队
+    pipeline.configure(config.LOG_LEVEL, config.LOG_QUEUE_SIZE, config.LOG_FILE)
+
     app = Flask(__name__, static_folder=None)
-<<<<<<< HEAD
-    # 允许所有来源访问 /api/*（开发阶段）
-    CORS(app, resources={r"/api/*": {"origins": "*"}})
-=======
     app.config["SECRET_KEY"] = config.SECRET_KEY
     app.config["DATABASE_URL"] = config.DATABASE_URL
-
-    init_db()
+    app.config["ADMIN_TOKEN"] = config.ADMIN_TOKEN
+
+    # AUTO_INIT_DB=0 时不在导入时建表，需预先执行 python manage.py init-db
+    if config.AUTO_INIT_DB:
+        with startup.phase("init_db"):
+            init_db()
+
+    # 按需请求剖析最先注册，剖析范围覆盖之后注册的所有钩子；关闭时不注册
+    if config.PROFILE_ENABLED:
+        request_profiler.init_app(app)
+
+    # after_request 按注册的逆序执行：访问日志最先注册、最后运行，记录压缩后的字节数与完整耗时
+    if config.ACCESS_LOG_ENABLED:
+        AccessLog(
+            default_rate=config.ACCESS_LOG_SAMPLE_RATE,
+            rates=parse_sample_rates(config.ACCESS_LOG_SAMPLE_RATES),
+        ).init_app(app)
+
+    # 指标：按蓝图/路由的请求数与耗时直方图，/__metrics 输出 Prometheus 文本格式
+    RequestMetrics().init_app(app)
+    _register_gauges()
+
+    # 响应压缩在访问日志之后注册，因此先于访问日志运行、处理最终响应体
+    if config.COMPRESS_ENABLED:
+        ResponseCompressor(
+            min_size=config.COMPRESS_MIN_SIZE,
+            level=config.COMPRESS_LEVEL,
+            mimetypes=config.COMPRESS_MIMETYPES,
+            cache_entries=config.COMPRESS_CACHE_ENTRIES,
+        ).init_app(app)
 
     # 允许所有来源访问 /api/*（开发阶段）
     CORS(app, resources={r"/api/*": {"origins": "*"}})
 
-    @app.before_request
-    def bind_session():
-        g.db = SessionLocal()
-
+    # 数据库会话按需创建（见 utils.db_session），这里只负责请求结束时的收尾
     @app.teardown_request
     def cleanup_session(exception=None):
-        session = g.pop("db", None)
-        if session is None:
-            return
-        try:
-            if exception:
-                session.rollback()
-            else:
-                try:
-                    session.commit()
-                except Exception:
-                    session.rollback()
-                    raise
-        finally:
-            session.close()
->>>>>>> 9043746 (更新：前端结构和登录逻辑)
+        close_read_db()
+        close_db(exception)
 
     # 蓝图注册并加上统一前缀 /api
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
@@ -508,24 +184,35 @@ def create_app():
     app.register_blueprint(qa_bp, url_prefix="/api/qa")
     app.register_blueprint(assignment_bp, url_prefix="/api/assignment")
     app.register_blueprint(report_bp, url_prefix="/api/report")
-<<<<<<< HEAD
-=======
     app.register_blueprint(progress_bp, url_prefix="/api/progress")
->>>>>>> 9043746 (更新：前端结构和登录逻辑)
+    app.register_blueprint(playback_bp, url_prefix="/api/playback")
+    app.register_blueprint(classroom_bp, url_prefix="/api/classroom")
+    app.register_blueprint(quiz_bp, url_prefix="/api/quiz")
+    app.register_blueprint(admin_bp, url_prefix="/__admin")
+
+    # 作业批改使用教师模型；批改线程按进程惰性启动（gunicorn 在 post_fork 中启动）
+    grading_queue.configure(teacher.lm.complete)
+
+    # 剧本在启动时解析；生产模式（gunicorn preload）下于 fork 前完成，worker 共享
+    with startup.phase("preload_lessons"):
+        lesson_store.preload(config.PRELOAD_LESSONS)
+    app.extensions["lesson_store"] = lesson_store
 
-    # 静态前端文件目录（项目根的 frontend）
-    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    frontend_dir = os.path.join(project_root, "frontend")
+    # 静态前端：把 frontend/dist 载入内存清单（含 br/gzip 预压缩变体）
+    with startup.phase("static_manifest"):
+        static_manifest = StaticManifest(config.FRONTEND_DIST_DIR)
+    app.extensions["static_manifest"] = static_manifest
+    _register_memory_sources(app)
 
     # 提供静态前端，方便同源访问 API（SPA 支持）
     @app.route("/", defaults={"path": "index.html"})
     @app.route("/<path:path>")
     def serve_frontend(path):
         # 优先返回文件，找不到则降级返回 index.html（支持 SPA 路由）
-        target = os.path.join(frontend_dir, path)
-        if os.path.exists(target) and os.path.isfile(target):
-            return send_from_directory(frontend_dir, path)
-        return send_from_directory(frontend_dir, "index.html")
+        asset = static_manifest.lookup(path)
+        if asset is None:
+            return jsonify({"error": "not found", "path": path}), 404
+        return static_manifest.respond(asset, request)
 
     @app.after_request
     def add_cors_headers(response):
@@ -535,14 +222,6 @@ def create_app():
         response.headers["Access-Control-Allow-Headers"] = "Content-Type,Authorization"
         return response
 
-    # 新增：记录每次请求，便于调试（打印方法、路径、远程地址）
-    @app.before_request
-    def log_request_info():
-        try:
-            print(f"REQ {request.method} {request.path} from {request.remote_addr}")
-        except Exception:
-            pass
-
     # 新增：快速响应 OPTIONS（CORS 预检）
     @app.route('/<path:any>', methods=['OPTIONS'])
     def handle_options(any):
@@ -564,31 +243,22 @@ def create_app():
 
     return app
 
-app = create_app()
+with startup.phase("create_app"):
+    app = create_app()
 
 # 简单健康检查（文本），便于 curl / 浏览器快速验证
 @app.route("/api/health", methods=["GET"])
 def api_health():
-    print("DEBUG: /api/health requested from", request.remote_addr)
+    logger.debug("/api/health requested from %s", request.remote_addr)
     return "ok", 200
 
 # 简单健康检查/回显接口，前端可用它来检测后端地址是否可达
 @app.route("/api/ping", methods=["GET"])
 def api_ping():
-    print("DEBUG: /api/ping requested from", request.remote_addr)
+    logger.debug("/api/ping requested from %s", request.remote_addr)
     return jsonify({"ok": True, "host": request.host, "url": request.host_url})
 
-# 新增辅助函数：解析剧本路径并读取文本，避免重复代码
-def resolve_script_path(req_file: str) -> str:
-    """把相对名优先解析到 project/database，再 fallback 到 backend 目录；绝对路径保持不变"""
-    if os.path.isabs(req_file):
-        return req_file
-    backend_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.abspath(os.path.join(backend_dir, ".."))
-    database_path = os.path.join(project_root, "database", req_file)
-    backend_path = os.path.join(backend_dir, req_file)
-    return database_path if os.path.exists(database_path) else backend_path
-
+# 新增辅助函数：读取剧本文本，避免重复代码
 def read_script_text(script_path: str):
     """读取文件原文，失败返回 None"""
     try:
@@ -602,35 +272,25 @@ def read_script_text(script_path: str):
 def api_segments():
     """
     参数:
-      file: 可选，剧本文件相对或绝对路径（默认 database 下的 DAY1.txt）
+      file: 可选，剧本目录下的文件名（默认 DAY1.txt）
     返回: JSON 列表 [{scene, content, type, is_interaction}, ...]
     """
     req_file = request.args.get("file", "DAY1.txt")
     script_path = resolve_script_path(req_file)
 
-    segments = teacher.load_script(script_path)
-    out = []
-    for seg in segments:
-        # 计算并返回基础字段，同时剥离答案
-        c = _sanitize_segment_for_client(seg)
-        c.update({
-            "scene": seg.get("scene", ""),
-            "content": seg.get("content", ""),
-            "type": seg.get("type", "dialogue"),
-            "is_interaction": teacher.is_interaction_point(seg) or ('choices' in seg)
-        })
-        # 如果有 choices，返回 choices 给客户端用于渲染选项
-        if 'choices' in seg:
-            c['choices'] = seg['choices']
-        out.append(c)
-    return jsonify({"path": script_path, "segments": out})
+    # 前端视图（已剥离答案、含 is_interaction 与 choices）在解析时一次性序列化
+    lesson = lesson_store.get(script_path)
+    if lesson is None:
+        return jsonify({"path": script_path, "segments": []})
+    set_compress_cache_key("segments", script_path, lesson.version)
+    return json_response(lesson.listing_body)
 
 # 新增接口：获取剧本原文内容，便于前端完整展示
 @app.route("/api/ai_teacher/script", methods=["GET"])
 def api_script():
     """
     参数:
-      file: 可选，剧本文件相对或绝对路径（默认 database 下的 DAY1.txt）
+      file: 可选，剧本目录下的文件名（默认 DAY1.txt）
     返回: {"path": ..., "content": "...}
     """
     req_file = request.args.get("file", "DAY1.txt")
@@ -639,8 +299,32 @@ def api_script():
     content = read_script_text(script_path)
     if content is None:
         return jsonify({"error": "file not found or unreadable", "path": script_path}), 404
+    version = script_version(script_path)
+    if version:
+        set_compress_cache_key("script", script_path, version)
     return jsonify({"path": script_path, "content": content})
 
+def prepare_ask(data: dict):
+    """
+    解析问答请求并准备上下文（同步与 ASGI 两条服务路径共用）。
+    返回 (question, client_id, chat_hist, script_ctx)；question 为空时不做其他处理。
+    """
+    if not isinstance(data, dict):
+        data = {}
+    question = (data.get("question") or "").strip()
+    client_id = (data.get("client_id") or "").strip()
+    file_name = data.get("file", "DAY1.txt")
+    if not question:
+        return "", client_id, [], []
+
+    # 构造上下文：先从记忆取最近对话，再用简单检索从剧本获取相关片段
+    chat_hist = get_chat_history(client_id, last_n=8)
+    script_ctx = retrieve_script_context(question, file_name=file_name, top_k=3)
+
+    # 记录用户问题到记忆
+    append_memory(client_id, "user", question)
+    return question, client_id, chat_hist, script_ctx
+
 # 新增接口：问答，前端将用户问题发送到此接口获取 AI 回答
 @app.route("/api/ai_teacher/ask", methods=["POST"])
 def api_ask():
@@ -651,32 +335,17 @@ def api_ask():
       {"answer": "...}
     """
     try:
-        # 打印请求来源与部分头信息，便于浏览器端调试
-        print("DEBUG: /api/ai_teacher/ask from", request.remote_addr)
-        try:
-            # 打印一些关键头部（避免泄露敏感信息）
-            for h in ("origin", "referer", "user-agent", "content-type"):
-                v = request.headers.get(h)
-                if v:
-                    print(f"DEBUG HEADER {h}: {v}")
-        except Exception:
-            pass
+        # 记录请求来源与部分头信息，便于浏览器端调试（DEBUG 级别，默认不输出）
+        if logger.isEnabledFor(logging.DEBUG):
+            # 只记录一些关键头部（避免泄露敏感信息）
+            headers = {h: request.headers.get(h) for h in ("origin", "referer", "user-agent", "content-type")}
+            logger.debug("/api/ai_teacher/ask from %s headers=%s", request.remote_addr, headers)
 
         data = request.get_json(force=True, silent=True) or {}
-        question = (data.get("question") or "").strip()
-        client_id = (data.get("client_id") or "").strip()
-        file_name = data.get("file", "DAY1.txt")
-
+        question, client_id, chat_hist, script_ctx = prepare_ask(data)
         if not question:
             return jsonify({"error": "question required"}), 400
 
-        # 构造上下文：先从记忆取最近对话，再用简单检索从剧本获取相关片段
-        chat_hist = get_chat_history(client_id, last_n=8)
-        script_ctx = retrieve_script_context(question, file_name=file_name, top_k=3)
-
-        # 记录用户问题到记忆
-        append_memory(client_id, "user", question)
-
         # 调用 LMService（会合并系统 prompt + script_ctx + chat_hist + question）
         answer = teacher.lm.run_qa(question, chat_history=chat_hist, script_context=script_ctx)
 
@@ -688,8 +357,7 @@ def api_ask():
         resp.headers["Access-Control-Allow-Origin"] = "*"
         return resp
     except Exception as e:
-        print("ERROR in /api/ai_teacher/ask:", e)
-        traceback.print_exc()
+        logger.exception("error in /api/ai_teacher/ask: %s", e)
         return jsonify({"error": "internal error"}), 500
 
 @app.route("/api/ai_teacher/start", methods=["GET"])
@@ -697,7 +365,7 @@ def api_start():
     """
     启动授课：返回首段元数据和总段数（不返回整篇文本，避免前端一次性展示全部段落）
     参数:
-      file: 可选，剧本文件相对名或绝对路径（默认 database 下的 DAY1.txt）
+      file: 可选，剧本目录下的文件名（默认 DAY1.txt）
     返回:
       {
         "path": "...",
@@ -708,57 +376,32 @@ def api_start():
     req_file = request.args.get("file", "DAY1.txt")
     script_path = resolve_script_path(req_file)
 
-    # 仍然读取文件以检查可读性，但不将全文返回给前端
-    full_text = read_script_text(script_path)
-    if full_text is None:
+    # lesson_store 在文件不存在或不可读时返回 None；命中缓存时无需重新读取全文
+    lesson = lesson_store.get(script_path)
+    if lesson is None:
         return jsonify({"error": "file not found or unreadable", "path": script_path}), 404
-
-    segments = teacher.load_script(script_path)
-    if not segments:
+    if not lesson.segments:
         return jsonify({"error": "no segments found", "path": script_path}), 404
-
-    first_seg = segments[0]
-    first_out = {
-        "scene": first_seg.get("scene", ""),
-        "content": first_seg.get("content", ""),
-        "type": first_seg.get("type", "dialogue"),
-        "is_interaction": teacher.is_interaction_point(first_seg)
-    }
-
-    return jsonify({
-        "path": script_path,
-        "first": first_out,
-        "total": len(segments),
-    })
+    return json_response(lesson.start_body)
 
 @app.route("/api/ai_teacher/segment/<int:idx>", methods=["GET"])
 def api_segment(idx):
     """
     按索引返回单段内容
     参数:
-      file: 可选，剧本文件相对或绝对路径（默认 database 下的 DAY1.txt）
+      file: 可选，剧本目录下的文件名（默认 DAY1.txt）
     返回:
       {"index": idx, "segment": {...}}
     """
     req_file = request.args.get("file", "DAY1.txt")
     script_path = resolve_script_path(req_file)
 
-    segments = teacher.load_script(script_path)
-    total = len(segments)
+    lesson = lesson_store.get(script_path)
+    total = lesson.total if lesson is not None else 0
     if idx < 0 or idx >= total:
         return jsonify({"error": "index out of range", "total": total}), 404
-
-    seg = segments[idx]
-    out = {
-        "index": idx,
-        "scene": seg.get("scene", ""),
-        "content": seg.get("content", ""),
-        "type": seg.get("type", "dialogue"),
-        "is_interaction": teacher.is_interaction_point(seg),
-        "path": script_path,
-        "total": total
-    }
-    return jsonify(out)
+    # 单段响应体在剧本解析时已序列化
+    return json_response(lesson.segment_bodies[idx])
 
 @app.route("/api/ai_teacher/next", methods=["POST"])
 def api_next():
@@ -797,8 +440,8 @@ def api_next():
         step = 1
 
     script_path = resolve_script_path(req_file)
-    segments = teacher.load_script(script_path)
-    total = len(segments)
+    lesson = lesson_store.get(script_path)
+    total = lesson.total if lesson is not None else 0
 
     if total == 0:
         return jsonify({"error": "no segments found", "path": script_path}), 404
@@ -809,19 +452,9 @@ def api_next():
 
     if next_idx >= total:
         # 已经到末尾
-        return jsonify({"done": True, "total": total})
-
-    seg = segments[next_idx]
-    return jsonify({
-        "done": False,
-        "index": next_idx,
-        "scene": seg.get("scene", ""),
-        "content": seg.get("content", ""),
-        "type": seg.get("type", "dialogue"),
-        "is_interaction": teacher.is_interaction_point(seg),
-        "total": total,
-        "path": script_path
-    })
+        return json_response(lesson.done_body)
+
+    return json_response(lesson.next_bodies[next_idx])
 
 # 新增：简单状态接口，便于调试（不要返回敏感信息）
 @app.route("/__status", methods=["GET"])
@@ -837,7 +470,23 @@ def __status():
 			port = int(getattr(config, "PORT", None) or os.environ.get("PORT", 5000))
 		except Exception:
 			port = 5000
-	return jsonify({"ok": True, "port": int(port), "host_ip": LOCAL_IP, "message": "backend running"})
+	return jsonify({
+		"ok": True,
+		"port": int(port),
+		"host_ip": get_local_ip(),
+		"message": "backend running",
+		"hash_pool": password_hasher.stats(),
+		"progress_buffer": progress_buffer.stats(),
+		"log_queue": pipeline.stats(),
+		"lessons": lesson_store.stats(),
+		"playback": playback_sessions.stats(),
+		"classrooms": classrooms.stats(),
+		"grading": grading_queue.stats(),
+		"quiz": quiz_buffer.stats(),
+		"profiler": request_profiler.stats(),
+		"lesson_graph": lesson_graphs.stats(),
+		"startup": startup.report(),
+	})
 
 # 在模块顶层（在 load_dotenv 之后）添加
 ACTIVE_PORT = None
@@ -858,7 +507,9 @@ def _tcp_port_free(port: int) -> bool:
 			pass
 		return False
 
-# 获取本机对外可见IP（UDP连接到公网上的地址），失败时退回 hostname 解析
+# 获取本机对外可见IP（UDP连接到公网上的地址），失败时退回 hostname 解析；
+# 首次调用时才探测并缓存结果，导入模块不产生网络访问
+@functools.lru_cache(maxsize=1)
 def get_local_ip():
 	"""获取本机对外可见IP（UDP连接到公网上的地址），失败时退回 hostname 解析"""
 	try:
@@ -873,19 +524,9 @@ def get_local_ip():
 		except Exception:
 			return "127.0.0.1"
 
-# 预先计算本机IP供状态接口使用
-LOCAL_IP = get_local_ip()
-
-# 剧本缓存与简单检索（用于为 LLM 提供相关剧本上下文）
-SCRIPT_CACHE = {}
-
+# 剧本简单检索（用于为 LLM 提供相关剧本上下文），分段来自 lesson_store
 def load_script_segments_cached(file_name="DAY1.txt"):
-    if file_name in SCRIPT_CACHE:
-        return SCRIPT_CACHE[file_name]
-    path = resolve_script_path(file_name)
-    segs = teacher.load_script(path)
-    SCRIPT_CACHE[file_name] = segs
-    return segs
+    return lesson_store.segments(resolve_script_path(file_name))
 
 def retrieve_script_context(question: str, file_name="DAY1.txt", top_k: int = 3):
     """
@@ -910,6 +551,7 @@ def retrieve_script_context(question: str, file_name="DAY1.txt", top_k: int = 3)
 
 # 会话记忆（内存实现，按 client_id 存储最近消息）
 MEMORIES = {}  # client_id -> list of {"role": "user"/"assistant", "text": "..."}
+memory_sources.register("chat_memories", lambda: MEMORIES)
 
 def append_memory(client_id: str, role: str, text: str, limit: int = 20):
     if not client_id:
@@ -924,6 +566,10 @@ def get_chat_history(client_id: str, last_n: int = 10):
         return []
     return MEMORIES.get(client_id, [])[-last_n:]
 
+# 启动耗时汇总：各组导入、建表、剧本预解析等阶段（/__status 中同样可见）
+startup.mark_ready()
+logger.info("startup", extra={"fields": {"event": "startup", **startup.report()}})
+
 if __name__ == "__main__":
 	try:
 		port = getattr(config, "PORT", None)
@@ -953,7 +599,7 @@ if __name__ == "__main__":
 	try:
 		# 把最终端口写入 ACTIVE_PORT，便于状态接口或日志使用
 		ACTIVE_PORT = int(port)
-		print(f"Starting backend on 0.0.0.0:{ACTIVE_PORT} - frontend served from / (project/frontend)")
+		print(f"Starting backend on 0.0.0.0:{ACTIVE_PORT} - frontend served from / ({config.FRONTEND_DIST_DIR})")
 		print("DEBUG: sys.executable =", sys.executable)
 		print("DEBUG: cwd =", os.getcwd())
 		try:
@@ -964,14 +610,10 @@ if __name__ == "__main__":
 		print(f"DEBUG: hostname={hostname}, host_ip={host_ip}")
 		print("DEBUG: You can test with: curl -i http://localhost:{port}/__status")
 		print("DEBUG: or: curl -i http://127.0.0.1:{port}/api/echo")
-		# debug=True 仍保留，但你可在生产关闭
-		app.run(host="0.0.0.0", port=int(ACTIVE_PORT), debug=True, threaded=True)
+		# 开发服务器（DEBUG 默认开启）；生产环境请使用 gunicorn -c gunicorn.conf.py wsgi:app
+		app.run(host="0.0.0.0", port=int(ACTIVE_PORT), debug=config.DEBUG, threaded=True)
 	except Exception as e:
 		print("Failed to start backend:", e)
 		traceback.print_exc()
 		print("提示：如果是 Windows，请确认防火墙没有阻止 Python 监听该端口；在 PowerShell 可运行：netstat -ano | findstr :{}".format(port))
-<<<<<<< HEAD
-		raise
-=======
 		raise
->>>>>>> 9043746 (更新：前端结构和登录逻辑)
@@ -0,0 +1,215 @@
+"""
+ASGI 入口：/api/ai_teacher/ask 在事件循环中异步等待大模型，/api/classroom/<code>/stream 的订阅连接
+在事件循环中等待广播（不占线程，整班直播走这里），其余路由交给原 Flask 应用（线程池执行）。
+需要可选依赖 asgiref、httpx 与 uvicorn（在 backend 目录下运行）:
+  uvicorn asgi:application --host 0.0.0.0 --port 8080 --workers 2
+  gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:application
+"""
+import asyncio
+import json
+import logging
+import re
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app, append_memory, prepare_ask
+from config import config
+from db import ReadSessionLocal
+from models import User
+from utils.async_llm import AsyncLLMClient
+from utils.auth import verify_token
+from utils.classroom import classrooms
+from utils.lesson_store import json_bytes
+from utils.llm import render_qa_prompt
+from utils.memory import memory_sources
+from utils.metrics import HTTP_LATENCY, HTTP_REQUESTS, registry
+
+logger = logging.getLogger("app")
+
+# 与 Flask 应用 add_cors_headers 保持一致
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-methods", b"GET,POST,OPTIONS"),
+    (b"access-control-allow-headers", b"Content-Type,Authorization"),
+]
+MAX_BODY_SIZE = 64 * 1024
+ASK_PATH = "/api/ai_teacher/ask"
+CLASSROOM_STREAM_RE = re.compile(r"^/api/classroom/([^/]+)/stream$")
+CLASSROOM_STREAM_ROUTE = "/api/classroom/<code>/stream"
+SSE_HEADERS = [
+    (b"content-type", b"text/event-stream"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),
+]
+KEEPALIVE = b": keepalive\n\n"
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    """
+    asgiref 默认把所有 WSGI 调用串行到同一个线程（thread_sensitive）。
+    这里用公开的 ThreadSensitiveContext 让每个请求在各自的线程中执行，并用信号量限制同时执行的请求数
+    """
+
+    def __init__(self, wsgi_application, threads: int):
+        super().__init__(wsgi_application)
+        self.threads = threads
+        self._slots = None  # 信号量需在事件循环中创建
+
+    async def __call__(self, scope, receive, send):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.threads)
+        async with self._slots:
+            async with ThreadSensitiveContext():
+                await super().__call__(scope, receive, send)
+
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_SIZE:
+            raise ValueError("request body too large")
+        if not message.get("more_body"):
+            return body
+
+
+async def _send_json(send, status: int, payload: dict):
+    body = json_bytes(payload)
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    await send({"type": "http.response.start", "status": status, "headers": headers + CORS_HEADERS})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _wait_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def _open_classroom(scope, code: str):
+    """
+    线程池中执行：与 routes.classroom.stream 相同的令牌校验（Authorization 头或 access_token 参数）与课堂读取。
+    返回 (200, room) 或 (状态码, 错误内容)
+    """
+    headers = dict(scope.get("headers") or [])
+    auth_header = headers.get(b"authorization", b"").decode("latin1")
+    if auth_header.startswith("Bearer "):
+        token = auth_header.split(" ", 1)[1].strip()
+    else:
+        token = (parse_qs(scope.get("query_string", b"").decode("latin1")).get("access_token") or [""])[0].strip()
+    if not token:
+        return 401, {"error": "authorization required"}
+    with app.app_context():
+        user_id = verify_token(token)
+    if not user_id:
+        return 401, {"error": "invalid or expired token"}
+    session = ReadSessionLocal()
+    try:
+        if session.get(User, user_id) is None:
+            return 404, {"error": "user not found"}
+        room = classrooms.get(session, code.upper())
+    finally:
+        session.close()
+    if room is None:
+        return 404, {"error": "classroom not found"}
+    return 200, room
+
+
+class AITeacherASGI:
+    """问答接口走原生异步实现，共享 Flask 应用的剧本仓库、会话记忆与指标；其他请求全部转交 Flask"""
+
+    def __init__(self, flask_app):
+        self.flask = ThreadedWsgiToAsgi(flask_app, threads=config.ASGI_WSGI_THREADS)
+        self.llm = AsyncLLMClient(
+            base_url=config.LLM_BASE_URL,
+            api_key=config.LLM_API_KEY,
+            model=config.LLM_MODEL,
+            temperature=config.LLM_TEMPERATURE,
+            timeout=config.LLM_TIMEOUT,
+            max_connections=config.LLM_MAX_CONNECTIONS,
+        )
+        registry.gauge("llm_in_flight", "ASGI 路径上等待模型返回的问答数", lambda: self.llm.in_flight)
+        memory_sources.register("async_llm_client", lambda: self.llm)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http" and scope["path"] == ASK_PATH and scope["method"] == "POST":
+            await self._ask(receive, send)
+        elif scope["type"] == "http" and scope["method"] == "GET" and CLASSROOM_STREAM_RE.match(scope["path"]):
+            await self._classroom_stream(scope, receive, send, CLASSROOM_STREAM_RE.match(scope["path"]).group(1))
+        else:
+            await self.flask(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.llm.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _ask(self, receive, send):
+        started = time.perf_counter()
+        status = 200
+        try:
+            try:
+                data = json.loads(await _read_body(receive) or b"{}")
+            except ValueError:
+                data = {}
+            # 剧本检索可能读取并解析剧本文件，放到线程池执行，不阻塞事件循环
+            loop = asyncio.get_running_loop()
+            question, client_id, chat_hist, script_ctx = await loop.run_in_executor(None, prepare_ask, data)
+            if not question:
+                status = 400
+                await _send_json(send, status, {"error": "question required"})
+                return
+            answer = await self.llm.chat(render_qa_prompt(question, chat_hist, script_ctx))
+            append_memory(client_id, "assistant", answer)
+            await _send_json(send, status, {"answer": answer})
+        except Exception as e:
+            logger.exception("error in %s (asgi): %s", ASK_PATH, e)
+            status = 500
+            await _send_json(send, status, {"error": "internal error"})
+        finally:
+            HTTP_LATENCY.observe(time.perf_counter() - started, ("asgi", ASK_PATH, "POST"))
+            HTTP_REQUESTS.inc(("asgi", ASK_PATH, "POST", str(status)))
+
+    async def _classroom_stream(self, scope, receive, send, code: str):
+        """直播课堂订阅：与同步路由的事件格式一致；等待广播时不占线程，不受 CLASSROOM_MAX_THREAD_SUBSCRIBERS 限制"""
+        loop = asyncio.get_running_loop()
+        status, result = await loop.run_in_executor(None, _open_classroom, scope, code)
+        HTTP_REQUESTS.inc(("asgi", CLASSROOM_STREAM_ROUTE, "GET", str(status)))
+        if status != 200:
+            await _send_json(send, status, result)
+            return
+        room = classrooms.subscribe(result, thread=False)
+        disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+        heartbeat = config.PLAYBACK_HEARTBEAT
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": SSE_HEADERS + CORS_HEADERS})
+            seen, frame, closed = room.wait(-1, 0)  # 当前状态的一致快照，不阻塞
+            await send({"type": "http.response.body", "body": b"retry: 3000\n\n" + frame, "more_body": True})
+            while not closed:
+                waiter = asyncio.ensure_future(room.wait_async(seen, heartbeat))
+                await asyncio.wait({waiter, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.done():
+                    waiter.cancel()
+                    return
+                version, frame, closed = waiter.result()
+                if version == seen and not closed:
+                    frame = KEEPALIVE
+                seen = version
+                await send({"type": "http.response.body", "body": frame, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            disconnected.cancel()
+            classrooms.unsubscribe(room, thread=False)
+
+
+application = AITeacherASGI(app)
@@ -0,0 +1,100 @@
+"""
+冷启动基准：在全新子进程中计时“导入 app + 处理第一个请求”，取多次运行的中位数，与基线比较。
+超过基线 × 容差时以退出码 1 结束，可直接作为 CI 步骤。
+基线是绝对毫秒数，只在生成它的机器上有意义；换机器或 CI 规格后先用 --update 重新生成。
+用法（在 backend 目录下）:
+  python bench/cold_start.py                    # 对比 bench/cold_start_baseline.json
+  python bench/cold_start.py --runs 9 --update  # 在基准机器上重新生成基线
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(BACKEND_DIR, "bench", "cold_start_baseline.json")
+
+# 子进程内执行：计时从解释器启动后开始，到第一个请求返回为止
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app
+client = app.app.test_client()
+status = client.get("/api/ai_teacher/segment/0").status_code
+elapsed = (time.perf_counter() - started) * 1000
+print(json.dumps({"status": status, "ms": elapsed, "phases": app.startup.report()["phases"]}))
+"""
+
+MODES = {
+    # 默认配置：导入时建表、预解析剧本、扫描前端资源
+    "default": {},
+}
+
+
+def _run_once(mode: str, db_url: str) -> dict:
+    env = dict(os.environ)
+    env.update(MODES[mode])
+    env.update({"DATABASE_URL": db_url, "ACCESS_LOG_ENABLED": "0", "LOG_LEVEL": "WARNING"})
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    if result["status"] != 200:
+        raise RuntimeError(f"first request failed in {mode} mode: {result}")
+    return result
+
+
+def measure(mode: str, runs: int) -> dict:
+    db_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "cold_start.db")
+    subprocess.run(
+        [sys.executable, "manage.py", "init-db"], cwd=BACKEND_DIR, check=True,
+        env={**os.environ, "DATABASE_URL": db_url}, stdout=subprocess.DEVNULL,
+    )
+    _run_once(mode, db_url)  # 预热磁盘缓存与 __pycache__
+    samples = [_run_once(mode, db_url) for _ in range(runs)]
+    median = statistics.median(s["ms"] for s in samples)
+    # 取最接近中位数的一次运行的阶段明细
+    closest = min(samples, key=lambda s: abs(s["ms"] - median))
+    return {"median_ms": round(median, 1), "phases": closest["phases"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modes", default="default")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=None, help="允许的倍数，缺省取基线文件中的值")
+    parser.add_argument("--update", action="store_true", help="用本次结果覆盖基线")
+    args = parser.parse_args()
+
+    results = {mode: measure(mode, args.runs) for mode in args.modes.split(",") if mode in MODES}
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+    if args.update:
+        baseline = {"tolerance": args.tolerance or 1.5}
+        baseline.update({mode: r["median_ms"] for mode, r in results.items()})
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    tolerance = args.tolerance or baseline.get("tolerance", 1.5)
+    failed = False
+    for mode, r in results.items():
+        limit = baseline.get(mode)
+        if limit is None:
+            continue
+        ok = r["median_ms"] <= limit * tolerance
+        failed |= not ok
+        print(f"{mode}: {r['median_ms']}ms (baseline {limit}ms x {tolerance}) {'ok' if ok else 'REGRESSION'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+数据库引擎档案基准：在临时 SQLite 库上并发读写，对比各档案的每秒读/写次数与锁冲突。
+用法（在 backend 目录下）:
+  python bench/db_profiles.py --duration 5 --writers 4 --readers 8
+  python bench/db_profiles.py --url postgresql://...   # 对服务型数据库只跑连接池档案
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# 避免导入 db 模块时指向真实数据库
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "bench_unused.db"))
+
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from db import Base, build_engine, sqlite_pragmas  # noqa: E402
+from models import LessonProgress, User  # noqa: E402
+from utils.progress import upsert_progress  # noqa: E402
+
+SQLITE_PROFILES = {
+    # 旧行为：回滚日志 + 无忙等待，写事务期间读者会被阻塞
+    "rollback-journal": {"journal_mode": "DELETE", "synchronous": "FULL", "busy_timeout": 0},
+    "wal": sqlite_pragmas(),
+}
+LESSONS = ["nn", "lr"]
+
+
+def _seed(engine, users: int):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"email": f"bench{i}@example.com", "display_name": f"bench{i}", "password_hash": "x"}
+            for i in range(users)
+        ])
+
+
+def run_profile(url, pragmas, writers, readers, duration, users):
+    write_engine = build_engine(url, pragmas)
+    read_engine = build_engine(url, pragmas, readonly=True)
+    _seed(write_engine, users)
+    WriteSession = sessionmaker(bind=write_engine, autoflush=False)
+    ReadSession = sessionmaker(bind=read_engine, autoflush=False)
+
+    counts = {"writes": 0, "reads": 0, "write_errors": 0, "read_errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def writer():
+        while time.perf_counter() < deadline:
+            session = WriteSession()
+            try:
+                upsert_progress(session, [{
+                    "user_id": random.randint(1, users),
+                    "lesson_id": random.choice(LESSONS),
+                    "current_index": random.randint(0, 14),
+                }])
+                session.commit()
+                bump("writes")
+            except OperationalError:
+                session.rollback()
+                bump("write_errors")
+            finally:
+                session.close()
+
+    def reader():
+        while time.perf_counter() < deadline:
+            session = ReadSession()
+            try:
+                session.query(LessonProgress).filter_by(user_id=random.randint(1, users)).all()
+                bump("reads")
+            except OperationalError:
+                bump("read_errors")
+            finally:
+                session.close()
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    write_engine.dispose()
+    read_engine.dispose()
+
+    return {
+        "writes_per_sec": round(counts["writes"] / elapsed, 1),
+        "reads_per_sec": round(counts["reads"] / elapsed, 1),
+        "write_errors": counts["write_errors"],
+        "read_errors": counts["read_errors"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--url", help="服务型数据库 URL（需为空库）；缺省时对比 SQLite 档案")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    results = {}
+    if args.url:
+        results["pool"] = run_profile(args.url, None, args.writers, args.readers, args.duration, args.users)
+    else:
+        for name, pragmas in SQLITE_PROFILES.items():
+            with tempfile.TemporaryDirectory() as tmp:
+                url = "sqlite:///" + os.path.join(tmp, "bench.db")
+                results[name] = run_profile(url, pragmas, args.writers, args.readers, args.duration, args.users)
+
+    print(f"{'profile':<18}{'writes/s':>10}{'reads/s':>10}{'w-err':>8}{'r-err':>8}")
+    for name, r in results.items():
+        print(f"{name:<18}{r['writes_per_sec']:>10}{r['reads_per_sec']:>10}{r['write_errors']:>8}{r['read_errors']:>8}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+"""
+接口基准：在临时 SQLite 库上启动应用（create_app），模型调用替换为进程内的假 LLM（固定延迟），
+按场景逐个压测各蓝图（auth、progress、report、ai_teacher、qa、assignment 等），
+输出每个场景的 p50/p95/p99 延迟与每秒请求数，并与 JSON 基线比较；超过容差时以退出码 1 结束。
+基线是在某一台机器上测得的绝对值（延迟、吞吐），只能与同一台机器（同样的 CPU、Python 与并发参数）的结果比较；
+换机器或 CI 规格后先用 --update 重新生成，基线中记录的机器信息与当前不一致时会给出警告。
+每个场景开始前刷新写后缓冲并等待批改队列清空，前一场景留下的后台写库不会计入下一场景。
+用法（在 backend 目录下）:
+  python bench/run_api_bench.py                          # 对比 bench/api_baseline.json
+  python bench/run_api_bench.py --only progress,report   # 只跑名称以这些前缀开头的场景
+  python bench/run_api_bench.py --concurrency 16 --duration 5 --update   # 在基准机器上重新生成基线
+"""
+import argparse
+import http.client
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(BACKEND_DIR, "bench", "api_baseline.json")
+sys.path.insert(0, BACKEND_DIR)
+
+from serve_bench import _free_port, _pct  # noqa: E402
+
+
+class FakeLLM:
+    """替代教师模型与 QA 链：固定延迟后返回固定回答；批改提示返回每份作业的 JSON 结果"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.calls = 0
+
+    def invoke(self, prompt, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        text = prompt["question"] if isinstance(prompt, dict) else prompt
+        if "<<<作业 " in text:
+            ids = [int(m) for m in re.findall(r"^<<<作业 (\d+) ", text, re.MULTILINE)]
+            return json.dumps([{"id": i, "score": 90, "feedback": "完成得不错"} for i in ids], ensure_ascii=False)
+        return "这是基准测试中的假回答。"
+
+
+def boot(args):
+    """在临时库上导入应用并换上假 LLM，返回 (app 模块, 假 LLM)"""
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "api_bench.db")
+    os.environ.update({
+        "DEBUG": "0", "ACCESS_LOG_ENABLED": "0", "LOG_LEVEL": "WARNING",
+        "GRADING_POLL_INTERVAL": "0.2", "QUIZ_FLUSH_INTERVAL": "0.5",
+    })
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    import app as app_module
+
+    fake = FakeLLM(args.llm_delay_ms / 1000.0)
+    lm = app_module.teacher.lm
+    lm._loaded = True
+    lm.available = True
+    lm.teacher_llm = lm.qa_llm = lm.qa_chain = fake
+    return app_module, fake
+
+
+def serve(flask_app):
+    from werkzeug.serving import make_server
+
+    port = _free_port()
+    server = make_server("127.0.0.1", port, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-server", daemon=True).start()
+    return server, port
+
+
+class Client:
+    """保持长连接的 JSON 客户端；服务端要求关闭时自动重连"""
+
+    def __init__(self, port: int, token: str = None):
+        self.port = port
+        self.headers = {"Content-Type": "application/json", "Accept-Encoding": "gzip"}
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+
+    def request(self, method: str, path: str, body=None):
+        payload = json.dumps(body) if body is not None else None
+        try:
+            self.conn.request(method, path, body=payload, headers=self.headers)
+            resp = self.conn.getresponse()
+            data = resp.read()
+        except OSError:
+            self.conn.close()
+            self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+            raise
+        if resp.will_close:
+            self.conn.close()
+            self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        return resp.status, data
+
+    def json(self, method: str, path: str, body=None):
+        status, data = self.request(method, path, body)
+        return status, json.loads(data) if data else None
+
+
+def setup_users(port: int, count: int) -> list:
+    """每个并发客户端一个账号，先跑几次进度保存与作业提交，供读取类场景使用"""
+    users = []
+    client = Client(port)
+    run_id = random.randrange(1 << 30)
+    for i in range(count):
+        email = f"bench{run_id}-{i}@example.com"
+        status, body = client.json("POST", "/api/auth/register", {"email": email, "password": "bench-pass"})
+        if status != 201:
+            raise RuntimeError(f"register failed: {status} {body}")
+        user = {"email": email, "password": "bench-pass", "token": body["token"], "jobs": []}
+        authed = Client(port, user["token"])
+        for index in range(3):
+            authed.json("POST", "/api/progress/nn", {"index": index})
+        status, body = authed.json("POST", "/api/assignment/submit", {"assignmentId": "bench", "content": "答案"})
+        user["jobs"].append(body["jobId"])
+        users.append(user)
+
+    # 班级统计仅教师可见：基准账号设为 teacher
+    from sqlalchemy import update
+    from db import SessionLocal
+    from models import User
+    with SessionLocal() as session:
+        session.execute(update(User).where(User.email.in_([u["email"] for u in users])).values(role="teacher"))
+        session.commit()
+    return users
+
+
+def machine_info() -> dict:
+    return {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()}
+
+
+def settle(timeout: float = 30):
+    """场景之间等待后台写入结束：刷新进度与作答缓冲，等待批改队列清空"""
+    from sqlalchemy import func, select
+    from db import SessionLocal
+    from models import GradingJob
+    from utils.progress import progress_buffer
+    from utils.quiz import quiz_buffer
+
+    progress_buffer.flush()
+    quiz_buffer.flush()
+    deadline = time.monotonic() + timeout
+    while True:
+        with SessionLocal() as session:
+            busy = session.scalar(
+                select(func.count()).select_from(GradingJob).where(GradingJob.status.in_(("queued", "running")))
+            )
+        if not busy:
+            return
+        if time.monotonic() >= deadline:
+            print(f"warning: {busy} grading jobs still pending", flush=True)
+            return
+        time.sleep(0.1)
+
+
+# 场景：名称（蓝图.接口）-> 每次请求的 (method, path, body)，参数为 (user, 序号)
+SCENARIOS = {
+    "auth.login": lambda u, i: ("POST", "/api/auth/login", {"email": u["email"], "password": u["password"]}),
+    "auth.me": lambda u, i: ("GET", "/api/auth/me", None),
+    "progress.save": lambda u, i: ("POST", "/api/progress/nn", {"index": i % 15}),
+    "progress.get": lambda u, i: ("GET", "/api/progress/nn", None),
+    "progress.list": lambda u, i: ("GET", "/api/progress", None),
+    "report.summary": lambda u, i: ("GET", "/api/report/summary", None),
+    "report.cohort": lambda u, i: ("GET", "/api/report/cohort", None),
+    "ai_teacher.segments": lambda u, i: ("GET", "/api/ai_teacher/segments", None),
+    "ai_teacher.segment": lambda u, i: ("GET", f"/api/ai_teacher/segment/{i % 10}", None),
+    "ai_teacher.next": lambda u, i: ("POST", "/api/ai_teacher/next", {"current": i % 10}),
+    "ai_teacher.ask": lambda u, i: ("POST", "/api/ai_teacher/ask", {
+        "question": "什么是反向传播？", "client_id": u["email"],
+    }),
+    "qa.grade": lambda u, i: ("POST", "/api/qa/grade", {"questionId": "q1", "userAnswer": "用梯度更新参数"}),
+    # 读取当前节点（续学入口）；前进一步需带上服务端记录的当前节点，无法由无状态的请求序列构造
+    "lesson.next": lambda u, i: ("POST", "/api/lesson/next", {"lessonId": "nn"}),
+    "quiz.check": lambda u, i: ("POST", "/api/quiz/check", {"lessonId": "nn", "index": 2, "choice": "B"}),
+    # 查询在提交之前：提交场景会留下大量批改任务（之后的场景开始前会等待其批改完成）
+    "assignment.status": lambda u, i: ("GET", f"/api/assignment/jobs/{u['jobs'][0]}", None),
+    "assignment.submit": lambda u, i: ("POST", "/api/assignment/submit", {"assignmentId": "bench", "content": f"答案 {i}"}),
+}
+
+
+def _worker(port, user, build, stop_at, latencies, errors, lock):
+    client = Client(port, user["token"])
+    local, failed = [], 0
+    for i in itertools.count():
+        if time.perf_counter() >= stop_at:
+            break
+        method, path, body = build(user, i)
+        started = time.perf_counter()
+        try:
+            status, _ = client.request(method, path, body)
+        except OSError:
+            failed += 1
+            continue
+        if status >= 400:
+            failed += 1
+            continue
+        local.append(time.perf_counter() - started)
+    client.conn.close()
+    with lock:
+        latencies.extend(local)
+        errors[0] += failed
+
+
+def run_scenario(port, users, name, duration) -> dict:
+    latencies, errors, lock = [], [0], threading.Lock()
+    stop_at = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=_worker, args=(port, user, SCENARIOS[name], stop_at, latencies, errors, lock))
+        for user in users
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": _pct(latencies, 0.50),
+        "p95_ms": _pct(latencies, 0.95),
+        "p99_ms": _pct(latencies, 0.99),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    """p95 超过基线 × 容差、吞吐低于基线 ÷ 容差或出现错误都视为回归"""
+    failed = False
+    for name, r in results.items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            print(f"{name}: no baseline")
+            continue
+        problems = []
+        if r["errors"]:
+            problems.append(f"{r['errors']} errors")
+        if base.get("p95_ms") and r["p95_ms"] is not None and r["p95_ms"] > base["p95_ms"] * tolerance:
+            problems.append(f"p95 {r['p95_ms']}ms > {base['p95_ms']}ms x {tolerance}")
+        if base.get("rps") and r["rps"] < base["rps"] / tolerance:
+            problems.append(f"rps {r['rps']} < {base['rps']} / {tolerance}")
+        failed |= bool(problems)
+        print(f"{name}: {'REGRESSION ' + '; '.join(problems) if problems else 'ok'}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=3, help="每个场景的压测秒数")
+    parser.add_argument("--warmup", type=float, default=0.5)
+    parser.add_argument("--llm-delay-ms", type=float, default=50, help="假 LLM 每次调用的延迟")
+    parser.add_argument("--only", default="", help="逗号分隔的场景名前缀")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=None, help="允许的倍数，缺省取基线文件中的值")
+    parser.add_argument("--update", action="store_true", help="用本次结果覆盖基线")
+    args = parser.parse_args()
+
+    prefixes = [p.strip() for p in args.only.split(",") if p.strip()]
+    names = [n for n in SCENARIOS if not prefixes or any(n.startswith(p) for p in prefixes)]
+
+    app_module, fake = boot(args)
+    server, port = serve(app_module.app)
+    try:
+        users = setup_users(port, args.concurrency)
+        results = {}
+        for name in names:
+            settle()
+            if args.warmup:
+                run_scenario(port, users, name, args.warmup)
+            results[name] = run_scenario(port, users, name, args.duration)
+            print(name, json.dumps(results[name]), flush=True)
+    finally:
+        server.shutdown()
+
+    print(json.dumps({"llm_calls": fake.calls, "scenarios": results}, ensure_ascii=False, indent=2))
+
+    if args.update:
+        baseline = {
+            "tolerance": args.tolerance or 1.5,
+            "concurrency": args.concurrency,
+            "llm_delay_ms": args.llm_delay_ms,
+            "machine": machine_info(),
+            "scenarios": results,
+        }
+        if prefixes and os.path.exists(args.baseline):
+            # 只跑了部分场景时保留其余场景的基线
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+            baseline["scenarios"] = {**previous.get("scenarios", {}), **results}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("machine") != machine_info():
+        print(f"warning: baseline recorded on {baseline.get('machine')}, this machine is {machine_info()}; "
+              "absolute latencies are not comparable across machines")
+    if baseline.get("concurrency") != args.concurrency or baseline.get("llm_delay_ms") != args.llm_delay_ms:
+        print(f"warning: baseline recorded at concurrency={baseline.get('concurrency')} "
+              f"llm_delay_ms={baseline.get('llm_delay_ms')}")
+    return 1 if compare(results, baseline, args.tolerance or baseline.get("tolerance", 1.5)) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+服务模式基准：分别启动开发服务器（python app.py）与 gunicorn 生产配置，用同样的并发压测对比吞吐与延迟。
+用法（在 backend 目录下）:
+  python bench/serve_bench.py --duration 10 --concurrency 32
+  python bench/serve_bench.py --modes gunicorn --workers 4 --threads 8
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 课程播放的典型读请求：分段列表、单段、下一段（POST）、健康检查
+REQUESTS = [
+    ("GET", "/api/ai_teacher/segments", None),
+    ("GET", "/api/ai_teacher/segment/3", None),
+    ("POST", "/api/ai_teacher/next", json.dumps({"current": 2})),
+    ("GET", "/api/health", None),
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(port: int, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/api/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not become ready")
+
+
+def start_server(mode: str, port: int, args):
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+    env.update({"PORT": str(port), "DEBUG": "0", "ACCESS_LOG_ENABLED": "0", "LOG_LEVEL": "WARNING"})
+    if mode == "dev":
+        cmd = [sys.executable, "app.py"]
+    else:
+        env.update({
+            "WEB_BIND": f"127.0.0.1:{port}",
+            "WEB_WORKERS": str(args.workers),
+            "WEB_THREADS": str(args.threads),
+        })
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"]
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(port)
+    except Exception:
+        proc.kill()
+        raise
+    return proc
+
+
+def _client(port, stop_at, latencies, errors, lock):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    local, failed, i = [], 0, 0
+    while time.perf_counter() < stop_at:
+        method, path, body = REQUESTS[i % len(REQUESTS)]
+        i += 1
+        headers = {"Content-Type": "application/json", "Accept-Encoding": "gzip"} if body else {"Accept-Encoding": "gzip"}
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status >= 500:
+                failed += 1
+            # 开发服务器不保持长连接，按响应头决定是否重连
+            if resp.will_close:
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        except OSError:
+            failed += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            continue
+        local.append(time.perf_counter() - started)
+    conn.close()
+    with lock:
+        latencies.extend(local)
+        errors[0] += failed
+
+
+def _pct(sorted_values, q):
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))] * 1000, 2)
+
+
+def run_load(port, concurrency, duration):
+    latencies, errors, lock = [], [0], threading.Lock()
+    stop_at = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=_client, args=(port, stop_at, latencies, errors, lock))
+        for _ in range(concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": round(len(latencies) / duration, 1),
+        "p50_ms": _pct(latencies, 0.50),
+        "p99_ms": _pct(latencies, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="dev,gunicorn", help="逗号分隔：dev,gunicorn")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=float, default=1)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    results = {}
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        port = _free_port()
+        proc = start_server(mode, port, args)
+        try:
+            run_load(port, args.concurrency, args.warmup)
+            results[mode] = run_load(port, args.concurrency, args.duration)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+        print(mode, json.dumps(results[mode]), flush=True)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
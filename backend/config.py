@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -6,12 +7,172 @@ load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 DEFAULT_DB_PATH = BASE_DIR / "database" / "app.db"
+DEFAULT_FRONTEND_DIST = BASE_DIR / "frontend" / "dist"
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
 
 
 class Config:
     PORT = int(os.getenv("PORT", 8080))
+    # 仅影响 python app.py 启动的开发服务器（Werkzeug 调试器与自动重载）
+    DEBUG = _env_bool("DEBUG", True)
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key")
     DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DEFAULT_DB_PATH}")
+    # 只读库（如 Postgres 只读副本）；为空时 GET 路由使用指向同一数据库的只读引擎
+    READ_DATABASE_URL = os.getenv("READ_DATABASE_URL", "")
+
+    # SQLite 连接参数：每个新连接建立时通过 PRAGMA 设置
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 64 * 1024))
+
+    # 服务型数据库（Postgres 等）的连接池
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+
+    # 密码哈希：方法变更后用户下次登录时自动重新哈希；HASH_WORKERS=0 表示不使用进程池。
+    # 排队已满时请求最多等待 HASH_WAIT_TIMEOUT 秒即返回 503
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+    HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 2))
+    HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", 256))
+    HASH_WAIT_TIMEOUT = float(os.getenv("HASH_WAIT_TIMEOUT", 0.1))
+
+    # 管理接口令牌（请求头 X-Admin-Token）；为空时所有管理接口均拒绝访问
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+    # 按需请求剖析：默认关闭，关闭时不注册任何钩子；剖析结果写入 PROFILE_DIR，最多保留 PROFILE_RING_SIZE 个。
+    # X-Profile-Token 令牌用独立的 PROFILE_SECRET 签名，有效期 PROFILE_TOKEN_TTL 秒；
+    # 未配置 PROFILE_SECRET 时不签发也不接受令牌，只能用管理开关（/__admin/profiles/arm）触发
+    PROFILE_ENABLED = _env_bool("PROFILE_ENABLED", False)
+    PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")
+    PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "ai_teacher_profiles"))
+    PROFILE_RING_SIZE = int(os.getenv("PROFILE_RING_SIZE", 50))
+    PROFILE_TOKEN_TTL = int(os.getenv("PROFILE_TOKEN_TTL", 600))
+
+    # 内存统计（/__admin/memory）：单个来源最多遍历 MEMORY_MAX_OBJECTS 个对象；
+    # tracemalloc 开启时每次分配记录 MEMORY_TRACE_FRAMES 层调用栈
+    MEMORY_MAX_OBJECTS = int(os.getenv("MEMORY_MAX_OBJECTS", 200000))
+    MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", 1))
+
+    ROSTER_BATCH_SIZE = int(os.getenv("ROSTER_BATCH_SIZE", 500))
+
+    # 进度写后缓冲：开启后同一课程的频繁保存在内存合并，按间隔批量写库
+    PROGRESS_WRITE_BEHIND = _env_bool("PROGRESS_WRITE_BEHIND", False)
+    PROGRESS_FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", 2))
+    PROGRESS_BUFFER_MAX = int(os.getenv("PROGRESS_BUFFER_MAX", 5000))
+
+    # 测验作答记录：请求内只判题入队，后台按间隔（或攒满 QUIZ_BUFFER_MAX 条）批量写库并更新报表
+    QUIZ_FLUSH_INTERVAL = float(os.getenv("QUIZ_FLUSH_INTERVAL", 1))
+    QUIZ_BUFFER_MAX = int(os.getenv("QUIZ_BUFFER_MAX", 1000))
+    # 单条作答记录写库失败的最多次数，超过后丢弃并记录日志
+    QUIZ_MAX_RETRIES = int(os.getenv("QUIZ_MAX_RETRIES", 3))
+    QUIZ_BATCH_LIMIT = int(os.getenv("QUIZ_BATCH_LIMIT", 100))
+
+    # 前端构建产物目录（npm run build 的输出）
+    FRONTEND_DIST_DIR = os.getenv("FRONTEND_DIST_DIR", str(DEFAULT_FRONTEND_DIST))
+
+    # 响应压缩：超过阈值且类型在白名单内的响应按客户端支持压缩
+    COMPRESS_ENABLED = _env_bool("COMPRESS_ENABLED", True)
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+    COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", 6))
+    COMPRESS_MIMETYPES = [
+        t.strip()
+        for t in os.getenv(
+            "COMPRESS_MIMETYPES",
+            "application/json,text/plain,text/html,text/css,text/javascript,application/javascript",
+        ).split(",")
+        if t.strip()
+    ]
+    COMPRESS_CACHE_ENTRIES = int(os.getenv("COMPRESS_CACHE_ENTRIES", 64))
+
+    # 日志：结构化 JSON 行，由后台线程写出；队列满时丢弃而不阻塞请求
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FILE = os.getenv("LOG_FILE", "")
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+    ACCESS_LOG_ENABLED = _env_bool("ACCESS_LOG_ENABLED", True)
+    ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", 1.0))
+    # 按端点覆盖采样率，如 "api_health=0,api_ping=0,serve_frontend=0.1"
+    ACCESS_LOG_SAMPLE_RATES = os.getenv("ACCESS_LOG_SAMPLE_RATES", "api_health=0,api_ping=0")
+
+    # 多进程指标汇总目录（为空时只输出本进程指标）；gunicorn.conf.py 会自动创建并设置。
+    # 各 worker 每 METRICS_FLUSH_INTERVAL 秒写一次快照
+    METRICS_DIR = os.getenv("METRICS_DIR", "")
+    METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+
+    # 班级统计缓存的时间桶长度（秒）与每个时间桶内最多缓存的课程组合数
+    COHORT_CACHE_TTL = int(os.getenv("COHORT_CACHE_TTL", 30))
+    COHORT_CACHE_MAX = int(os.getenv("COHORT_CACHE_MAX", 32))
+
+    # 导入时是否自动建表；关闭后需预先执行 python manage.py init-db
+    AUTO_INIT_DB = _env_bool("AUTO_INIT_DB", True)
+
+    # 剧本目录：?file= 等参数只能引用该目录下的 .txt 文件；进程内最多缓存 LESSON_STORE_MAX 份解析结果（LRU）
+    LESSON_SCRIPT_DIR = os.getenv("LESSON_SCRIPT_DIR", str(BASE_DIR / "database"))
+    LESSON_STORE_MAX = int(os.getenv("LESSON_STORE_MAX", 16))
+
+    # 启动时预解析的剧本（逗号分隔，相对名按剧本目录解析）
+    PRELOAD_LESSONS = [n.strip() for n in os.getenv("PRELOAD_LESSONS", "DAY1.txt").split(",") if n.strip()]
+
+    # 生产模式（gunicorn -c gunicorn.conf.py wsgi:app）的 worker 配置
+    WEB_BIND = os.getenv("WEB_BIND", f"0.0.0.0:{PORT}")
+    WEB_WORKERS = int(os.getenv("WEB_WORKERS", (os.cpu_count() or 1) * 2 + 1))
+    WEB_THREADS = int(os.getenv("WEB_THREADS", 4))
+    WEB_TIMEOUT = int(os.getenv("WEB_TIMEOUT", 120))
+    WEB_GRACEFUL_TIMEOUT = int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30))
+    WEB_KEEPALIVE = int(os.getenv("WEB_KEEPALIVE", 5))
+    # worker 处理这么多请求后平滑重启（0 表示不限制），抖动避免所有 worker 同时重启
+    WEB_MAX_REQUESTS = int(os.getenv("WEB_MAX_REQUESTS", 0))
+    WEB_MAX_REQUESTS_JITTER = int(os.getenv("WEB_MAX_REQUESTS_JITTER", 0))
+
+
+    # 流式播放：按字数估算每段展示时长；等待确认期间的心跳间隔（秒）
+    PLAYBACK_MS_PER_CHAR = int(os.getenv("PLAYBACK_MS_PER_CHAR", 120))
+    PLAYBACK_MIN_DELAY_MS = int(os.getenv("PLAYBACK_MIN_DELAY_MS", 1500))
+    PLAYBACK_MAX_DELAY_MS = int(os.getenv("PLAYBACK_MAX_DELAY_MS", 20000))
+    # 互动段：流在连接上最多等待确认 PLAYBACK_ACK_HOLD 秒，之后结束连接释放线程；
+    # 停住的会话保留 PLAYBACK_ACK_TIMEOUT 秒，客户端确认后带 session 参数重连续播
+    PLAYBACK_ACK_HOLD = float(os.getenv("PLAYBACK_ACK_HOLD", 5))
+    PLAYBACK_ACK_TIMEOUT = float(os.getenv("PLAYBACK_ACK_TIMEOUT", 300))
+    PLAYBACK_HEARTBEAT = float(os.getenv("PLAYBACK_HEARTBEAT", 15))
+
+    # 直播课堂：其他 worker 同步教师推进的间隔（秒），每个 worker 每个间隔一次查询
+    CLASSROOM_SYNC_INTERVAL = float(os.getenv("CLASSROOM_SYNC_INTERVAL", 0.5))
+    # WSGI（gthread）路径上每个订阅连接占用一个 worker 线程：每进程最多这么多个，超出返回 503，
+    # 为其他接口留出线程。整班（数百名学生）直播需走 ASGI 入口（asgi.py），订阅连接不占线程、不受此限制
+    CLASSROOM_MAX_THREAD_SUBSCRIBERS = int(os.getenv("CLASSROOM_MAX_THREAD_SUBSCRIBERS", max(1, WEB_THREADS // 2)))
+
+    # 作业批改队列：任务存于 grading_jobs 表，每个进程 GRADING_WORKERS 个批改线程，
+    # 每次认领最多 GRADING_BATCH_SIZE 份合并为一次模型调用；认领后 GRADING_DEADLINE 秒内未完成视为超时，
+    # 任务重新排队，失败按 GRADING_RETRY_BACKOFF 秒指数退避，最多尝试 GRADING_MAX_ATTEMPTS 次
+    GRADING_WORKERS = int(os.getenv("GRADING_WORKERS", 2))
+    GRADING_BATCH_SIZE = int(os.getenv("GRADING_BATCH_SIZE", 8))
+    GRADING_DEADLINE = float(os.getenv("GRADING_DEADLINE", 120))
+    GRADING_MAX_ATTEMPTS = int(os.getenv("GRADING_MAX_ATTEMPTS", 3))
+    GRADING_RETRY_BACKOFF = float(os.getenv("GRADING_RETRY_BACKOFF", 5))
+    GRADING_POLL_INTERVAL = float(os.getenv("GRADING_POLL_INTERVAL", 2))
+    # 单次批改模型调用的超时（秒，不超过 GRADING_DEADLINE）与每份作业送入模型的最大字符数
+    GRADING_CALL_TIMEOUT = float(os.getenv("GRADING_CALL_TIMEOUT", 60))
+    GRADING_MAX_CHARS = int(os.getenv("GRADING_MAX_CHARS", 8000))
+
+    # 大模型（DashScope OpenAI 兼容接口），供 ASGI 服务路径的异步客户端使用
+    LLM_API_KEY = os.getenv("DASHSCOPE_API_KEY", "")
+    LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
+    LLM_MODEL = os.getenv("LLM_MODEL", "qwen-turbo")
+    LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", 1.0))
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+    # 每个 worker 到模型服务的最大连接数；超出的请求在连接池中排队等待，不占用线程
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 100))
+    # ASGI 模式下其余（同步 Flask）路由使用的线程数
+    ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", 8))
 
 
 config = Config()
@@ -1,24 +1,167 @@
-from sqlalchemy import create_engine
+import time
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import QueuePool
 
 from config import config
 
 
-engine = create_engine(
-    config.DATABASE_URL,
-    echo=False,
-    future=True,
-    pool_pre_ping=True,
-)
+class TimedQueuePool(QueuePool):
+    """记录从连接池取得连接的等待时间；wait_observer 由指标模块注入"""
+
+    wait_observer = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            observer = TimedQueuePool.wait_observer
+            if observer is not None:
+                observer(self, time.perf_counter() - started)
+
+
+def sqlite_pragmas(cfg=config) -> dict:
+    """SQLite 连接档案：WAL + 适度的同步级别，避免并发写时阻塞读者"""
+    return {
+        "journal_mode": cfg.SQLITE_JOURNAL_MODE,
+        "synchronous": cfg.SQLITE_SYNCHRONOUS,
+        "busy_timeout": cfg.SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": cfg.SQLITE_MMAP_SIZE,
+        # 负数表示以 KiB 为单位
+        "cache_size": -abs(cfg.SQLITE_CACHE_SIZE_KB),
+    }
+
+
+def build_engine(url: str, pragmas: dict = None, readonly: bool = False):
+    """按数据库类型创建引擎：SQLite 通过 connect 事件设置 PRAGMA，其余数据库显式配置连接池"""
+    parsed = make_url(url)
+    pool_name = "read" if readonly else "write"
+    if parsed.get_backend_name() != "sqlite":
+        return create_engine(
+            url,
+            echo=False,
+            future=True,
+            pool_pre_ping=True,
+            poolclass=TimedQueuePool,
+            pool_logging_name=pool_name,
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_recycle=config.DB_POOL_RECYCLE,
+        )
+
+    pragmas = dict(sqlite_pragmas() if pragmas is None else pragmas)
+    busy_ms = pragmas.get("busy_timeout") or 0
+    pool_args = {}
+    if parsed.database and parsed.database != ":memory:":
+        # 文件库使用（计时的）QueuePool；内存库保留 SQLAlchemy 默认的单连接池
+        pool_args = {"poolclass": TimedQueuePool, "pool_logging_name": pool_name}
+    engine = create_engine(
+        url,
+        echo=False,
+        future=True,
+        pool_pre_ping=True,
+        connect_args={"timeout": busy_ms / 1000.0, "check_same_thread": False},
+        **pool_args,
+    )
+    if readonly:
+        pragmas["query_only"] = "ON"
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        try:
+            for name, value in pragmas.items():
+                if value is None:
+                    continue
+                # journal_mode 为数据库级设置，只读连接上无法修改
+                if readonly and name == "journal_mode":
+                    continue
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return engine
+
+
+engine = build_engine(config.DATABASE_URL)
+
+if config.READ_DATABASE_URL:
+    read_engine = build_engine(config.READ_DATABASE_URL, readonly=True)
+elif engine.dialect.name == "sqlite":
+    # 同一文件的独立只读连接池：WAL 模式下读者不受写事务阻塞
+    read_engine = build_engine(config.DATABASE_URL, readonly=True)
+else:
+    read_engine = engine
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+# 只读会话：不自动 flush，提交后不过期对象（只读路由不会提交）
+ReadSessionLocal = sessionmaker(
+    bind=read_engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True
+)
 
 Base = declarative_base()
 
 
+# 记录会话是否真正写过数据：请求结束时只有写过的会话才需要提交
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_flushed(session, _flush_context):
+    session.info["writes"] = True
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _mark_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["writes"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+@event.listens_for(SessionLocal, "after_rollback")
+def _reset_writes(session):
+    session.info.pop("writes", None)
+
+
+def has_pending_writes(session) -> bool:
+    return bool(session.info.get("writes") or session.new or session.dirty or session.deleted)
+
+
+def dialect_insert(session):
+    """支持 ON CONFLICT 的 insert 构造器（SQLite / Postgres）"""
+    name = session.get_bind().dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"ON CONFLICT insert not supported on {name}")
+    return insert
+
+
+def _add_missing_columns():
+    """create_all 也不会给已存在的表补列：可为空的新增列用 ALTER TABLE ADD COLUMN 补齐"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+
+
 def init_db():
     # Import models for metadata registration
-    from models import User, LessonProgress  # noqa: F401
+    from models import (  # noqa: F401
+        Classroom, GradingJob, LessonProgress, ProgressEvent, QuizAttempt, User, UserReport,
+    )
 
     Base.metadata.create_all(bind=engine)
-
+    _add_missing_columns()
+    # create_all 不会给已存在的表补建新索引，这里逐个检查补齐
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
@@ -0,0 +1,67 @@
+"""
+gunicorn 生产配置（在 backend 目录下运行）:
+  gunicorn -c gunicorn.conf.py wsgi:app
+
+- preload_app：master 中导入应用并预解析剧本，fork 出的 worker 以写时复制共享这些对象；
+  fork 前 gc.freeze() 把已有对象移出 GC 追踪，避免 worker 的垃圾回收改写共享页。
+- 平滑重启：kill -HUP <master pid> 按 graceful_timeout 逐个替换 worker；
+  由于应用在 master 中预加载，代码或依赖更新需 kill -USR2 启动新 master 后再 kill -TERM 旧 master。
+- 指标：未指定 METRICS_DIR 时为本次启动新建一个临时目录，各 worker 的计数在 /__metrics 中合并输出
+  （USR2 启动的新 master 继承该目录，计数延续）。
+"""
+import gc
+import os
+import tempfile
+
+# 须在导入 config 之前设置：config 在导入时读取环境变量
+os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="ai_teacher_metrics_"))
+
+# 注意：gunicorn 会把本文件的模块级名字当作设置项读取，"config" 本身就是设置名，故改名导入
+from config import config as app_config
+
+bind = app_config.WEB_BIND
+workers = app_config.WEB_WORKERS
+threads = app_config.WEB_THREADS
+# threads > 1 时 gunicorn 自动使用 gthread worker；显式指定便于阅读
+worker_class = "gthread" if app_config.WEB_THREADS > 1 else "sync"
+timeout = app_config.WEB_TIMEOUT
+graceful_timeout = app_config.WEB_GRACEFUL_TIMEOUT
+keepalive = app_config.WEB_KEEPALIVE
+max_requests = app_config.WEB_MAX_REQUESTS
+max_requests_jitter = app_config.WEB_MAX_REQUESTS_JITTER
+preload_app = True
+# 访问日志由应用自身的结构化日志负责
+accesslog = None
+errorlog = "-"
+
+
+def when_ready(server):
+    gc.freeze()
+    server.log.info("app preloaded; %s workers x %s threads", workers, threads)
+
+
+def post_fork(server, worker):
+    # 父进程的数据库连接不能跨进程复用，丢弃连接池引用（不关闭，父进程仍持有）
+    from db import engine, read_engine
+    engine.dispose(close=False)
+    if read_engine is not engine:
+        read_engine.dispose(close=False)
+
+    # 后台线程不会随 fork 复制：日志写线程立即重启，进度缓冲与哈希进程池按 pid 惰性重建
+    from utils.access_log import pipeline
+    pipeline.after_fork()
+
+    # 批改线程随 worker 启动，接手上次退出时仍在队列中的作业
+    from utils.grading import grading_queue
+    grading_queue.ensure_started()
+
+    from utils.metrics import multiprocess
+    if multiprocess is not None:
+        multiprocess.ensure_started()
+
+
+def worker_exit(server, worker):
+    # 退出（含 max_requests 回收）时把本 worker 的计数并入归档，合并结果不会回退
+    from utils.metrics import multiprocess
+    if multiprocess is not None:
+        multiprocess.archive()
@@ -0,0 +1,84 @@
+"""
+命令行管理工具。
+用法:
+  python manage.py init-db
+  python manage.py import-roster roster.csv [--batch-size 500]
+  python manage.py set-role teacher@example.com teacher
+"""
+import argparse
+import json
+import sys
+
+from config import config
+from db import SessionLocal, init_db
+from models import USER_ROLES
+
+
+def cmd_init_db(args):
+    """建表并补齐索引（冷启动模式下应用不会在启动时执行这一步）"""
+    init_db()
+    print(f"database initialized: {config.DATABASE_URL}")
+    return 0
+
+
+def cmd_import_roster(args):
+    from utils.roster import import_roster
+
+    init_db()
+    session = SessionLocal()
+    try:
+        with open(args.path, "r", encoding="utf-8-sig", newline="") as f:
+            result = import_roster(session, f, batch_size=args.batch_size)
+    finally:
+        session.close()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+def cmd_set_role(args):
+    """设置用户角色（student / teacher / admin），教师与管理员可查看班级统计"""
+    from models import User
+    from utils.auth import normalize_email
+
+    init_db()
+    session = SessionLocal()
+    try:
+        user = session.query(User).filter_by(email=normalize_email(args.email)).first()
+        if user is None:
+            print(f"user not found: {args.email}", file=sys.stderr)
+            return 1
+        user.role = None if args.role == "student" else args.role
+        session.commit()
+        print(json.dumps(user.to_dict(), ensure_ascii=False))
+    finally:
+        session.close()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="学习平台后端管理命令")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("init-db", help="创建数据表与索引")
+    p.set_defaults(func=cmd_init_db)
+
+    p = sub.add_parser("import-roster", help="从 CSV 名册批量创建学生账号")
+    p.add_argument("path", help="CSV 文件路径（表头 email,password,displayName）")
+    p.add_argument("--batch-size", type=int, default=config.ROSTER_BATCH_SIZE)
+    p.set_defaults(func=cmd_import_roster)
+
+    p = sub.add_parser("set-role", help="设置用户角色")
+    p.add_argument("email")
+    p.add_argument("role", choices=USER_ROLES)
+    p.set_defaults(func=cmd_set_role)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,13 @@
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy import JSON, Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, String, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from db import Base
 
+USER_ROLES = ("student", "teacher", "admin")
+STAFF_ROLES = ("teacher", "admin")
+
 
 class User(Base):
     __tablename__ = "users"
@@ -13,6 +16,8 @@ class User(Base):
     email = Column(String(255), unique=True, nullable=False, index=True)
     display_name = Column(String(120), nullable=False)
     password_hash = Column(String(255), nullable=False)
+    # 角色：空为学生；teacher / admin 可查看班级统计（python manage.py set-role 设置）
+    role = Column(String(16), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     progresses = relationship("LessonProgress", back_populates="user", cascade="all, delete-orphan")
@@ -22,13 +27,22 @@ class User(Base):
             "id": self.id,
             "email": self.email,
             "displayName": self.display_name,
+            "role": self.role or "student",
             "createdAt": self.created_at.isoformat() if self.created_at else None,
         }
 
+    @property
+    def is_staff(self) -> bool:
+        return self.role in STAFF_ROLES
+
 
 class LessonProgress(Base):
     __tablename__ = "lesson_progress"
-    __table_args__ = (UniqueConstraint("user_id", "lesson_id", name="uq_progress_user_lesson"),)
+    __table_args__ = (
+        UniqueConstraint("user_id", "lesson_id", name="uq_progress_user_lesson"),
+        # 班级统计按 (lesson_id, current_index) 分组，覆盖索引避免回表
+        Index("ix_progress_lesson_index", "lesson_id", "current_index"),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -44,3 +58,108 @@ class LessonProgress(Base):
             "currentIndex": self.current_index,
             "updatedAt": self.updated_at.isoformat() if self.updated_at else None,
         }
+
+
+class UserReport(Base):
+    """按用户物化的学习报告汇总，进度保存时增量更新"""
+
+    __tablename__ = "user_reports"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    total_xp = Column(Integer, nullable=False, default=0)
+    ratio_sum = Column(Float, nullable=False, default=0.0)
+    lesson_count = Column(Integer, nullable=False, default=0)
+    lessons = Column(JSON, nullable=False, default=dict)  # lesson_id -> {completed, ratio}
+    quiz = Column(JSON)  # lesson_id -> {段下标: 首次作答是否正确(1/0)}
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ProgressEvent(Base):
+    """进度事件流水（只追加），用于分析学习节奏"""
+
+    __tablename__ = "progress_events"
+    __table_args__ = (Index("ix_progress_events_lesson_time", "lesson_id", "created_at"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    lesson_id = Column(String(64), nullable=False)
+    current_index = Column(Integer, nullable=False)
+    rewind = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "userId": self.user_id,
+            "lessonId": self.lesson_id,
+            "currentIndex": self.current_index,
+            "rewind": bool(self.rewind),
+            "createdAt": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+class Classroom(Base):
+    """直播课堂：教师推进的当前段落，各 worker 据 version 同步后向本进程的学生广播"""
+
+    __tablename__ = "classrooms"
+
+    code = Column(String(16), primary_key=True)
+    teacher_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    script_path = Column(String(512), nullable=False)
+    current_index = Column(Integer, nullable=False, default=0)
+    version = Column(Integer, nullable=False, default=0)
+    closed = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class GradingJob(Base):
+    """作业批改任务：提交即落库，由批改 worker 认领（lease）后批量调用模型打分"""
+
+    __tablename__ = "grading_jobs"
+    # worker 按 (status, available_at) 查找可认领的任务
+    __table_args__ = (Index("ix_grading_jobs_status_available", "status", "available_at"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    assignment_id = Column(String(64), nullable=False)
+    content = Column(Text, nullable=False)
+    status = Column(String(16), nullable=False, default="queued")  # queued / running / done / failed
+    attempts = Column(Integer, nullable=False, default=0)
+    lease = Column(String(32))
+    locked_until = Column(DateTime)
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    score = Column(Integer)
+    feedback = Column(Text)
+    error = Column(String(512))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+    def to_dict(self):
+        return {
+            "jobId": self.id,
+            "assignmentId": self.assignment_id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "score": self.score,
+            "feedback": self.feedback,
+            "error": self.error,
+            "createdAt": self.created_at.isoformat() if self.created_at else None,
+            "finishedAt": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class QuizAttempt(Base):
+    """测验作答记录（只追加），由服务端按剧本答案判定对错"""
+
+    __tablename__ = "quiz_attempts"
+    __table_args__ = (Index("ix_quiz_attempts_user_lesson", "user_id", "lesson_id"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    lesson_id = Column(String(64), nullable=False)
+    segment_index = Column(Integer, nullable=False)
+    choice = Column(String(8), nullable=False)
+    correct = Column(Boolean, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,130 @@
+from flask import Blueprint, Response, jsonify, request, send_file
+
+from config import config
+from utils.auth import require_admin
+from utils.memory import allocation_tracker, memory_sources, process_memory
+from utils.profiling import PROFILE_HEADER, request_profiler
+
+bp = Blueprint("admin", __name__)
+
+
+@bp.get("/profiles")
+@require_admin
+def list_profiles():
+    """
+    已保存的请求剖析（新的在前）
+    res: { profiles: [{ name, method, path, endpoint, status, ms, user, pid, createdAt }], profiler }
+    """
+    return jsonify({"profiles": request_profiler.ring.list(), "profiler": request_profiler.stats()})
+
+
+@bp.get("/profiles/<name>")
+@require_admin
+def get_profile(name):
+    """
+    剖析结果：默认返回 pstats 文本摘要（sort 默认 cumulative，limit 默认 40）；raw=1 下载 .prof 文件，
+    可用 python -m pstats 或 snakeviz 打开
+    """
+    path = request_profiler.ring.path(name)
+    if path is None:
+        return jsonify({"error": "profile not found"}), 404
+    if request.args.get("raw"):
+        return send_file(path, mimetype="application/octet-stream", as_attachment=True, download_name=name + ".prof")
+    sort = request.args.get("sort", "cumulative")
+    if sort not in ("cumulative", "tottime", "calls", "ncalls", "time"):
+        return jsonify({"error": "unsupported sort"}), 400
+    limit = request.args.get("limit", 40, type=int)
+    return Response(request_profiler.ring.summary(name, sort, limit), mimetype="text/plain; charset=utf-8")
+
+
+@bp.post("/profiles/token")
+@require_admin
+def issue_profile_token():
+    """
+    签发剖析令牌：在请求头 X-Profile-Token 中携带，匹配路径前缀的请求会被剖析（任一 worker 均有效）
+    req: { path }  路径前缀，默认 "/"
+    res: { header, token, expiresIn }；未配置 PROFILE_SECRET 时返回 409
+    """
+    payload = request.get_json(force=True, silent=True) or {}
+    token = request_profiler.issue_token(str(payload.get("path") or "/"))
+    if token is None:
+        return jsonify({"error": "未配置 PROFILE_SECRET，令牌触发已关闭"}), 409
+    return jsonify({"header": PROFILE_HEADER, "token": token, "expiresIn": request_profiler.token_ttl})
+
+
+@bp.post("/profiles/arm")
+@require_admin
+def arm_profiler():
+    """
+    开关：剖析本进程内接下来 count 个匹配路径前缀的请求（多 worker 部署时只作用于处理本请求的 worker）
+    req: { path, count }  count 为 0 表示关闭
+    """
+    payload = request.get_json(force=True, silent=True) or {}
+    try:
+        count = int(payload.get("count", 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "count 必须为整数"}), 400
+    request_profiler.arm(str(payload.get("path") or "/"), min(count, request_profiler.ring.size))
+    return jsonify(request_profiler.stats())
+
+
+@bp.get("/memory")
+@require_admin
+def memory_usage():
+    """
+    本进程内存占用：各缓存/内存存储的条目数与深度字节数（按字节数降序），以及进程 RSS 与 tracemalloc 状态。
+    多 worker 部署时只反映处理本请求的 worker（见 process.pid）
+    query: source  逗号分隔的来源名，缺省统计全部；maxObjects  单个来源最多遍历的对象数
+    res: { process, sources: [{ name, entries, bytes, objects, truncated, ms } 或 { name, unavailable }], available, tracemalloc }
+    """
+    names = {n.strip() for n in request.args.get("source", "").split(",") if n.strip()}
+    max_objects = request.args.get("maxObjects", config.MEMORY_MAX_OBJECTS, type=int)
+    return jsonify({
+        "process": process_memory(),
+        "sources": memory_sources.measure(names, max_objects),
+        "available": memory_sources.names(),
+        "tracemalloc": allocation_tracker.stats(),
+    })
+
+
+@bp.post("/memory/snapshot")
+@require_admin
+def start_tracemalloc():
+    """
+    开启 tracemalloc（若未开启）并取基准快照；之后用 GET /memory/diff 查看新增分配
+    req: { frames }  每次分配记录的调用栈层数，默认 MEMORY_TRACE_FRAMES（仅在本次开启跟踪时生效）
+    """
+    payload = request.get_json(force=True, silent=True) or {}
+    try:
+        frames = int(payload.get("frames", config.MEMORY_TRACE_FRAMES))
+    except (TypeError, ValueError):
+        return jsonify({"error": "frames 必须为整数"}), 400
+    return jsonify(allocation_tracker.start(frames))
+
+
+@bp.get("/memory/diff")
+@require_admin
+def tracemalloc_diff():
+    """
+    当前快照与基准快照比较，返回增长最多的分配位置
+    query: limit 默认 20；groupBy lineno | filename | traceback；reset=1 以本次快照作为新基准
+    res: { seconds, size_diff, top: [{ where, size_diff, size, count_diff, count, traceback? }] }
+    """
+    group_by = request.args.get("groupBy", "lineno")
+    if group_by not in ("lineno", "filename", "traceback"):
+        return jsonify({"error": "unsupported groupBy"}), 400
+    result = allocation_tracker.diff(
+        limit=request.args.get("limit", 20, type=int),
+        group_by=group_by,
+        reset=bool(request.args.get("reset")),
+    )
+    if result is None:
+        return jsonify({"error": "no baseline snapshot, POST /__admin/memory/snapshot first"}), 409
+    return jsonify(result)
+
+
+@bp.delete("/memory/snapshot")
+@require_admin
+def stop_tracemalloc():
+    """关闭由管理接口开启的 tracemalloc 并丢弃基准快照"""
+    return jsonify(allocation_tracker.stop())
@@ -1,12 +1,45 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, g, request, jsonify
+
+from utils.auth import require_auth
+from utils.db_session import get_db, get_read_db
+from utils.grading import grading_queue
 
 bp = Blueprint("assignment", __name__)
 
 @bp.post("/submit")
+@require_auth
 def submit():
     """
-    与前端 /api/assignment/submit 对齐
+    与前端 /api/assignment/submit 对齐；作业写入批改队列后立即返回，批改结果通过 /jobs/<jobId> 查询
     req: { assignmentId, content }
-    res: { status, message }
+    res: { status, message, jobId, state }
+    """
+    payload = request.get_json(force=True, silent=True) or {}
+    assignment_id = str(payload.get("assignmentId") or "").strip()
+    content = payload.get("content")
+    if not assignment_id or not isinstance(content, str) or not content.strip():
+        return jsonify({"error": "assignmentId 和 content 不能为空"}), 400
+    if len(content) > grading_queue.max_chars:
+        return jsonify({"error": f"作业内容不能超过 {grading_queue.max_chars} 字"}), 400
+
+    job = grading_queue.submit(get_db(), g.current_user.id, assignment_id[:64], content)
+    return jsonify({
+        "status": "ok",
+        "message": "作业已收到，稍后自动批改",
+        "jobId": job.id,
+        "state": job.status,
+    }), 202
+
+
+@bp.get("/jobs/<int:job_id>")
+@require_auth
+def job_status(job_id):
+    """
+    查询批改状态与结果
+    res: { jobId, assignmentId, status(queued/running/done/failed), attempts, score, feedback, error, ... }
     """
-    return jsonify({"status": "ok", "message": "作业已收到，稍后自动批改"})
\ No newline at end of file
+    grading_queue.ensure_started()
+    job = grading_queue.get(get_read_db(), job_id, g.current_user.id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(job.to_dict())
@@ -1,20 +1,21 @@
+import io
+
 from flask import Blueprint, g, jsonify, request
-from werkzeug.security import check_password_hash, generate_password_hash
 
+from config import config
 from models import User
-from utils.auth import generate_token, require_auth
+from utils.auth import generate_token, normalize_email, require_admin, require_auth
+from utils.db_session import get_db
+from utils.hashing import HashPoolBusy, password_hasher
+from utils.roster import import_roster
 
 bp = Blueprint("auth", __name__)
 
 
-def _normalize_email(value: str) -> str:
-    return (value or "").strip().lower()
-
-
 @bp.post("/register")
 def register():
     payload = request.get_json(force=True, silent=True) or {}
-    email = _normalize_email(payload.get("email"))
+    email = normalize_email(payload.get("email"))
     password = (payload.get("password") or "").strip()
     display_name = (payload.get("displayName") or "").strip()
 
@@ -25,15 +26,20 @@ def register():
     if not display_name:
         display_name = email.split("@")[0]
 
-    session = g.db
+    session = get_db()
     existing = session.query(User).filter_by(email=email).first()
     if existing:
         return jsonify({"error": "该邮箱已注册，请直接登录"}), 409
 
+    try:
+        password_hash = password_hasher.hash(password)
+    except HashPoolBusy:
+        return jsonify({"error": "注册人数较多，请稍后重试"}), 503
+
     user = User(
         email=email,
         display_name=display_name,
-        password_hash=generate_password_hash(password),
+        password_hash=password_hash,
     )
     session.add(user)
     session.flush()
@@ -45,17 +51,27 @@ def register():
 @bp.post("/login")
 def login():
     payload = request.get_json(force=True, silent=True) or {}
-    email = _normalize_email(payload.get("email"))
+    email = normalize_email(payload.get("email"))
     password = (payload.get("password") or "").strip()
 
     if not email or not password:
         return jsonify({"error": "请填写邮箱和密码"}), 400
 
-    session = g.db
+    session = get_db()
     user = session.query(User).filter_by(email=email).first()
-    if not user or not check_password_hash(user.password_hash, password):
+    if not user:
         return jsonify({"error": "邮箱或密码不正确"}), 401
 
+    try:
+        ok, new_hash = password_hasher.verify(user.password_hash, password)
+    except HashPoolBusy:
+        return jsonify({"error": "登录人数较多，请稍后重试"}), 503
+    if not ok:
+        return jsonify({"error": "邮箱或密码不正确"}), 401
+    if new_hash:
+        # 哈希参数已变更：透明地升级为新参数
+        user.password_hash = new_hash
+
     token = generate_token(user.id)
     return jsonify({"token": token, "user": user.to_dict()})
 
@@ -64,3 +80,22 @@ def login():
 @require_auth
 def me():
     return jsonify({"user": g.current_user.to_dict()})
+
+
+@bp.post("/import")
+@require_admin
+def import_users():
+    """
+    批量导入名册（CSV，表头 email,password,displayName）
+    req: multipart 字段 file，或直接以 text/csv 作为请求体
+    res: { created, skipped, invalid, errors }
+    """
+    upload = request.files.get("file")
+    raw = upload.stream if upload else request.stream
+    text_stream = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+    try:
+        result = import_roster(get_db(), text_stream, batch_size=config.ROSTER_BATCH_SIZE)
+    except HashPoolBusy:
+        # 已提交的批次保留；重试时已注册的邮箱会被跳过
+        return jsonify({"error": "密码哈希队列繁忙，请稍后重试"}), 503
+    return jsonify(result)
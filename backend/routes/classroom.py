@@ -0,0 +1,141 @@
+from flask import Blueprint, Response, g, jsonify, request
+
+from config import config
+from utils.auth import require_auth, require_stream_auth
+from utils.classroom import ClassroomCodeUnavailable, classrooms
+from utils.db_session import get_db, get_read_db
+from utils.lesson_store import lesson_store, resolve_script_path
+
+bp = Blueprint("classroom", __name__)
+
+KEEPALIVE = b": keepalive\n\n"
+
+
+def _teacher_room(code):
+    """取出课堂并校验当前用户是创建者；失败时返回 (None, 错误响应)"""
+    room = classrooms.get(get_db(), code.upper())
+    if room is None:
+        return None, (jsonify({"error": "classroom not found"}), 404)
+    if room.teacher_id != g.current_user.id:
+        return None, (jsonify({"error": "only the teacher can control this classroom"}), 403)
+    if room.closed:
+        return None, (jsonify({"error": "classroom closed"}), 409)
+    return room, None
+
+
+@bp.post("")
+@require_auth
+def create_classroom():
+    """
+    创建直播课堂，创建者即教师；仅教师 / 管理员账号可创建
+    req: { file }  剧本文件（默认 DAY1.txt）
+    res: { code, index, version, closed, subscribers, total }
+    """
+    # 不用 require_staff：其管理令牌分支不加载 g.current_user，而这里需要创建者身份
+    if not g.current_user.is_staff:
+        return jsonify({"error": "teacher or admin role required"}), 403
+    payload = request.get_json(force=True, silent=True) or {}
+    script_path = resolve_script_path(payload.get("file") or "DAY1.txt")
+    lesson = lesson_store.get(script_path)
+    if lesson is None or not lesson.segments:
+        return jsonify({"error": "no segments found", "path": script_path}), 404
+    try:
+        room = classrooms.create(get_db(), g.current_user.id, script_path)
+    except ClassroomCodeUnavailable:
+        return jsonify({"error": "could not allocate a classroom code, retry"}), 503
+    return jsonify({**room.to_dict(), "total": lesson.total}), 201
+
+
+@bp.get("/<code>")
+@require_auth
+def get_classroom(code):
+    room = classrooms.get(get_read_db(), code.upper())
+    if room is None:
+        return jsonify({"error": "classroom not found"}), 404
+    return jsonify(room.to_dict())
+
+
+@bp.post("/<code>/advance")
+@require_auth
+def advance(code):
+    """
+    教师切换全班的当前段落（与 /api/ai_teacher/segment/<idx> 的索引一致）
+    req: { index } 或 { step }（相对当前段，默认 1）
+    res: { code, index, version, subscribers, broadcastMs }
+    """
+    room, error = _teacher_room(code)
+    if error:
+        return error
+    # 以数据库中的当前段与版本号为准（_teacher_room 已按版本号刷新），UPDATE 时再校验一次版本号
+    current, version, _ = room.state()
+    payload = request.get_json(force=True, silent=True) or {}
+    try:
+        if payload.get("index") is not None:
+            index = int(payload["index"])
+        else:
+            index = current + int(payload.get("step", 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "index 必须为整数"}), 400
+
+    lesson = lesson_store.get(room.script_path)
+    total = lesson.total if lesson is not None else 0
+    if not 0 <= index < total:
+        return jsonify({"error": "index out of range", "total": total}), 400
+
+    broadcast_ms = classrooms.advance(get_db(), room, index, version)
+    if broadcast_ms is None:
+        return jsonify({"error": "classroom changed, retry", **room.to_dict()}), 409
+    return jsonify({**room.to_dict(), "broadcastMs": round(broadcast_ms, 3)})
+
+
+@bp.delete("/<code>")
+@require_auth
+def close_classroom(code):
+    room, error = _teacher_room(code)
+    if error:
+        return error
+    if classrooms.close(get_db(), room) is None:
+        return jsonify({"error": "classroom closed"}), 409
+    return jsonify(room.to_dict())
+
+
+@bp.get("/<code>/stream")
+@require_stream_auth
+def stream(code):
+    """
+    学生订阅课堂（SSE）：连接后立即收到当前段，之后每次教师推进收到一条 segment 事件（id 为版本号），
+    课堂关闭时收到 closed 事件。广播内容每次只序列化一次，所有订阅者写出同一份字节。
+    这里的每个连接占用一个 worker 线程，每进程最多 CLASSROOM_MAX_THREAD_SUBSCRIBERS 个；
+    以 asgi.py 入口部署时该路径由事件循环处理（见 asgi.AITeacherASGI），不占线程
+    """
+    room = classrooms.get(get_read_db(), code.upper())
+    if room is None:
+        return jsonify({"error": "classroom not found"}), 404
+
+    heartbeat = config.PLAYBACK_HEARTBEAT
+    room = classrooms.subscribe(room)
+    if room is None:
+        resp = jsonify({"error": "too many classroom subscribers on this worker"})
+        resp.status_code = 503
+        resp.headers["Retry-After"] = "5"
+        return resp
+
+    def generate():
+        try:
+            yield b"retry: 3000\n\n"
+            seen, frame, closed = room.wait(-1, 0)  # 当前状态的一致快照，不阻塞
+            yield frame
+            while not closed:
+                version, frame, closed = room.wait(seen, heartbeat)
+                if version == seen and not closed:
+                    yield KEEPALIVE
+                    continue
+                seen = version
+                yield frame
+        finally:
+            classrooms.unsubscribe(room)
+
+    resp = Response(generate(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
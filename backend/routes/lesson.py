@@ -1,23 +1,49 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, g, request, jsonify
+
+from utils.auth import require_auth
+from utils.db_session import get_db, get_read_db
+from utils.lesson_graph import lesson_graphs, save_position
+from utils.lesson_store import json_response
+from utils.progress import saved_index
 
 bp = Blueprint("lesson", __name__)
 
 @bp.post("/next")
+@require_auth
 def next_node():
     """
     与前端 /api/lesson/next 对齐
     req: { lessonId, currentNodeId, userInput }
-    res: { node, progress }
+         不带 currentNodeId 时返回当前所在节点（首次进入为起始节点）；
+         带 currentNodeId 时按 userInput（选项字母）沿课程图前进一步。currentNodeId 须为已记录的当前节点
+         或其一步可达的节点，否则返回 409 与当前节点 id
+    res: { node, progress: { percent, xp }, done }
     """
-    body = request.get_json() or {}
-    # 这里直接返回 Mock，后续可接入真实剧本/状态机
-    node = {
-        "id": "nn-001",
-        "type": "narration",               # narration/quiz/choice
-        "content": "欢迎来到神经网络第一课！",
-        "question": None,
-        "choices": None,
-        "next": "nn-002"
-    }
-    progress = {"percent": 10, "xp": 5}
-    return jsonify({"node": node, "progress": progress})
\ No newline at end of file
+    body = request.get_json(force=True, silent=True) or {}
+    lesson_id = str(body.get("lessonId") or "").strip()
+    graph = lesson_graphs.get(lesson_id)
+    if graph is None:
+        return jsonify({"error": "lesson not found", "lessonId": lesson_id}), 404
+
+    user_id = g.current_user.id
+    # 当前位置以库中记录为准（叠加本进程写后缓冲中尚未落库的保存），不信任客户端与进程内缓存
+    stored = saved_index(get_read_db(), user_id, lesson_id)
+    position = min(max(stored, 0), graph.total - 1)
+    current_id = body.get("currentNodeId")
+    if not current_id:
+        if stored < 0:
+            save_position(get_db(), user_id, lesson_id, 0, None)
+        return json_response(graph.node_bodies[position])
+
+    current = graph.index.get(current_id)
+    if current is None:
+        return jsonify({"error": "unknown node", "currentNodeId": current_id}), 400
+    # 客户端只能从已记录的位置（或其一步可达的节点，例如上一次应答未送达）继续
+    if current != position and current not in graph.successors(position):
+        return jsonify({"error": "node out of sync", "currentNodeId": graph.ids[position]}), 409
+
+    target = graph.step(current, body.get("userInput"))
+    if target is None:
+        return json_response(graph.done_body(current))
+    save_position(get_db(), user_id, lesson_id, target, stored)
+    return json_response(graph.node_bodies[target])
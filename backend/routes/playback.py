@@ -0,0 +1,127 @@
+import time
+
+from flask import Blueprint, Response, g, jsonify, request
+
+from config import config
+from utils.auth import require_auth, require_stream_auth
+from utils.db_session import get_db, get_read_db
+from utils.lesson_store import lesson_store, resolve_script_path, sse_frame
+from utils.playback import playback_sessions
+from utils.progress import progress_buffer, saved_index, upsert_progress
+
+bp = Blueprint("playback", __name__)
+
+KEEPALIVE = b": keepalive\n\n"
+
+
+def _start_index(user_id: int, lesson_id: str):
+    """续播位置：Last-Event-ID（断线重连）> from 参数 > 已保存的 LessonProgress.current_index"""
+    last_event_id = request.headers.get("Last-Event-ID")
+    if last_event_id is not None:
+        try:
+            return int(last_event_id) + 1
+        except ValueError:
+            pass
+    if request.args.get("from") is not None:
+        try:
+            return int(request.args["from"])
+        except ValueError:
+            return None
+    if lesson_id:
+        return max(0, saved_index(get_read_db(), user_id, lesson_id))
+    return 0
+
+
+@bp.get("/stream")
+@require_stream_auth
+def stream():
+    """
+    以 SSE 推送课程分段，替代逐段轮询 /api/ai_teacher/next
+    参数: file（剧本，默认 DAY1.txt）、lessonId（用于读取/保存进度）、from（可选起始段）
+    事件: session → segment（id 为段索引，含 delay_ms 节奏信息）... → pause（互动段，
+          等待 POST /api/playback/<sessionId>/ack）→ ... → end
+    互动段最多在连接上等待 PLAYBACK_ACK_HOLD 秒；仍未确认则发送 parked 并结束连接，不占用 worker 线程。
+    客户端确认后以 session=<sessionId> 重新连接，从下一段继续；会话保留 PLAYBACK_ACK_TIMEOUT 秒。
+    parked 消息的 id 为互动段的前一段，浏览器自动重连（Last-Event-ID）时会重放互动段并再次暂停
+    """
+    script_path = resolve_script_path(request.args.get("file", "DAY1.txt"))
+    lesson_id = (request.args.get("lessonId") or "").strip()
+    lesson = lesson_store.get(script_path)
+    if lesson is None or not lesson.segments:
+        return jsonify({"error": "no segments found", "path": script_path}), 404
+
+    session_id = (request.args.get("session") or "").strip()
+    session = playback_sessions.resume(session_id, g.current_user.id, lesson_id) if session_id else None
+    if session is not None:
+        # 停住的会话：已确认则从互动段的下一段继续，否则重放互动段
+        index = session.parked_index
+        start = index + 1 if session.acked >= index else index
+    else:
+        start = _start_index(g.current_user.id, lesson_id)
+        if start is None:
+            return jsonify({"error": "invalid from index"}), 400
+        start = max(0, start)
+        session = playback_sessions.open(g.current_user.id, lesson_id)
+    hold = config.PLAYBACK_ACK_HOLD
+    heartbeat = config.PLAYBACK_HEARTBEAT
+
+    def generate():
+        parked = False
+        try:
+            yield b"retry: 3000\n\n"
+            yield sse_frame("session", {"sessionId": session.id, "start": start, "total": lesson.total})
+            for index in range(start, lesson.total):
+                yield lesson.sse_frames[index]
+                if not lesson.public[index]["is_interaction"]:
+                    continue
+                yield sse_frame("pause", {"sessionId": session.id, "index": index})
+                # 互动段：短暂等待确认，期间定期发送注释行保持连接；超时后结束连接，会话留待重连
+                deadline = time.monotonic() + hold
+                while not session.wait_ack(index, min(heartbeat, max(0.0, deadline - time.monotonic()))):
+                    if time.monotonic() >= deadline:
+                        playback_sessions.park(session, index)
+                        parked = True
+                        yield sse_frame(
+                            "parked", {"sessionId": session.id, "index": index}, event_id=index - 1 if index else ""
+                        )
+                        return
+                    yield KEEPALIVE
+            yield sse_frame("end", {"total": lesson.total})
+        finally:
+            if not parked:
+                playback_sessions.close(session)
+
+    resp = Response(generate(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    # 关闭 nginx 等反向代理的响应缓冲，分段即时送达
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
+@bp.post("/<session_id>/ack")
+@require_auth
+def ack(session_id):
+    """
+    确认互动段已完成，播放流从下一段继续；带 lessonId 的播放会同时保存进度
+    req: { index }
+    res: { ok, index }
+    """
+    payload = request.get_json(force=True, silent=True) or {}
+    try:
+        index = int(payload.get("index"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "index 必须为整数"}), 400
+
+    session = playback_sessions.get(session_id, g.current_user.id)
+    if session is None:
+        return jsonify({"error": "unknown playback session"}), 404
+
+    if session.lesson_id:
+        if progress_buffer.enabled:
+            progress_buffer.add(g.current_user.id, session.lesson_id, max(0, index))
+        else:
+            upsert_progress(get_db(), [{
+                "user_id": g.current_user.id, "lesson_id": session.lesson_id, "current_index": max(0, index),
+            }])
+    session.ack(index)
+    return jsonify({"ok": True, "index": index})
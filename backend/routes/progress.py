@@ -1,26 +1,137 @@
-from flask import Blueprint, g, jsonify, request
+import json
+from datetime import datetime
 
-from models import LessonProgress
-from utils.auth import require_auth
+from flask import Blueprint, Response, g, jsonify, request, stream_with_context
+from sqlalchemy import select
+
+from db import ReadSessionLocal
+from models import LessonProgress, ProgressEvent
+from utils.auth import require_admin, require_auth
+from utils.db_session import get_db, get_read_db
+from utils.progress import merge_pending, progress_buffer, upsert_progress
 
 bp = Blueprint("progress", __name__)
 
 
+def _requested_lesson_ids():
+    # 支持 ?lessons=nn,lr 与 ?lessonId=nn&lessonId=lr 两种写法
+    ids = []
+    for raw in request.args.getlist("lessons") + request.args.getlist("lessonId"):
+        ids.extend(part.strip() for part in raw.split(",") if part.strip())
+    return sorted(set(ids))
+
+
+@bp.get("")
+@require_auth
+def list_progress():
+    """
+    一次返回当前用户的全部（或指定课程的）进度，替代逐课程请求
+    参数: lessons 可选，逗号分隔的课程 id
+    res: { progress: [{ lessonId, currentIndex, updatedAt }] }
+    """
+    lesson_ids = _requested_lesson_ids()
+    query = get_read_db().query(LessonProgress).filter(LessonProgress.user_id == g.current_user.id)
+    if lesson_ids:
+        query = query.filter(LessonProgress.lesson_id.in_(lesson_ids))
+    rows = {p.lesson_id: p.to_dict() for p in query.all()}
+
+    # 叠加写后缓冲中尚未落库的保存
+    if progress_buffer.enabled:
+        for lesson_id, entry in progress_buffer.pending_for_user(g.current_user.id).items():
+            if not lesson_ids or lesson_id in lesson_ids:
+                rows[lesson_id] = merge_pending(rows.get(lesson_id), entry)
+
+    latest = max((r["updatedAt"] for r in rows.values() if r["updatedAt"]), default="0")
+    etag = "{}-{}-{}-{}".format(g.current_user.id, len(rows), latest, ",".join(lesson_ids) or "*")
+
+    resp = jsonify({"progress": list(rows.values())})
+    resp.set_etag(etag, weak=True)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp.make_conditional(request)
+
+
+def _parse_time(value):
+    """空值返回 None；无法解析时抛出 ValueError"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
+
+
+@bp.get("/events/export")
+@require_admin
+def export_events():
+    """
+    以 NDJSON 流式导出进度事件（每行一个 JSON），服务端游标分批读取，内存占用恒定
+    参数: lessonId / since / until 可选（since、until 为 ISO 时间，格式无效时返回 400）
+    """
+    lesson_id = request.args.get("lessonId")
+    try:
+        since = _parse_time(request.args.get("since"))
+        until = _parse_time(request.args.get("until"))
+    except ValueError:
+        return jsonify({"error": "since / until 必须为 ISO 8601 时间"}), 400
+    chunk_size = 1000
+
+    stmt = select(
+        ProgressEvent.id,
+        ProgressEvent.user_id,
+        ProgressEvent.lesson_id,
+        ProgressEvent.current_index,
+        ProgressEvent.rewind,
+        ProgressEvent.created_at,
+    ).order_by(ProgressEvent.id)
+    if lesson_id:
+        stmt = stmt.where(ProgressEvent.lesson_id == lesson_id)
+    if since:
+        stmt = stmt.where(ProgressEvent.created_at >= since)
+    if until:
+        stmt = stmt.where(ProgressEvent.created_at < until)
+
+    def generate():
+        # 独立会话：流式响应的生命周期长于请求内的会话
+        session = ReadSessionLocal()
+        try:
+            result = session.execute(stmt.execution_options(yield_per=chunk_size))
+            for rows in result.partitions():
+                yield "".join(
+                    json.dumps({
+                        "id": row.id,
+                        "userId": row.user_id,
+                        "lessonId": row.lesson_id,
+                        "currentIndex": row.current_index,
+                        "rewind": bool(row.rewind),
+                        "createdAt": row.created_at.isoformat() if row.created_at else None,
+                    }, ensure_ascii=False) + "\n"
+                    for row in rows
+                )
+        finally:
+            session.close()
+
+    resp = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    resp.headers["Content-Disposition"] = "attachment; filename=progress_events.ndjson"
+    return resp
+
+
 @bp.get("/<lesson_id>")
 @require_auth
 def get_progress(lesson_id):
-    session = g.db
+    session = get_read_db()
     progress = (
         session.query(LessonProgress)
         .filter_by(user_id=g.current_user.id, lesson_id=lesson_id)
         .first()
     )
-    current_index = progress.current_index if progress else -1
+    row = progress.to_dict() if progress else None
+    if progress_buffer.enabled:
+        entry = progress_buffer.pending_for_user(g.current_user.id).get(lesson_id)
+        if entry:
+            row = merge_pending(row, entry)
+
     return jsonify(
         {
             "lessonId": lesson_id,
-            "currentIndex": current_index,
-            "updatedAt": progress.updated_at.isoformat() if progress and progress.updated_at else None,
+            "currentIndex": row["currentIndex"] if row else -1,
+            "updatedAt": row["updatedAt"] if row else None,
         }
     )
 
@@ -28,6 +139,10 @@ def get_progress(lesson_id):
 @bp.post("/<lesson_id>")
 @require_auth
 def save_progress(lesson_id):
+    """
+    req: { index, rewind }  rewind 为 true 时允许把进度设回更早的位置，否则只前进不后退
+    res: { ok, progress, buffered }
+    """
     payload = request.get_json(force=True, silent=True) or {}
     index = payload.get("index")
     try:
@@ -37,24 +152,14 @@ def save_progress(lesson_id):
 
     if index_value < 0:
         index_value = 0
+    rewind = bool(payload.get("rewind"))
+    if progress_buffer.enabled:
+        entry = progress_buffer.add(g.current_user.id, lesson_id, index_value, rewind)
+        return jsonify({"ok": True, "buffered": True, "progress": merge_pending(None, entry)})
 
-    session = g.db
-    progress = (
-        session.query(LessonProgress)
-        .filter_by(user_id=g.current_user.id, lesson_id=lesson_id)
-        .first()
-    )
-
-    if not progress:
-        progress = LessonProgress(
-            user_id=g.current_user.id,
-            lesson_id=lesson_id,
-            current_index=index_value,
-        )
-        session.add(progress)
-    else:
-        progress.current_index = index_value
-
-    session.flush()
-
-    return jsonify({"ok": True, "progress": progress.to_dict()})
+    saved = upsert_progress(
+        get_db(),
+        [{"user_id": g.current_user.id, "lesson_id": lesson_id, "current_index": index_value, "rewind": rewind}],
+    )[0]
+    saved.pop("userId", None)
+    return jsonify({"ok": True, "buffered": False, "progress": saved})
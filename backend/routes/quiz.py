@@ -0,0 +1,70 @@
+from flask import Blueprint, g, jsonify, request
+
+from config import config
+from utils.auth import require_auth
+from utils.lesson_graph import lesson_graphs
+from utils.lesson_store import lesson_store, resolve_script_path
+from utils.lessons import lesson_script
+from utils.quiz import check_answer, quiz_buffer
+
+bp = Blueprint("quiz", __name__)
+
+
+def _segment_index(item: dict, lesson_id: str):
+    """作答项以 index（段下标）或 nodeId（课程图节点 id）定位题目"""
+    if item.get("nodeId"):
+        graph = lesson_graphs.get(lesson_id)
+        return graph.index.get(item["nodeId"]) if graph is not None else None
+    try:
+        return int(item.get("index"))
+    except (TypeError, ValueError):
+        return None
+
+
+@bp.post("/check")
+@require_auth
+def check():
+    """
+    服务端判题，答案不下发给前端
+    req: { lessonId, index | nodeId, choice }
+         或批量 { lessonId, answers: [{ index | nodeId, choice }] }
+    res: 单题 { index, choice, correct, answer }
+         批量 { results: [...], correct, total }
+    作答记录异步批量写入，报表中的 avgAccuracy 随之更新（每题按首次作答计）
+    """
+    payload = request.get_json(force=True, silent=True) or {}
+    lesson_id = str(payload.get("lessonId") or "").strip()
+    script = lesson_script(lesson_id)
+    lesson = lesson_store.get(resolve_script_path(script)) if script else None
+    if lesson is None:
+        return jsonify({"error": "lesson not found", "lessonId": lesson_id}), 404
+
+    batch = "answers" in payload
+    items = payload.get("answers") if batch else [payload]
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "answers 必须为非空数组"}), 400
+    if len(items) > config.QUIZ_BATCH_LIMIT:
+        return jsonify({"error": f"单次最多 {config.QUIZ_BATCH_LIMIT} 题"}), 400
+
+    results = []
+    for item in items:
+        if not isinstance(item, dict):
+            results.append({"error": "invalid answer"})
+            continue
+        index = _segment_index(item, lesson_id)
+        if index is None:
+            results.append({"error": "index 必须为整数", "nodeId": item.get("nodeId")})
+            continue
+        results.append(check_answer(lesson, index, item.get("choice")))
+
+    quiz_buffer.add(g.current_user.id, lesson_id, results)
+
+    if not batch:
+        result = results[0]
+        return jsonify(result), (400 if "error" in result else 200)
+    graded = [r for r in results if "error" not in r]
+    return jsonify({
+        "results": results,
+        "correct": sum(1 for r in graded if r["correct"]),
+        "total": len(graded),
+    })
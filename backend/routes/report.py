@@ -1,15 +1,12 @@
-from flask import Blueprint, g, jsonify
+from flask import Blueprint, g, jsonify, request
 
-from models import LessonProgress
-from utils.auth import require_auth
+from utils.auth import require_auth, require_staff
+from utils.cohort import cohort_stats
+from utils.db_session import get_db, get_read_db
+from utils.reports import get_report, report_summary
 
 bp = Blueprint("report", __name__)
 
-LESSON_META = {
-    "nn": {"title": "神经网络入门", "segments": 15},
-    "lr": {"title": "线性回归基础", "segments": 8},
-}
-
 
 @bp.get("/summary")
 @require_auth
@@ -18,26 +15,27 @@ def summary():
     与前端 /api/report/summary 对齐
     res: { scoresByLesson, totalXp, avgAccuracy }
     """
-    session = g.db
-    progresses = session.query(LessonProgress).filter_by(user_id=g.current_user.id).all()
-
-    scores = {}
-    total_xp = 0
-    ratios = []
-
-    for prog in progresses:
-        meta = LESSON_META.get(prog.lesson_id, {"title": prog.lesson_id, "segments": 1})
-        total_segments = max(1, meta.get("segments", 1))
-        completed = min(total_segments, prog.current_index + 1)
-        ratio = completed / total_segments
-        scores[meta["title"]] = int(ratio * 100)
-        total_xp += completed * 10
-        ratios.append(ratio)
-
-    avg_accuracy = sum(ratios) / len(ratios) if ratios else 0.0
-
-    return jsonify({
-        "scoresByLesson": scores,
-        "totalXp": total_xp,
-        "avgAccuracy": round(avg_accuracy, 2)
+    report = get_report(get_read_db(), g.current_user.id, write_session_factory=get_db)
+
+    resp = jsonify(report_summary(report))
+    resp.set_etag(f"report-{report.user_id}-{report.version}", weak=True)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp.make_conditional(request)
+
+
+@bp.get("/cohort")
+@require_staff
+def cohort():
+    """
+    班级看板（仅教师/管理员）：各课程完成度直方图、中位进度与流失位置
+    参数: lessons 可选，逗号分隔的课程 id（未登记的课程 id 会被忽略）
+    res: { lessons: [{ lessonId, title, students, histogram, medianIndex, dropOff, ... }], generatedAt }
+    """
+    lesson_ids = sorted({
+        part.strip() for part in request.args.get("lessons", "").split(",") if part.strip()
     })
+    result, remaining = cohort_stats(get_read_db(), lesson_ids)
+
+    resp = jsonify(result)
+    resp.headers["Cache-Control"] = f"private, max-age={remaining}"
+    return resp
@@ -0,0 +1,165 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import g, request
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时直接丢弃并计数，绝不阻塞请求线程"""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 同进程内消费，无需在请求线程里提前格式化
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录一行 JSON；结构化字段放在 record.fields 中"""
+
+    def format(self, record):
+        data = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            data.update(fields)
+        else:
+            data["msg"] = record.getMessage()
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class LogPipeline:
+    """
+    日志管线：请求线程只做一次非阻塞入队，由后台 QueueListener 线程统一写出。
+    fork 后子进程首次记录日志时会重新启动自己的写线程。
+    """
+
+    def __init__(self):
+        self.handler = None
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def configure(self, level: str, queue_size: int, log_file: str = "", loggers=("app", "access")):
+        if self.handler is not None:
+            return
+        target = logging.FileHandler(log_file, encoding="utf-8") if log_file else logging.StreamHandler(sys.stdout)
+        target.setFormatter(JsonFormatter())
+        self.handler = DroppingQueueHandler(queue.Queue(maxsize=max(1, queue_size)))
+        self._target = target
+        for name in loggers:
+            logger = logging.getLogger(name)
+            logger.handlers = [self.handler]
+            logger.setLevel(level)
+            logger.propagate = False
+        self.ensure_started()
+        atexit.register(self.stop)
+
+    def ensure_started(self):
+        if self.handler is None or (self._listener is not None and self._pid == os.getpid()):
+            return
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                return
+            self._listener = logging.handlers.QueueListener(self.handler.queue, self._target)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def after_fork(self):
+        """fork 后在子进程调用：父进程的写线程可能正持有旧队列的锁，换用新队列并启动本进程写线程"""
+        if self.handler is None:
+            return
+        self.handler.queue = queue.Queue(maxsize=self.handler.queue.maxsize)
+        self._listener = None
+        self.ensure_started()
+
+    def stop(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+
+    def stats(self) -> dict:
+        if self.handler is None:
+            return {"queued": 0, "dropped": 0}
+        return {"queued": self.handler.queue.qsize(), "dropped": self.handler.dropped}
+
+
+pipeline = LogPipeline()
+
+
+def parse_sample_rates(spec: str) -> dict:
+    """解析 "api_health=0,serve_frontend=0.1" 形式的按端点采样率"""
+    rates = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        name, value = part.split("=", 1)
+        try:
+            rates[name.strip()] = max(0.0, min(1.0, float(value)))
+        except ValueError:
+            continue
+    return rates
+
+
+class AccessLog:
+    """结构化访问日志：路由、状态码、耗时、用户、响应字节数；按端点采样，5xx 总是记录"""
+
+    def __init__(self, default_rate: float = 1.0, rates: dict = None):
+        self.default_rate = default_rate
+        self.rates = rates or {}
+        self.logger = logging.getLogger("access")
+
+    def init_app(self, app):
+        app.before_request(self._start_timer)
+        app.after_request(self._log_response)
+
+    @staticmethod
+    def _start_timer():
+        g.request_started = time.perf_counter()
+
+    def _sampled(self, endpoint, status: int) -> bool:
+        if status >= 500:
+            return True
+        rate = self.rates.get(endpoint, self.default_rate)
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+    def _log_response(self, response):
+        started = g.get("request_started")
+        if started is None or not self._sampled(request.endpoint, response.status_code):
+            return response
+        pipeline.ensure_started()
+        user = g.get("current_user")
+        self.logger.info("access", extra={"fields": {
+            "method": request.method,
+            "route": request.url_rule.rule if request.url_rule else None,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            "user": getattr(user, "id", None),
+            "bytes": None if response.is_streamed else response.calculate_content_length(),
+            "remote": request.remote_addr,
+        }})
+        return response
@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+from utils.llm import UNAVAILABLE_ANSWER
+from utils.metrics import LLM_CHARS, LLM_ERRORS, LLM_LATENCY, LLM_TOKENS
+
+# 可选依赖：ASGI 服务路径使用 httpx 异步客户端，未安装时返回占位回答
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class AsyncLLMClient:
+    """
+    基于 httpx.AsyncClient 的 OpenAI 兼容 chat/completions 客户端，连接在请求间复用。
+    等待模型返回期间只占用一个协程；连接数达到上限时后续请求在信号量上排队
+    （httpx 连接池内部排队在等待者很多时开销明显，因此不直接依赖它）。
+    客户端绑定事件循环，在所属 worker 的事件循环中首次调用时创建。
+    """
+
+    def __init__(self, base_url: str, api_key: str, model: str, temperature: float,
+                 timeout: float, max_connections: int):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.temperature = temperature
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+        self._slots = None
+        self.in_flight = 0
+        self.completed = 0
+
+    @property
+    def available(self) -> bool:
+        return httpx is not None and bool(self.api_key)
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            self._slots = asyncio.Semaphore(self.max_connections)
+        return self._client
+
+    async def chat(self, prompt: str, kind: str = "qa") -> str:
+        """单轮对话，返回回答文本；失败时与同步路径一致返回错误提示字符串"""
+        if not self.available:
+            return UNAVAILABLE_ANSWER
+        client = self._get_client()
+        started = None
+        self.in_flight += 1
+        try:
+            # 排队等待空闲连接的时间不计入单次请求超时，也不计入模型耗时指标
+            async with self._slots:
+                started = time.perf_counter()
+                resp = await client.post("/chat/completions", json={
+                    "model": self.model,
+                    "messages": [{"role": "user", "content": prompt}],
+                    "temperature": self.temperature,
+                })
+            resp.raise_for_status()
+            data = resp.json()
+            answer = data["choices"][0]["message"]["content"] or ""
+            usage = data.get("usage") or {}
+            LLM_CHARS.inc((kind, "prompt"), len(prompt))
+            LLM_CHARS.inc((kind, "completion"), len(answer))
+            # 接口返回用量时另记真实 token 数
+            if "prompt_tokens" in usage:
+                LLM_TOKENS.inc((kind, "prompt"), usage["prompt_tokens"])
+            if "completion_tokens" in usage:
+                LLM_TOKENS.inc((kind, "completion"), usage["completion_tokens"])
+            return answer
+        except Exception as e:
+            LLM_ERRORS.inc((kind,))
+            return f"回答生成出错：{e}"
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            if started is not None:
+                LLM_LATENCY.observe(time.perf_counter() - started, (kind,))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {
+            "available": self.available,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "max_connections": self.max_connections,
+        }
@@ -1,10 +1,15 @@
+import hmac
 from functools import wraps
 
 from flask import current_app, g, jsonify, request
 from itsdangerous import BadSignature, BadTimeSignature, URLSafeTimedSerializer
 
-from db import SessionLocal
 from models import User
+from utils.db_session import get_db, get_read_db
+
+
+def normalize_email(value: str) -> str:
+    return (value or "").strip().lower()
 
 
 def _get_serializer():
@@ -26,6 +31,23 @@ def verify_token(token: str):
         return None
 
 
+def _authenticate(token: str):
+    """校验令牌并加载用户到 g.current_user；失败时返回错误响应，成功返回 None"""
+    user_id = verify_token(token)
+    if not user_id:
+        return jsonify({"error": "invalid or expired token"}), 401
+
+    # 只读请求走只读引擎，避免占用写连接
+    session = get_read_db() if request.method in ("GET", "HEAD") else get_db()
+
+    user = session.get(User, user_id)
+    if not user:
+        return jsonify({"error": "user not found"}), 404
+
+    g.current_user = user
+    return None
+
+
 def require_auth(view_func):
     @wraps(view_func)
     def wrapper(*args, **kwargs):
@@ -33,21 +55,68 @@ def require_auth(view_func):
         if not auth_header.startswith("Bearer "):
             return jsonify({"error": "authorization required"}), 401
 
-        token = auth_header.split(" ", 1)[1].strip()
-        user_id = verify_token(token)
-        if not user_id:
-            return jsonify({"error": "invalid or expired token"}), 401
+        error = _authenticate(auth_header.split(" ", 1)[1].strip())
+        if error is not None:
+            return error
+        return view_func(*args, **kwargs)
 
-        session = getattr(g, "db", None)
-        if session is None:
-            session = SessionLocal()
-            g.db = session
+    return wrapper
 
-        user = session.get(User, user_id)
-        if not user:
-            return jsonify({"error": "user not found"}), 404
 
-        g.current_user = user
+def require_stream_auth(view_func):
+    """
+    供 EventSource 等无法设置请求头的客户端使用：优先读取 Authorization 头，
+    否则读取查询参数 access_token（访问日志只记录 path，不会写入令牌）
+    """
+    @wraps(view_func)
+    def wrapper(*args, **kwargs):
+        auth_header = request.headers.get("Authorization", "")
+        if auth_header.startswith("Bearer "):
+            token = auth_header.split(" ", 1)[1].strip()
+        else:
+            token = request.args.get("access_token", "").strip()
+        if not token:
+            return jsonify({"error": "authorization required"}), 401
+
+        error = _authenticate(token)
+        if error is not None:
+            return error
+        return view_func(*args, **kwargs)
+
+    return wrapper
+
+
+def _admin_token_ok() -> bool:
+    expected = current_app.config.get("ADMIN_TOKEN") or ""
+    provided = request.headers.get("X-Admin-Token", "")
+    return bool(expected) and hmac.compare_digest(provided, expected)
+
+
+def require_admin(view_func):
+    """管理接口：校验请求头 X-Admin-Token 与配置的 ADMIN_TOKEN 一致"""
+    @wraps(view_func)
+    def wrapper(*args, **kwargs):
+        if not _admin_token_ok():
+            return jsonify({"error": "admin token required"}), 403
+        return view_func(*args, **kwargs)
+
+    return wrapper
+
+
+def require_staff(view_func):
+    """教师/管理员接口：携带有效 X-Admin-Token，或登录用户的角色为 teacher / admin"""
+    @wraps(view_func)
+    def wrapper(*args, **kwargs):
+        if _admin_token_ok():
+            return view_func(*args, **kwargs)
+        auth_header = request.headers.get("Authorization", "")
+        if not auth_header.startswith("Bearer "):
+            return jsonify({"error": "authorization required"}), 401
+        error = _authenticate(auth_header.split(" ", 1)[1].strip())
+        if error is not None:
+            return error
+        if not g.current_user.is_staff:
+            return jsonify({"error": "teacher or admin role required"}), 403
         return view_func(*args, **kwargs)
 
     return wrapper
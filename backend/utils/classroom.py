@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import os
+import secrets
+import threading
+import time
+
+from sqlalchemy import select, update
+
+from config import config
+from db import ReadSessionLocal
+from models import Classroom
+from utils.lesson_store import lesson_store, sse_frame
+
+logger = logging.getLogger("app")
+
+# 课堂码：去掉易混淆的 0/O、1/I
+CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+CODE_LENGTH = 6
+
+
+class ClassroomCodeUnavailable(Exception):
+    """连续生成的课堂码都已被占用"""
+
+
+def _new_code() -> str:
+    return "".join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+
+
+def classroom_frame(script_path: str, index: int, version: int, closed: bool = False) -> bytes:
+    """一次广播的 SSE 消息；段落 JSON 直接复用剧本预序列化的响应体，所有学生共享同一份字节"""
+    if closed:
+        return sse_frame("closed", {"version": version}, event_id=version)
+    lesson = lesson_store.get(script_path)
+    if lesson is None or not 0 <= index < lesson.total:
+        return sse_frame("segment", {"index": index, "missing": True}, event_id=version)
+    return (f"id: {version}\nevent: segment\ndata: ").encode("utf-8") + lesson.segment_bodies[index] + b"\n\n"
+
+
+class Room:
+    __slots__ = (
+        "code", "teacher_id", "script_path", "index", "version", "closed", "frame", "subscribers", "_cond", "_waiters",
+    )
+
+    def __init__(self, code, teacher_id, script_path, index, version, closed=False):
+        self.code = code
+        self.teacher_id = teacher_id
+        self.script_path = script_path
+        self.subscribers = 0
+        self._cond = threading.Condition()
+        self._waiters = []  # ASGI 订阅者：[(事件循环, future)]
+        self.index = index
+        self.version = version
+        self.closed = closed
+        self.frame = classroom_frame(script_path, index, version, closed)
+
+    def publish(self, index: int, version: int, closed: bool = False) -> bool:
+        """更新状态并唤醒全部订阅者；旧版本（其他 worker 已同步过的）忽略"""
+        frame = classroom_frame(self.script_path, index, version, closed)
+        with self._cond:
+            if version <= self.version:
+                return False
+            self.index, self.version, self.closed, self.frame = index, version, closed, frame
+            self._cond.notify_all()
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+        return True
+
+    def state(self):
+        """(index, version, closed) 的一致快照"""
+        with self._cond:
+            return self.index, self.version, self.closed
+
+    def wait(self, seen_version: int, timeout: float):
+        """阻塞到版本变化或超时；返回 (version, frame, closed)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != seen_version or self.closed, timeout=timeout)
+            return self.version, self.frame, self.closed
+
+    async def wait_async(self, seen_version: int, timeout: float):
+        """wait 的协程版本：不占用线程，由 publish 通过 call_soon_threadsafe 唤醒"""
+        loop = asyncio.get_running_loop()
+        future = None
+        with self._cond:
+            if self.version == seen_version and not self.closed:
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+        if future is not None:
+            try:
+                await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._cond:
+                    if (loop, future) in self._waiters:
+                        self._waiters.remove((loop, future))
+        with self._cond:
+            return self.version, self.frame, self.closed
+
+    def to_dict(self) -> dict:
+        index, version, closed = self.state()
+        return {
+            "code": self.code,
+            "index": index,
+            "version": version,
+            "closed": closed,
+            "subscribers": self.subscribers,
+        }
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ClassroomRegistry:
+    """
+    按课堂码索引的订阅者注册表。每个进程只登记本进程有学生连接的房间，最后一个订阅者断开即移除；
+    教师推进时写一次 classrooms 表并在本进程广播，其余 worker 由后台线程按间隔批量读取版本号后各自广播，
+    与学生人数无关。
+    """
+
+    def __init__(self, sync_interval: float, max_thread_subscribers: int):
+        self.sync_interval = sync_interval
+        self.max_thread_subscribers = max_thread_subscribers
+        self._rooms = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.thread_subscribers = 0
+        self.broadcasts = 0
+
+    def create(self, session, teacher_id: int, script_path: str) -> Room:
+        for _ in range(5):
+            code = _new_code()
+            if session.get(Classroom, code) is None:
+                break
+        else:
+            raise ClassroomCodeUnavailable("could not allocate a unique classroom code")
+        row = Classroom(code=code, teacher_id=teacher_id, script_path=script_path, current_index=0, version=1)
+        session.add(row)
+        session.flush()
+        return Room(row.code, row.teacher_id, row.script_path, row.current_index, row.version, row.closed)
+
+    def get(self, session, code: str):
+        """
+        读取课堂最新状态：本进程已登记的房间按数据库版本号补发落后的广播后返回，
+        否则返回一个未登记的房间（订阅时才登记）
+        """
+        row = session.execute(
+            select(
+                Classroom.code, Classroom.teacher_id, Classroom.script_path,
+                Classroom.current_index, Classroom.version, Classroom.closed,
+            ).where(Classroom.code == code)
+        ).first()
+        if row is None:
+            return None
+        room = self._rooms.get(code)
+        if room is None:
+            return Room(row.code, row.teacher_id, row.script_path, row.current_index, row.version, row.closed)
+        if row.version > room.version and room.publish(row.current_index, row.version, row.closed):
+            self.broadcasts += 1
+        return room
+
+    def advance(self, session, room: Room, index: int, expected_version: int):
+        """
+        教师推进到 index：仅当数据库中的版本号仍为 expected_version 且课堂未关闭时更新（单条 UPDATE），
+        随后本进程广播；返回广播耗时（毫秒），版本已变化或课堂已关闭时返回 None
+        """
+        version = session.execute(
+            update(Classroom)
+            .where(Classroom.code == room.code, Classroom.version == expected_version, Classroom.closed.is_(False))
+            .values(current_index=index, version=Classroom.version + 1)
+            .returning(Classroom.version)
+        ).scalar_one_or_none()
+        if version is None:
+            return None
+        return self._broadcast(room, index, version, False)
+
+    def close(self, session, room: Room):
+        """关闭课堂并广播 closed；已关闭时返回 None"""
+        row = session.execute(
+            update(Classroom)
+            .where(Classroom.code == room.code, Classroom.closed.is_(False))
+            .values(version=Classroom.version + 1, closed=True)
+            .returning(Classroom.current_index, Classroom.version)
+        ).first()
+        if row is None:
+            return None
+        return self._broadcast(room, row.current_index, row.version, True)
+
+    def _broadcast(self, room: Room, index: int, version: int, closed: bool) -> float:
+        started = time.perf_counter()
+        if room.publish(index, version, closed):
+            self.broadcasts += 1
+        return (time.perf_counter() - started) * 1000
+
+    def subscribe(self, room: Room, thread: bool = True):
+        """
+        登记订阅者并返回本进程共享的房间（同一课堂码已登记时返回已登记的那个）。
+        thread 为真表示订阅连接占用一个 worker 线程（WSGI 路径），超过 max_thread_subscribers 时返回 None
+        """
+        with self._lock:
+            if thread:
+                if self.thread_subscribers >= self.max_thread_subscribers:
+                    return None
+                self.thread_subscribers += 1
+            shared = self._rooms.setdefault(room.code, room)
+            shared.subscribers += 1
+        if shared is not room and room.version > shared.version:
+            shared.publish(room.index, room.version, room.closed)
+        self._ensure_thread()
+        return shared
+
+    def unsubscribe(self, room: Room, thread: bool = True):
+        with self._lock:
+            if thread:
+                self.thread_subscribers -= 1
+            room.subscribers -= 1
+            # 无人订阅的房间从本进程移除，之后的读取直接查库
+            if room.subscribers <= 0 and self._rooms.get(room.code) is room:
+                del self._rooms[room.code]
+
+    def _ensure_thread(self):
+        # fork 后的子进程需要自己的同步线程
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="classroom-sync", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                self.sync()
+            except Exception:
+                logger.exception("classroom sync failed")
+
+    def sync(self) -> int:
+        """一次查询取回本进程有订阅者的房间的最新版本，版本变化的在本进程广播"""
+        with self._lock:
+            watched = {code: room for code, room in self._rooms.items() if room.subscribers > 0}
+        if not watched:
+            return 0
+        session = ReadSessionLocal()
+        try:
+            rows = session.execute(
+                select(Classroom.code, Classroom.current_index, Classroom.version, Classroom.closed)
+                .where(Classroom.code.in_(list(watched)))
+            ).all()
+        finally:
+            session.close()
+        published = 0
+        for row in rows:
+            room = watched[row.code]
+            if row.version > room.version and room.publish(row.current_index, row.version, row.closed):
+                published += 1
+        self.broadcasts += published
+        return published
+
+    def stats(self) -> dict:
+        with self._lock:
+            rooms = list(self._rooms.values())
+        return {
+            "rooms": len(rooms),
+            "subscribers": sum(r.subscribers for r in rooms),
+            "thread_subscribers": self.thread_subscribers,
+            "max_thread_subscribers": self.max_thread_subscribers,
+            "broadcasts": self.broadcasts,
+        }
+
+
+classrooms = ClassroomRegistry(
+    sync_interval=config.CLASSROOM_SYNC_INTERVAL, max_thread_subscribers=config.CLASSROOM_MAX_THREAD_SUBSCRIBERS,
+)
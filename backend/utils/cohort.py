@@ -0,0 +1,135 @@
+import threading
+import time
+
+from sqlalchemy import func, literal, select, union_all
+
+from config import config
+from models import LessonProgress
+from utils.lessons import LESSON_META, lesson_meta, lesson_segments
+from utils.memory import memory_sources
+from utils.metrics import record_cache
+
+# 完成度直方图的桶数（每桶 10%）
+HISTOGRAM_BUCKETS = 10
+
+_cache = {}
+_cache_lock = threading.Lock()
+memory_sources.register("cohort_cache", lambda: _cache)
+
+
+def _lesson_meta_table():
+    # 以 UNION ALL 字面量构造课程元数据子查询，兼容 SQLite / Postgres
+    rows = [
+        select(
+            literal(lesson_id).label("lesson_id"),
+            literal(meta["title"]).label("title"),
+            literal(lesson_segments(lesson_id)).label("segments"),
+        )
+        for lesson_id, meta in LESSON_META.items()
+    ]
+    return union_all(*rows).subquery("lesson_meta")
+
+
+def _query_distribution(session, lesson_ids):
+    """数据库内 GROUP BY：每门课程每个进度位置上的学生数（结果规模只与段数有关）"""
+    meta = _lesson_meta_table()
+    stmt = (
+        select(
+            LessonProgress.lesson_id,
+            meta.c.title,
+            meta.c.segments,
+            LessonProgress.current_index,
+            func.count().label("students"),
+        )
+        .select_from(LessonProgress)
+        .outerjoin(meta, meta.c.lesson_id == LessonProgress.lesson_id)
+        .group_by(LessonProgress.lesson_id, meta.c.title, meta.c.segments, LessonProgress.current_index)
+        .order_by(LessonProgress.lesson_id, LessonProgress.current_index)
+    )
+    if lesson_ids:
+        stmt = stmt.where(LessonProgress.lesson_id.in_(lesson_ids))
+    return session.execute(stmt).all()
+
+
+def _summarize(lesson_id, title, segments, distribution):
+    segments = max(1, segments or lesson_segments(lesson_id))
+    students = sum(count for _, count in distribution)
+    histogram = [0] * HISTOGRAM_BUCKETS
+    stopped = {}
+    completed = 0
+    for index, count in distribution:
+        reached = max(0, min(segments, (index or 0) + 1))
+        bucket = min(HISTOGRAM_BUCKETS - 1, reached * HISTOGRAM_BUCKETS // segments)
+        histogram[bucket] += count
+        if reached >= segments:
+            completed += count
+        else:
+            stopped[reached - 1] = stopped.get(reached - 1, 0) + count
+
+    # 中位数：按进度位置累计人数，过半处即为中位所在段
+    median_index = None
+    cumulative = 0
+    for index, count in distribution:
+        cumulative += count
+        if cumulative * 2 >= students:
+            median_index = max(0, min(segments - 1, index or 0))
+            break
+
+    drop_off = sorted(stopped.items(), key=lambda item: (-item[1], item[0]))[:3]
+    return {
+        "lessonId": lesson_id,
+        "title": title or lesson_meta(lesson_id)["title"],
+        "segments": segments,
+        "students": students,
+        "completed": completed,
+        "completionRate": round(completed / students, 4) if students else 0.0,
+        "histogram": histogram,
+        "medianIndex": median_index,
+        "dropOff": [{"index": index, "students": count} for index, count in drop_off],
+    }
+
+
+def compute_cohort(session, lesson_ids):
+    lessons = {}
+    for lesson_id, title, segments, index, count in _query_distribution(session, lesson_ids):
+        entry = lessons.setdefault(lesson_id, {"title": title, "segments": segments, "distribution": []})
+        entry["distribution"].append((index, count))
+    return [
+        _summarize(lesson_id, e["title"], e["segments"], e["distribution"])
+        for lesson_id, e in lessons.items()
+    ]
+
+
+def cohort_stats(session, lesson_ids):
+    """
+    带时间分桶缓存的班级统计：同一时间桶内的刷新直接命中缓存，
+    桶切换时旧结果自然失效。返回 (结果, 桶剩余秒数)。
+    课程 id 只保留 LESSON_META 中已登记的，缓存条目数不超过 COHORT_CACHE_MAX
+    """
+    requested = bool(lesson_ids)
+    lesson_ids = sorted({lesson_id for lesson_id in lesson_ids if lesson_id in LESSON_META})
+    ttl = max(1, config.COHORT_CACHE_TTL)
+    now = time.time()
+    bucket = int(now // ttl)
+    remaining = int(ttl - (now % ttl)) or 1
+    if requested and not lesson_ids:
+        return {"lessons": [], "generatedAt": int(now)}, remaining
+    key = (tuple(lesson_ids), bucket)
+
+    with _cache_lock:
+        hit = _cache.get(key)
+    record_cache("cohort", hit is not None)
+    if hit is not None:
+        return hit, remaining
+
+    result = {
+        "lessons": compute_cohort(session, lesson_ids),
+        "generatedAt": int(now),
+    }
+    with _cache_lock:
+        for stale in [k for k in _cache if k[1] != bucket]:
+            del _cache[stale]
+        _cache[key] = result
+        while len(_cache) > max(1, config.COHORT_CACHE_MAX):
+            del _cache[next(iter(_cache))]
+    return result, remaining
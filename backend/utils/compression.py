@@ -0,0 +1,110 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+from flask import g, request
+
+from utils.metrics import record_cache
+
+# 可选依赖：未安装 brotli 时只使用 gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def set_compress_cache_key(*parts):
+    """
+    由处理函数声明：本次响应体只取决于 parts（如剧本路径 + 版本），
+    压缩结果可按该键缓存复用，同一课程内容只压缩一次。
+    """
+    g.compress_cache_key = parts
+
+
+class ResponseCompressor:
+    """
+    响应压缩中间件：超过阈值、类型在白名单内且客户端支持时压缩（br 优先，其次 gzip）。
+    流式响应、已编码响应与非 200 响应保持原样。
+    """
+
+    def __init__(self, min_size: int, level: int, mimetypes, cache_entries: int = 64):
+        self.min_size = min_size
+        self.level = level
+        self.mimetypes = set(mimetypes)
+        self.cache_entries = cache_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        app.after_request(self.compress_response)
+        app.extensions["compressor"] = self
+
+    def _choose_encoding(self):
+        accepted = request.accept_encodings
+        if brotli is not None and accepted["br"]:
+            return "br"
+        if accepted["gzip"]:
+            return "gzip"
+        return None
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=min(11, max(0, self.level)))
+        return gzip.compress(body, compresslevel=min(9, max(1, self.level)), mtime=0)
+
+    def _cached_compress(self, key, body: bytes, encoding: str) -> bytes:
+        cache_key = (key, encoding)
+        with self._lock:
+            hit = self._cache.get(cache_key)
+            if hit is not None:
+                self._cache.move_to_end(cache_key)
+                self.hits += 1
+        if hit is not None:
+            record_cache("compressed_body", True)
+            return hit
+        record_cache("compressed_body", False)
+        compressed = self._compress(body, encoding)
+        with self._lock:
+            self.misses += 1
+            self._cache[cache_key] = compressed
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return compressed
+
+    def compress_response(self, response):
+        if response.status_code != 200 or response.direct_passthrough or response.is_streamed:
+            return response
+        if "Content-Encoding" in response.headers or response.mimetype not in self.mimetypes:
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = self._choose_encoding()
+        if encoding is None:
+            return response
+
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+
+        key = g.get("compress_cache_key")
+        compressed = self._cached_compress(key, body, encoding) if key else self._compress(body, encoding)
+        if len(compressed) >= len(body):
+            return response
+
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        # 强 ETag 要求逐字节一致，压缩后降为弱 ETag；弱 ETag 保持不变，条件请求仍然有效
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "bytes": sum(len(v) for v in self._cache.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
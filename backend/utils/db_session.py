@@ -0,0 +1,45 @@
+from flask import g
+
+from db import ReadSessionLocal, SessionLocal, has_pending_writes
+
+
+def get_db():
+    """当前请求的读写会话：首次访问时才创建，不访问数据库的请求不占用连接"""
+    session = getattr(g, "db", None)
+    if session is None:
+        session = SessionLocal()
+        g.db = session
+    return session
+
+
+def close_db(exception=None):
+    """请求结束：出错回滚；只有确实写过数据才提交"""
+    session = g.pop("db", None)
+    if session is None:
+        return
+    try:
+        if exception is not None:
+            session.rollback()
+        elif has_pending_writes(session):
+            try:
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+    finally:
+        session.close()
+
+
+def get_read_db():
+    """当前请求的只读会话（首次使用时创建，请求结束时关闭，从不提交）"""
+    session = getattr(g, "read_db", None)
+    if session is None:
+        session = ReadSessionLocal()
+        g.read_db = session
+    return session
+
+
+def close_read_db():
+    session = g.pop("read_db", None)
+    if session is not None:
+        session.close()
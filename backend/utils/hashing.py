@@ -0,0 +1,150 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from config import config
+
+
+class HashPoolBusy(RuntimeError):
+    """哈希进程池排队已满，等待超时"""
+
+
+@lru_cache(maxsize=8)
+def _method_prefix(method: str) -> str:
+    # werkzeug 的哈希格式为 "<方法:参数>$<salt>$<hash>"，前缀即当前哈希参数
+    return generate_password_hash("probe", method=method).split("$", 1)[0]
+
+
+def _hash_job(password: str, method: str) -> str:
+    return generate_password_hash(password, method=method)
+
+
+def _hash_chunk(passwords, method: str) -> list:
+    return [generate_password_hash(p, method=method) for p in passwords]
+
+
+def _verify_job(pwhash: str, password: str, method: str, prefix: str):
+    """在子进程中校验密码；若哈希参数已变更则顺便重新哈希，避免二次排队"""
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if pwhash.split("$", 1)[0] != prefix:
+        return True, generate_password_hash(password, method=method)
+    return True, None
+
+
+class PasswordHasher:
+    """
+    把 CPU 密集的密码哈希放到有界进程池执行，避免阻塞请求线程（GIL）。
+    workers <= 0 时退化为在当前线程内直接计算（便于本地调试）。
+    """
+
+    def __init__(self, workers: int, max_pending: int, wait_timeout: float, method: str):
+        self.workers = workers
+        self.max_pending = max(1, max_pending)
+        self.wait_timeout = wait_timeout
+        self.method = method
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self._rejected = 0
+        self._completed = 0
+
+    def _get_executor(self):
+        with self._lock:
+            # fork 之后父进程的进程池在子进程中不可用，需按 pid 重新创建
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _acquire(self):
+        # 排队已满时只短暂等待即返回 503，不让请求线程长时间挂起
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            with self._lock:
+                self._rejected += 1
+            raise HashPoolBusy("password hash queue is full")
+        with self._lock:
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+        self._slots.release()
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        self._acquire()
+        try:
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._release()
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash_job, password, self.method)
+
+    def verify(self, pwhash: str, password: str):
+        """返回 (是否匹配, 新哈希或 None)；新哈希非空时调用方应写回数据库"""
+        return self._run(_verify_job, pwhash, password, self.method, _method_prefix(self.method))
+
+    def hash_many(self, passwords):
+        """
+        批量哈希（如名册导入），按块分发，结果顺序与输入一致。
+        每块占用一个排队槽位，同时在途的块不超过 worker 数与一半槽位，为登录/注册留出余量；排队已满时抛出 HashPoolBusy
+        """
+        passwords = list(passwords)
+        if not passwords:
+            return []
+        if self.workers <= 0:
+            return _hash_chunk(passwords, self.method)
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        window = min(self.workers, max(1, self.max_pending // 2))
+        executor = self._get_executor()
+        results = []
+        in_flight = deque()
+        try:
+            for start in range(0, len(passwords), chunksize):
+                if len(in_flight) >= window:
+                    results.extend(in_flight.popleft().result())
+                    self._release()
+                self._acquire()
+                try:
+                    in_flight.append(executor.submit(_hash_chunk, passwords[start:start + chunksize], self.method))
+                except Exception:
+                    self._release()
+                    raise
+            while in_flight:
+                results.extend(in_flight.popleft().result())
+                self._release()
+        finally:
+            # 出错时等待已提交的块结束再归还槽位
+            while in_flight:
+                future = in_flight.popleft()
+                future.exception()
+                self._release()
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "rejected": self._rejected,
+                "completed": self._completed,
+            }
+
+
+password_hasher = PasswordHasher(
+    workers=config.HASH_WORKERS,
+    max_pending=config.HASH_MAX_PENDING,
+    wait_timeout=config.HASH_WAIT_TIMEOUT,
+    method=config.PASSWORD_HASH_METHOD,
+)
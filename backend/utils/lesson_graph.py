@@ -0,0 +1,205 @@
+import re
+import threading
+from collections import deque
+
+from utils.lesson_store import json_bytes, lesson_store, resolve_script_path
+from utils.lessons import XP_PER_SEGMENT, lesson_script
+from utils.progress import progress_buffer, upsert_progress
+from utils.script_parser import option_choices, strip_answer_tags
+
+# 选项末尾的跳转标注，例如 "C. 直接动手实验 -> 3. 实践环节"，目标为场景名（或其前缀）
+_BRANCH_RE = re.compile(r'\s*(?:->|→)\s*(.+?)\s*$')
+# 与 script_parser.option_choices 一致的严格选项行，组成题干时去掉
+_CHOICE_LINE_RE = re.compile(r'^\s*[A-Z]\s*[\.．、:：)）]')
+
+
+def _node_type(choices: list, has_answer: bool) -> str:
+    if not choices:
+        return "narration"
+    return "quiz" if has_answer else "choice"
+
+
+def _input_label(user_input):
+    """userInput 可以是选项字母，或 {"choice": "B"} / {"answer": "B"}"""
+    if isinstance(user_input, dict):
+        user_input = user_input.get("choice") or user_input.get("answer")
+    if isinstance(user_input, str) and user_input.strip():
+        return user_input.strip()[0].upper()
+    return None
+
+
+def _bfs(start_nodes, edges, size):
+    dist = [None] * size
+    queue = deque()
+    for node in start_nodes:
+        dist[node] = 0
+        queue.append(node)
+    while queue:
+        node = queue.popleft()
+        for target in edges[node]:
+            if dist[target] is None:
+                dist[target] = dist[node] + 1
+                queue.append(target)
+    return dist
+
+
+class LessonGraph:
+    """
+    课程图：剧本分段编译为旁白 / 测验 / 选择节点。每个节点一张转移表（选项字母 -> 目标节点），
+    没有对应分支时走默认的下一节点；节点 id 到下标为字典查找，一次 next 为 O(1)。
+    进度（percent / xp）按节点在图中的位置预先计算，节点响应体随图一起序列化。
+    """
+
+    __slots__ = ("lesson_id", "path", "version", "ids", "index", "types", "defaults", "transitions",
+                 "percent", "xp", "node_bodies")
+
+    def __init__(self, lesson_id: str, lesson):
+        self.lesson_id = lesson_id
+        self.path = lesson.path
+        self.version = lesson.version
+        segments = lesson.segments
+        total = len(segments)
+        self.ids = [f"{lesson_id}-{i + 1:03d}" for i in range(total)]
+        self.index = {node_id: i for i, node_id in enumerate(self.ids)}
+        # 只认严格的选项行（至少两行、A/B/C… 依次递增），标签不会重复，转移表不会互相覆盖
+        options = [option_choices(seg) for seg in segments]
+        self.types = [_node_type(options[i], i in lesson.answers) for i in range(total)]
+        self.defaults = [i + 1 if i + 1 < total else None for i in range(total)]
+
+        scenes = {}
+        for i, seg in enumerate(segments):
+            if seg.get("scene"):
+                scenes.setdefault(seg["scene"], i)
+
+        self.transitions = []
+        nodes = []
+        for i, seg in enumerate(segments):
+            table = {}
+            choices = []
+            for choice in options[i]:
+                text = choice["text"]
+                m = _BRANCH_RE.search(text)
+                if m:
+                    target = self._resolve_scene(scenes, m.group(1))
+                    if target is not None:
+                        table[choice["label"]] = target
+                    text = text[:m.start()].rstrip()
+                choices.append({"label": choice["label"], "text": text})
+            self.transitions.append(table)
+            nodes.append(self._node(i, seg, choices))
+
+        self._compute_progress(total)
+        self.node_bodies = [
+            json_bytes({"node": node, "progress": {"percent": self.percent[i], "xp": self.xp[i]}, "done": False})
+            for i, node in enumerate(nodes)
+        ]
+
+    @staticmethod
+    def _resolve_scene(scenes: dict, name: str):
+        if name in scenes:
+            return scenes[name]
+        for scene, i in scenes.items():
+            if scene.startswith(name):
+                return i
+        return None
+
+    def _node(self, i: int, seg: dict, choices: list) -> dict:
+        # 答案标注只在服务端使用，节点内容中去掉
+        content = strip_answer_tags(seg.get("content", ""))
+        question = None
+        if choices:
+            question = "\n".join(ln for ln in content.splitlines() if not _CHOICE_LINE_RE.match(ln)).strip()
+        default = self.defaults[i]
+        return {
+            "id": self.ids[i],
+            "type": self.types[i],
+            "scene": seg.get("scene", ""),
+            "content": content,
+            "question": question,
+            "choices": choices or None,
+            "next": self.ids[default] if default is not None else None,
+        }
+
+    def successors(self, i: int) -> set:
+        """从节点 i 一步可达的节点下标（各分支目标与默认下一节点）"""
+        targets = set(self.transitions[i].values())
+        if self.defaults[i] is not None:
+            targets.add(self.defaults[i])
+        return targets
+
+    def _compute_progress(self, total: int):
+        """percent = 起点到本节点的最短步数 / 经本节点到结束的最短路径长度；xp 按已走过的节点数计"""
+        edges = [self.successors(i) for i in range(total)]
+        reverse = [[] for _ in range(total)]
+        for i, targets in enumerate(edges):
+            for target in targets:
+                reverse[target].append(i)
+        depth = _bfs([0] if total else [], edges, total)
+        remaining = _bfs([i for i in range(total) if not edges[i]], reverse, total)
+        self.percent, self.xp = [], []
+        for i in range(total):
+            d = depth[i] if depth[i] is not None else i
+            r = remaining[i] if remaining[i] is not None else total - 1 - i
+            self.percent.append(round(100 * (d + 1) / (d + r + 1)))
+            self.xp.append((d + 1) * XP_PER_SEGMENT)
+
+    @property
+    def total(self) -> int:
+        return len(self.ids)
+
+    def step(self, current: int, user_input=None):
+        """从 current 出发的下一节点下标；已到结尾返回 None"""
+        label = _input_label(user_input)
+        if label is not None:
+            target = self.transitions[current].get(label)
+            if target is not None:
+                return target
+        return self.defaults[current]
+
+    def done_body(self, last: int) -> bytes:
+        return json_bytes({"node": None, "progress": {"percent": 100, "xp": self.xp[last]}, "done": True})
+
+
+class LessonGraphStore:
+    """按课程缓存编译好的图，剧本文件版本变化（lesson_store 重新解析）后重新编译"""
+
+    def __init__(self):
+        self._graphs = {}
+        self._lock = threading.Lock()
+
+    def get(self, lesson_id: str):
+        script = lesson_script(lesson_id)
+        if not script:
+            return None
+        lesson = lesson_store.get(resolve_script_path(script))
+        if lesson is None or not lesson.total:
+            return None
+        graph = self._graphs.get(lesson_id)
+        if graph is not None and graph.path == lesson.path and graph.version == lesson.version:
+            return graph
+        graph = LessonGraph(lesson_id, lesson)
+        with self._lock:
+            self._graphs[lesson_id] = graph
+        return graph
+
+    def stats(self) -> dict:
+        with self._lock:
+            graphs = list(self._graphs.values())
+        return {"graphs": len(graphs), "nodes": sum(graph.total for graph in graphs)}
+
+
+def save_position(session, user_id: int, lesson_id: str, index: int, previous: int):
+    """
+    写入课程图中的当前节点（lesson_progress.current_index）。目标下标小于已记录的位置 previous 时
+    （分支跳回前面的场景）以 rewind 写入，覆盖只前进的规则
+    """
+    rewind = previous is not None and 0 <= index < previous
+    if progress_buffer.enabled:
+        progress_buffer.add(user_id, lesson_id, index, rewind)
+    else:
+        upsert_progress(session, [{
+            "user_id": user_id, "lesson_id": lesson_id, "current_index": index, "rewind": rewind,
+        }])
+
+
+lesson_graphs = LessonGraphStore()
@@ -0,0 +1,215 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from flask import Response
+
+from config import config
+from utils.metrics import record_cache
+from utils.script_parser import (
+    is_interaction_point,
+    option_choices,
+    parse_script_segments,
+    reveals_answer,
+    sanitize_segment_for_client,
+    strip_answer_tags,
+)
+
+SCRIPT_SUFFIX = ".txt"
+
+
+@lru_cache(maxsize=256)
+def resolve_script_path(req_file: str):
+    """
+    把剧本名解析为剧本目录（LESSON_SCRIPT_DIR）下的真实路径；
+    越出该目录（绝对路径、..、符号链接）或不是 .txt 文件时返回 None
+    """
+    if not isinstance(req_file, str) or not req_file.strip():
+        return None
+    root = os.path.realpath(config.LESSON_SCRIPT_DIR)
+    path = os.path.realpath(os.path.join(root, req_file.strip()))
+    if os.path.commonpath([root, path]) != root or not path.endswith(SCRIPT_SUFFIX):
+        return None
+    return path
+
+
+def script_version(script_path: str):
+    """剧本版本（修改时间 + 大小），文件变化后依赖它的缓存自动失效；文件不存在返回 None"""
+    if not script_path:
+        return None
+    try:
+        st = os.stat(script_path)
+    except OSError:
+        return None
+    return f"{st.st_mtime_ns}-{st.st_size}"
+
+
+def json_bytes(obj) -> bytes:
+    """紧凑 UTF-8 JSON（中文不转义为 \\uXXXX，体积约为 ASCII 转义的一半）"""
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def sse_frame(event: str, payload, event_id=None) -> bytes:
+    """一条 Server-Sent Events 消息（JSON 为单行，无需拆分多个 data 字段）"""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return (head + f"event: {event}\ndata: ").encode("utf-8") + json_bytes(payload) + b"\n\n"
+
+
+def pacing_ms(content: str) -> int:
+    """按段落字数估算展示时长（毫秒），供客户端控制播放节奏"""
+    ms = len(content or "") * config.PLAYBACK_MS_PER_CHAR
+    return int(min(config.PLAYBACK_MAX_DELAY_MS, max(config.PLAYBACK_MIN_DELAY_MS, ms)))
+
+
+def json_response(body: bytes, status: int = 200) -> Response:
+    """直接写出预序列化的 JSON 字节，不经过 jsonify"""
+    return Response(body, status=status, mimetype="application/json")
+
+
+class CompiledLesson:
+    """
+    解析后的剧本：原始分段（含答案，仅服务端使用）、互动标记与面向前端的分段视图，
+    以及课程导航接口（/segments、/start、/segment/<idx>、/next）的预序列化响应体。
+    这些响应只取决于剧本内容，随版本一起生成，处理请求时不再重复序列化。
+    answers 为测验答案索引（段下标 -> 选项字母），只在服务端判题使用；下发的内容中去掉答案标注。
+    """
+
+    __slots__ = (
+        "path", "version", "segments", "interaction", "public", "answers",
+        "listing_body", "start_body", "segment_bodies", "next_bodies", "done_body", "sse_frames",
+    )
+
+    def __init__(self, path: str, version: str, segments: list):
+        self.path = path
+        self.version = version
+        self.segments = segments
+        self.interaction = [is_interaction_point(seg) for seg in segments]
+        self.public = []
+        for seg, interactive in zip(segments, self.interaction):
+            out = sanitize_segment_for_client(seg)
+            out["is_interaction"] = interactive or ("choices" in seg)
+            self.public.append(out)
+        self.answers = self._index_answers(segments)
+        self._serialize()
+
+    @staticmethod
+    def _index_answers(segments: list) -> dict:
+        """
+        答案标注可能与选项同段，也可能单独成段紧随其后（此时归属前一个带选项的段）。
+        只认严格的选项行（见 option_choices）；题干正文已直接说出答案的段不作为测验
+        """
+        answers = {}
+        for idx, seg in enumerate(segments):
+            answer = seg.get("answer")
+            if not answer:
+                continue
+            if option_choices(seg):
+                target = idx
+            elif idx > 0 and option_choices(segments[idx - 1]) and idx - 1 not in answers:
+                target = idx - 1
+            else:
+                continue
+            if not reveals_answer(segments[target].get("content", "")):
+                answers[target] = answer
+        return answers
+
+    def _view(self, idx: int) -> dict:
+        seg = self.segments[idx]
+        return {
+            "scene": seg.get("scene", ""),
+            "content": strip_answer_tags(seg.get("content", "")),
+            "type": seg.get("type", "dialogue"),
+            "is_interaction": self.interaction[idx],
+        }
+
+    def _serialize(self):
+        total = self.total
+        self.listing_body = json_bytes({"path": self.path, "segments": self.public})
+        self.start_body = json_bytes({"path": self.path, "first": self._view(0), "total": total}) if total else None
+        self.segment_bodies = [
+            json_bytes({"index": i, **self._view(i), "path": self.path, "total": total}) for i in range(total)
+        ]
+        self.next_bodies = [
+            json_bytes({"done": False, "index": i, **self._view(i), "total": total, "path": self.path})
+            for i in range(total)
+        ]
+        self.done_body = json_bytes({"done": True, "total": total})
+        # 流式播放（/api/playback/stream）的逐段 SSE 消息，id 为段索引，断线重连时据此续播
+        self.sse_frames = [
+            sse_frame("segment", {
+                "index": i, **self._view(i), "choices": self.public[i].get("choices"),
+                "pause": self.public[i]["is_interaction"], "delay_ms": pacing_ms(self.segments[i].get("content")),
+                "total": total,
+            }, event_id=i)
+            for i in range(total)
+        ]
+
+    @property
+    def total(self) -> int:
+        return len(self.segments)
+
+
+class LessonStore:
+    """
+    进程内剧本仓库：按 (路径, 版本) 缓存解析结果，文件修改后下次访问自动重新解析。
+    生产模式下在 fork 之前预加载，worker 以写时复制方式共享同一份内容。
+    最多保留 max_entries 份（LRU），路径已由 resolve_script_path 限定在剧本目录内。
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._lessons = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, script_path: str):
+        """返回 CompiledLesson；路径无效、文件不存在或不可读时返回 None"""
+        version = script_version(script_path)
+        if version is None:
+            return None
+        with self._lock:
+            lesson = self._lessons.get(script_path)
+            if lesson is not None and lesson.version == version:
+                self._lessons.move_to_end(script_path)
+        if lesson is not None and lesson.version == version:
+            record_cache("lesson", True)
+            return lesson
+        record_cache("lesson", False)
+        try:
+            with open(script_path, "r", encoding="utf-8") as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+        lesson = CompiledLesson(script_path, version, parse_script_segments(content))
+        with self._lock:
+            self._lessons[script_path] = lesson
+            self._lessons.move_to_end(script_path)
+            while len(self._lessons) > self.max_entries:
+                self._lessons.popitem(last=False)
+        return lesson
+
+    def segments(self, script_path: str) -> list:
+        lesson = self.get(script_path)
+        return lesson.segments if lesson is not None else []
+
+    def preload(self, names) -> int:
+        """预先解析给定剧本（剧本目录下的文件名），返回成功加载的数量"""
+        return sum(1 for name in names if self.get(resolve_script_path(name)) is not None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lessons = list(self._lessons.values())
+        return {
+            "lessons": len(lessons),
+            "segments": sum(lesson.total for lesson in lessons),
+            "body_bytes": sum(
+                len(lesson.listing_body) + len(lesson.done_body) + len(lesson.start_body or b"")
+                + sum(map(len, lesson.segment_bodies)) + sum(map(len, lesson.next_bodies))
+                + sum(map(len, lesson.sse_frames))
+                for lesson in lessons
+            ),
+        }
+
+
+lesson_store = LessonStore(config.LESSON_STORE_MAX)
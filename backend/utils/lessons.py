@@ -0,0 +1,38 @@
+from utils.lesson_store import lesson_store, resolve_script_path
+
+# 课程元数据（标题与段数），报表与统计共用；script 为课程图（/api/lesson/next）使用的剧本文件，
+# 配置了 script 的课程段数取自编译后的剧本，与课程图保持一致
+LESSON_META = {
+    "nn": {"title": "神经网络入门", "script": "DAY1.txt"},
+    "lr": {"title": "线性回归基础", "segments": 8},
+}
+
+# 每完成一段获得的经验值
+XP_PER_SEGMENT = 10
+
+
+def lesson_segments(lesson_id: str) -> int:
+    """课程段数：有剧本时为剧本编译后的段数（剧本缺失时为 1），否则取 LESSON_META 中登记的值"""
+    meta = LESSON_META.get(lesson_id, {})
+    script = meta.get("script")
+    if script:
+        lesson = lesson_store.get(resolve_script_path(script))
+        return max(1, lesson.total) if lesson is not None else 1
+    return max(1, meta.get("segments", 1))
+
+
+def lesson_meta(lesson_id: str) -> dict:
+    meta = LESSON_META.get(lesson_id, {"title": lesson_id})
+    return {**meta, "segments": lesson_segments(lesson_id)}
+
+
+def lesson_completion(lesson_id: str, current_index: int):
+    """返回 (已完成段数, 完成比例)"""
+    total_segments = lesson_segments(lesson_id)
+    completed = max(0, min(total_segments, (current_index or 0) + 1))
+    return completed, completed / total_segments
+
+
+def lesson_script(lesson_id: str):
+    """课程对应的剧本文件名，未配置时返回 None"""
+    return LESSON_META.get(lesson_id, {}).get("script")
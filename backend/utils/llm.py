@@ -0,0 +1,156 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from config import config
+from utils.metrics import LLM_CHARS, LLM_ERRORS, LLM_LATENCY
+
+UNAVAILABLE_ANSWER = "（本地未配置LLM，无法生成真实回答）"
+
+SYSTEM_INSTRUCTION = ("你是课程中的 AI 教师，语气亲切、专业、适合课堂讲解。回答应参考课程剧本上下文，"
+                      "并指出若有引用剧本文本需明确标注。回答需要清晰、分步并适度举例。")
+
+QA_TEMPLATE = '''
+    你的名字是AI教师,当有人问问题的时候,你都会回答{question}, 内容尽量详细
+'''
+
+
+def build_qa_prompt(question: str, chat_history=None, script_context=None) -> str:
+    """系统指令（教师身份） + 剧本上下文 + 聊天历史 + 本次问题"""
+    parts = [SYSTEM_INSTRUCTION]
+    if script_context:
+        parts.append("以下为与问题相关的课程剧本片段（仅作参考）：")
+        for idx, sc in enumerate(script_context, 1):
+            parts.append(f"片段{idx}: {sc}")
+    if chat_history:
+        parts.append("以下为最近对话历史：")
+        for h in chat_history:
+            parts.append(f"{h.get('role', 'user')}: {h.get('text', '')}")
+    parts.append("问题：" + question)
+    return "\n\n".join(parts)
+
+
+def render_qa_prompt(question: str, chat_history=None, script_context=None) -> str:
+    """套用 QA_TEMPLATE 后的完整问答 prompt，与同步路径 qa_chain 发给模型的文本一致"""
+    return QA_TEMPLATE.format(question=build_qa_prompt(question, chat_history, script_context))
+
+
+class LMService:
+    """
+    轻量封装：负责 LLM 实例化、PromptTemplate 构造及 RunnableSequence 调用细节。
+    langchain 及模型客户端在首次调用时才导入和构造，进程启动与 worker fork 不为此付出开销；
+    未安装 LLM 库时返回占位回答，保持返回类型为字符串。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.available = False
+        self.teacher_llm = None
+        self.qa_llm = None
+        self.qa_chain = None
+        # complete() 的模型调用在这里执行，与批改线程数一致；超时的调用无法取消，仍占用线程直到自行结束
+        self._slots = max(1, config.GRADING_WORKERS)
+        self._executor = ThreadPoolExecutor(max_workers=self._slots, thread_name_prefix="llm-call")
+        self._running = 0
+        self._running_lock = threading.Lock()
+
+    def _load(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                from langchain_community.llms import Tongyi
+                from langchain_core.runnables import RunnableSequence
+                from langchain.prompts import PromptTemplate
+            except Exception:
+                self._loaded = True
+                return
+
+            class QwenTurboTongyi(Tongyi):
+                model_name: str = "qwen-turbo"
+
+            try:
+                # 批改队列自带退避重试，客户端内部不再重试，避免单次调用远超 timeout
+                self.teacher_llm = QwenTurboTongyi(temperature=0.7, max_retries=1)
+                self.qa_llm = QwenTurboTongyi(temperature=1)
+                qa_prompt = PromptTemplate(template=QA_TEMPLATE, input_variables=["question"])
+                # RunnableSequence 的组合在不同版本上行为不同，兼容处理
+                if hasattr(RunnableSequence, "__or__"):
+                    self.qa_chain = RunnableSequence(qa_prompt | self.qa_llm)
+                else:
+                    self.qa_chain = RunnableSequence(qa_prompt, self.qa_llm)
+                self.available = True
+            except Exception:
+                # 客户端或链初始化异常时保持降级
+                self.available = False
+            self._loaded = True
+
+    def run_qa(self, question: str, chat_history=None, script_context=None):
+        """统一调用 QA 链并返回字符串，内部兼容 invoke 或直接调用。
+        chat_history: list of {"role","text"} 最近对话
+        script_context: list of strings（与问题相关的剧本段落）
+        """
+        self._load()
+        if not self.available:
+            return UNAVAILABLE_ANSWER
+        prompt_input = build_qa_prompt(question, chat_history, script_context)
+        started = time.perf_counter()
+        try:
+            # 若 qa_chain 支持 invoke
+            if hasattr(self.qa_chain, "invoke"):
+                resp = self.qa_chain.invoke({"question": prompt_input})
+            else:
+                resp = self.qa_chain({"question": prompt_input})
+            answer = str(resp)
+            # 模型未返回用量，按字符数估算 token
+            LLM_CHARS.inc(("qa", "prompt"), len(prompt_input))
+            LLM_CHARS.inc(("qa", "completion"), len(answer))
+            return answer
+        except Exception as e:
+            LLM_ERRORS.inc(("qa",))
+            return f"回答生成出错：{e}"
+        finally:
+            LLM_LATENCY.observe(time.perf_counter() - started, ("qa",))
+
+    def complete(self, prompt: str, kind: str = "grading", timeout: float = None) -> str:
+        """
+        直接以 prompt 调用教师模型并返回文本；与 run_qa 不同，失败时抛出异常以便调用方重试。
+        timeout 同时作为请求超时传给模型客户端；客户端未按时返回时抛出 TimeoutError。
+        所有调用线程都被超时后仍未结束的调用占用时立即失败，不排队等待
+        """
+        self._load()
+        if not self.available:
+            raise RuntimeError(UNAVAILABLE_ANSWER)
+        started = time.perf_counter()
+        try:
+            with self._running_lock:
+                if self._running >= self._slots:
+                    raise RuntimeError("model calls still running after timeout")
+                self._running += 1
+            kwargs = {"request_timeout": timeout} if timeout else {}
+            future = self._executor.submit(self.teacher_llm.invoke, prompt, **kwargs)
+            future.add_done_callback(self._release)
+            try:
+                answer = str(future.result(timeout=timeout))
+            except FutureTimeout:
+                raise TimeoutError(f"model call exceeded {timeout}s")
+            LLM_CHARS.inc((kind, "prompt"), len(prompt))
+            LLM_CHARS.inc((kind, "completion"), len(answer))
+            return answer
+        except Exception:
+            LLM_ERRORS.inc((kind,))
+            raise
+        finally:
+            LLM_LATENCY.observe(time.perf_counter() - started, (kind,))
+
+    def _release(self, _future):
+        with self._running_lock:
+            self._running -= 1
+
+    def stats(self) -> dict:
+        return {"loaded": self._loaded, "available": self.available,
+                "running_calls": self._running, "call_slots": self._slots}
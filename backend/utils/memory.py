@@ -0,0 +1,258 @@
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import deque
+
+from sqlalchemy.engine import Dialect, Engine
+from sqlalchemy.orm import Mapper
+from sqlalchemy.orm.state import InstanceState
+from sqlalchemy.pool import Pool
+from sqlalchemy.sql.schema import MetaData, Table
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# SQLAlchemy 的私有接口（存活会话登记表）：升级后可能不存在，此时对应来源报告为不可用
+try:
+    from sqlalchemy.orm.session import _sessions
+except ImportError:
+    _sessions = None
+
+
+class SourceUnavailable(Exception):
+    """统计来源依赖的内部结构在当前环境中不存在"""
+
+
+# 不深入统计的对象：类型、模块、函数等全局共享结构，以及引擎、连接池、映射器、表结构等 SQLAlchemy 共享对象
+_OPAQUE_TYPES = (
+    type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+    types.CodeType, types.FrameType, Engine, Pool, Dialect, Mapper, InstanceState, MetaData, Table,
+)
+_ATOMIC_TYPES = (str, bytes, bytearray, int, float, complex, bool, type(None), memoryview, range)
+
+
+def _children(obj):
+    if isinstance(obj, dict):
+        items = list(obj.items())
+        return [x for kv in items for x in kv]
+    if isinstance(obj, (list, tuple, set, frozenset, deque)):
+        return list(obj)
+    refs = []
+    attrs = getattr(obj, "__dict__", None)
+    if isinstance(attrs, dict):
+        refs.append(attrs)
+    for cls in type(obj).__mro__:
+        slots = cls.__dict__.get("__slots__", ())
+        for name in (slots,) if isinstance(slots, str) else slots:
+            # 直接读槽位描述符，避免触发子类同名属性的计算逻辑
+            descriptor = cls.__dict__.get(name)
+            if isinstance(descriptor, types.MemberDescriptorType):
+                try:
+                    refs.append(descriptor.__get__(obj, cls))
+                except AttributeError:
+                    pass
+    return refs
+
+
+def deep_sizeof(obj, max_objects: int = 200_000) -> dict:
+    """
+    对象及其可达子对象的 sys.getsizeof 之和（同一对象只计一次）。
+    遍历 dict/list/tuple/set/deque、实例 __dict__ 与 __slots__；超过 max_objects 个对象时停止并标记 truncated
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    truncated = False
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _OPAQUE_TYPES):
+            continue
+        if len(seen) >= max_objects:
+            truncated = True
+            break
+        seen.add(id(current))
+        total += sys.getsizeof(current, 0)
+        if isinstance(current, _ATOMIC_TYPES):
+            continue
+        try:
+            stack.extend(_children(current))
+        except RuntimeError:
+            # 其他线程正在修改该容器，跳过其内容
+            truncated = True
+    return {"bytes": total, "objects": len(seen), "truncated": truncated}
+
+
+def process_memory() -> dict:
+    """当前进程 RSS（Linux 读 /proc/self/statm）、峰值 RSS 与 gc 跟踪的对象数"""
+    info = {"pid": os.getpid(), "rss_bytes": None, "peak_rss_bytes": None, "gc_objects": len(gc.get_objects())}
+    try:
+        with open("/proc/self/statm", "r") as f:
+            info["rss_bytes"] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 以 KB 为单位，macOS 以字节为单位
+        info["peak_rss_bytes"] = peak if sys.platform == "darwin" else peak * 1024
+    return info
+
+
+def compiled_caches(*engines) -> list:
+    """各引擎的 SQL 编译缓存（LRU，跨请求常驻）；同一引擎只取一次"""
+    caches = []
+    for eng in engines:
+        # 私有属性，SQLAlchemy 版本变化时可能不存在
+        cache = getattr(eng, "_compiled_cache", None)
+        if cache is not None and all(cache is not c for c in caches):
+            caches.append(cache)
+    if engines and not caches:
+        raise SourceUnavailable("Engine._compiled_cache not found in this SQLAlchemy version")
+    return caches
+
+
+def identity_maps() -> list:
+    """
+    所有存活 Session 的 identity map 中已加载实例的属性字典。
+    会话按请求创建、请求结束即关闭，这里反映的是统计瞬间正在处理的请求与后台线程持有的实例
+    """
+    if _sessions is None:
+        raise SourceUnavailable("sqlalchemy.orm.session._sessions not found in this SQLAlchemy version")
+    return [
+        [state.dict for state in session.identity_map.all_states()]
+        for session in list(_sessions.values())
+    ]
+
+
+class MemorySources:
+    """
+    进程内缓存与内存存储的登记表：各模块按名称登记取对象的函数与条目数函数，
+    管理接口按需逐个计算条目数与深度字节数。各来源分别去重，彼此共享的对象会在每个来源中各计一次
+    """
+
+    def __init__(self):
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, target, entries=None):
+        """target() 返回要统计的对象；entries() 返回条目数，缺省取 len(target())"""
+        with self._lock:
+            self._sources[name] = (target, entries)
+
+    def names(self) -> list:
+        with self._lock:
+            return sorted(self._sources)
+
+    def measure(self, names=None, max_objects: int = 200_000) -> list:
+        with self._lock:
+            sources = dict(self._sources)
+        results = []
+        for name, (target, entries) in sources.items():
+            if names and name not in names:
+                continue
+            started = time.perf_counter()
+            try:
+                obj = target()
+                count = entries() if entries is not None else (len(obj) if hasattr(obj, "__len__") else None)
+                size = deep_sizeof(obj, max_objects)
+            except SourceUnavailable as e:
+                results.append({"name": name, "unavailable": str(e)})
+                continue
+            except Exception as e:
+                results.append({"name": name, "error": f"{type(e).__name__}: {e}"})
+                continue
+            results.append({
+                "name": name,
+                "entries": count,
+                **size,
+                "ms": round((time.perf_counter() - started) * 1000, 2),
+            })
+        results.sort(key=lambda r: r.get("bytes", -1), reverse=True)
+        return results
+
+
+class AllocationTracker:
+    """
+    按需 tracemalloc：start 开启跟踪并取基准快照，diff 取新快照与基准比较，返回增长最多的分配位置。
+    跟踪期间所有内存分配都有额外开销，用完应 stop
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._baseline = None
+        self._baseline_at = None
+        self._started_here = False
+
+    @staticmethod
+    def _snapshot():
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def start(self, frames: int = 1) -> dict:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(max(1, frames))
+                self._started_here = True
+            self._baseline = self._snapshot()
+            self._baseline_at = time.time()
+        return self.stats()
+
+    def diff(self, limit: int = 20, group_by: str = "lineno", reset: bool = False):
+        """与基准快照比较；尚未 start 时返回 None。reset 为真时以本次快照作为新的基准"""
+        with self._lock:
+            if self._baseline is None or not tracemalloc.is_tracing():
+                return None
+            current = self._snapshot()
+            stats = current.compare_to(self._baseline, group_by)
+            since = self._baseline_at
+            if reset:
+                self._baseline, self._baseline_at = current, time.time()
+        top = []
+        for stat in stats[:max(1, limit)]:
+            entry = {
+                "size_diff": stat.size_diff,
+                "size": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+                "where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            }
+            if group_by == "traceback":
+                entry["traceback"] = stat.traceback.format()
+            top.append(entry)
+        return {
+            "seconds": round(time.time() - since, 1),
+            "size_diff": sum(stat.size_diff for stat in stats),
+            "top": top,
+        }
+
+    def stop(self) -> dict:
+        with self._lock:
+            if self._started_here and tracemalloc.is_tracing():
+                tracemalloc.stop()
+            self._started_here = False
+            self._baseline = self._baseline_at = None
+        return self.stats()
+
+    def stats(self) -> dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else None,
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+            "baseline_at": self._baseline_at,
+        }
+
+
+memory_sources = MemorySources()
+allocation_tracker = AllocationTracker()
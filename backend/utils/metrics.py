@@ -0,0 +1,414 @@
+"""
+轻量级进程内指标（Prometheus 文本格式），热路径上只有一次加锁的字典更新。
+
+多 worker 部署（gunicorn）时每个 worker 各有一份计数，抓取到哪个 worker 就只看到它的数值。
+配置 METRICS_DIR 后进入多进程模式：各 worker 每 METRICS_FLUSH_INTERVAL 秒把计数器与直方图快照
+写入 METRICS_DIR/<pid>.json，任一 worker 响应 /__metrics 时合并所有快照，计数在 worker 之间单调累加；
+worker 退出时把自己的计数并入 archive.json，回收重启不会让计数回退。回调型仪表是进程的瞬时状态，
+按 pid 标签分别输出。gunicorn.conf.py 会自动设置 METRICS_DIR；其他多进程启动方式（如 uvicorn --workers）
+需手动指定一个所有 worker 共享、启动前清空的目录。
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, request
+
+from config import config
+
+try:
+    import fcntl
+except ImportError:  # Windows：不支持多进程模式
+    fcntl = None
+
+# 延迟直方图的默认桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), value=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def value(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._values.items())
+
+    @staticmethod
+    def merge(total: dict, items):
+        for labels, value in items:
+            total[labels] = total.get(labels, 0) + value
+
+    def render(self, items=None):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        if items is None:
+            items = self.snapshot()
+        for labels, value in items:
+            lines.append(f"{self.name}{_label_str(self.labelnames, labels)} {_fmt(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 3)
+            series[idx] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [(labels, list(series)) for labels, series in self._series.items()]
+
+    @staticmethod
+    def merge(total: dict, items):
+        for labels, series in items:
+            current = total.get(labels)
+            total[labels] = list(series) if current is None else [a + b for a, b in zip(current, series)]
+
+    def render(self, items=None):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        if items is None:
+            items = self.snapshot()
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="{}"'.format(_fmt(bound))
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, labels)} {_fmt(series[-2])}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+
+class CallbackGauge:
+    """抓取时才调用回调取值；回调返回数值，或 {标签值元组: 数值}"""
+
+    def __init__(self, name, help_text, fn, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def snapshot(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        return [(tuple(labels), v) for labels, v in items if v is not None]
+
+    def render(self, items=None, by_pid=False):
+        """by_pid 为真时 items 为 [(pid, 标签值元组, 数值)]，输出时附加 pid 标签"""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        if not by_pid:
+            for labels, v in (self.snapshot() if items is None else items):
+                lines.append(f"{self.name}{_label_str(self.labelnames, labels)} {_fmt(v)}")
+            return lines
+        for pid, labels, v in items:
+            extra = f'pid="{pid}"'
+            lines.append(f"{self.name}{_label_str(self.labelnames, labels, extra)} {_fmt(v)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name, help_text, fn, labelnames=()):
+        """回调型仪表；同名重复注册时以最新回调为准"""
+        metric = CallbackGauge(name, help_text, fn, labelnames)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def metrics(self) -> list:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def snapshot(self, gauges: bool = True) -> dict:
+        """本进程的全部取值（标签元组转为列表以便 JSON 序列化）"""
+        data = {"pid": os.getpid(), "counters": {}, "histograms": {}, "gauges": {}}
+        for metric in self.metrics():
+            if isinstance(metric, Counter):
+                data["counters"][metric.name] = [[list(k), v] for k, v in metric.snapshot()]
+            elif isinstance(metric, Histogram):
+                data["histograms"][metric.name] = [[list(k), v] for k, v in metric.snapshot()]
+            elif gauges:
+                data["gauges"][metric.name] = [[list(k), v] for k, v in metric.snapshot()]
+        return data
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _alive(pid) -> bool:
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, TypeError, ValueError):
+        return True
+    return True
+
+
+class MultiprocessMetrics:
+    """多进程模式：快照文件的写入、合并与 worker 退出时的归档（见模块说明）"""
+
+    ARCHIVE = "archive.json"
+
+    def __init__(self, registry: "Registry", directory: str, interval: float):
+        self.registry = registry
+        self.directory = directory
+        self.interval = max(0.5, interval)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _write(self, name: str, data: dict):
+        tmp = self._path(f".{name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self._path(name))
+
+    def _read(self, name: str):
+        try:
+            with open(self._path(name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _locked(self, mode):
+        """跨进程文件锁：归档用排他锁，合并读取用共享锁"""
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(self._path(".lock"), "a")
+        fcntl.flock(lock_file, mode)
+        return lock_file
+
+    def _fold(self, data: dict):
+        """把一份快照的计数器与直方图并入 archive.json（调用方持有排他锁）"""
+        merged = self._merge([self._read(self.ARCHIVE) or {}, data])
+        self._write(self.ARCHIVE, {
+            kind: {name: [[list(k), v] for k, v in values.items()] for name, values in merged[kind].items()}
+            for kind in ("counters", "histograms")
+        })
+
+    def ensure_started(self):
+        # fork 后的子进程需要自己的写入线程
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            own = f"{self._pid}.json"
+            # pid 被复用时，旧进程留下的同名快照先归档，避免被新进程覆盖而使计数回退
+            with self._locked(fcntl.LOCK_EX) as lock_file:
+                stale = self._read(own)
+                if stale is not None:
+                    self._fold(stale)
+                    os.remove(self._path(own))
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            self._thread = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        try:
+            self._write(f"{os.getpid()}.json", self.registry.snapshot())
+        except OSError:
+            pass
+
+    def archive(self):
+        """worker 退出：把本进程的计数器与直方图并入 archive.json 并删除自己的快照文件"""
+        if self._pid != os.getpid():
+            return
+        with self._locked(fcntl.LOCK_EX) as lock_file:
+            self._fold(self.registry.snapshot(gauges=False))
+            try:
+                os.remove(self._path(f"{self._pid}.json"))
+            except OSError:
+                pass
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self._pid = None
+
+    @staticmethod
+    def _merge(snapshots) -> dict:
+        merged = {"counters": {}, "histograms": {}, "gauges": {}}
+        for data in snapshots:
+            for name, items in data.get("counters", {}).items():
+                Counter.merge(merged["counters"].setdefault(name, {}), ((tuple(k), v) for k, v in items))
+            for name, items in data.get("histograms", {}).items():
+                Histogram.merge(merged["histograms"].setdefault(name, {}), ((tuple(k), v) for k, v in items))
+            pid = data.get("pid")
+            for name, items in data.get("gauges", {}).items():
+                merged["gauges"].setdefault(name, []).extend((pid, tuple(k), v) for k, v in items)
+        return merged
+
+    def render(self) -> str:
+        self.ensure_started()
+        own = self.registry.snapshot()
+        snapshots = [own]
+        # 排他锁与归档互斥：归档瞬间同一 worker 的计数不会被计两次或漏计。
+        # 被信号杀死的 worker 来不及归档，其快照在这里并入归档（瞬时仪表随之丢弃）
+        with self._locked(fcntl.LOCK_EX) as lock_file:
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json") or name in (self.ARCHIVE, f"{own['pid']}.json"):
+                    continue
+                data = self._read(name)
+                if data is None:
+                    continue
+                if _alive(data.get("pid")):
+                    snapshots.append(data)
+                else:
+                    self._fold(data)
+                    os.remove(self._path(name))
+            archived = self._read(self.ARCHIVE)
+            if archived is not None:
+                snapshots.append(archived)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        merged = self._merge(snapshots)
+        lines = []
+        for metric in self.registry.metrics():
+            if isinstance(metric, Counter):
+                lines.extend(metric.render(sorted(merged["counters"].get(metric.name, {}).items())))
+            elif isinstance(metric, Histogram):
+                lines.extend(metric.render(sorted(merged["histograms"].get(metric.name, {}).items())))
+            else:
+                lines.extend(metric.render(merged["gauges"].get(metric.name, []), by_pid=True))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+multiprocess = (
+    MultiprocessMetrics(registry, config.METRICS_DIR, config.METRICS_FLUSH_INTERVAL)
+    if config.METRICS_DIR and fcntl is not None else None
+)
+if multiprocess is not None:
+    atexit.register(multiprocess.archive)
+
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP 请求数", ("blueprint", "route", "method", "status")
+)
+HTTP_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "HTTP 请求耗时（秒）", ("blueprint", "route", "method")
+)
+LLM_LATENCY = registry.histogram(
+    "llm_request_duration_seconds", "LLM 调用耗时（秒）", ("kind",)
+)
+LLM_CHARS = registry.counter(
+    "llm_chars_total", "LLM 输入/输出字符数", ("kind", "direction")
+)
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total", "LLM 输入/输出 token 数（仅接口返回用量时统计）", ("kind", "direction")
+)
+LLM_ERRORS = registry.counter("llm_errors_total", "LLM 调用失败次数", ("kind",))
+CACHE_REQUESTS = registry.counter("cache_requests_total", "缓存查询次数", ("cache", "result"))
+DB_POOL_WAIT = registry.histogram(
+    "db_pool_checkout_wait_seconds",
+    "从连接池取得连接的等待时间（秒）",
+    ("pool",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc((cache, "hit" if hit else "miss"))
+
+
+def observe_pool_wait(pool, seconds: float):
+    DB_POOL_WAIT.observe(seconds, (getattr(pool, "logging_name", None) or "default",))
+
+
+class RequestMetrics:
+    """按蓝图/路由统计请求数与耗时，并提供 /__metrics 抓取端点"""
+
+    def init_app(self, app, path="/__metrics"):
+        app.before_request(self._start)
+        app.after_request(self._observe)
+        app.add_url_rule(path, "metrics", self._expose, methods=["GET"])
+
+    @staticmethod
+    def _start():
+        if "request_started" not in g:
+            g.request_started = time.perf_counter()
+
+    @staticmethod
+    def _observe(response):
+        started = g.get("request_started")
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        blueprint = request.blueprint or "app"
+        HTTP_LATENCY.observe(time.perf_counter() - started, (blueprint, route, request.method))
+        HTTP_REQUESTS.inc((blueprint, route, request.method, str(response.status_code)))
+        if multiprocess is not None:
+            multiprocess.ensure_started()
+        return response
+
+    @staticmethod
+    def _expose():
+        body = multiprocess.render() if multiprocess is not None else registry.render()
+        return Response(body, mimetype="text/plain; version=0.0.4")
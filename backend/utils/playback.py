@@ -0,0 +1,97 @@
+import secrets
+import threading
+import time
+
+from config import config
+
+
+class PlaybackSession:
+    __slots__ = ("id", "user_id", "lesson_id", "acked", "opened_at", "parked_index", "parked_at", "_cond")
+
+    def __init__(self, user_id: int, lesson_id: str):
+        self.id = secrets.token_urlsafe(12)
+        self.user_id = user_id
+        self.lesson_id = lesson_id
+        self.acked = -1
+        self.opened_at = time.time()
+        # 播放流在互动段结束连接后，会话保留在登记表中等待确认与重连（parked_at 为 monotonic 时间）
+        self.parked_index = None
+        self.parked_at = None
+        self._cond = threading.Condition()
+
+    def ack(self, index: int):
+        with self._cond:
+            if index > self.acked:
+                self.acked = index
+            self._cond.notify_all()
+
+    def wait_ack(self, index: int, timeout: float) -> bool:
+        """等待客户端确认到 index（含）为止，超时返回 False"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.acked >= index, timeout=timeout)
+
+
+class PlaybackRegistry:
+    """
+    当前进程内的播放会话：正在推送的流，以及停在互动段、等待确认后重连的会话（最多保留 park_ttl 秒）。
+    确认请求需落在持有该会话的同一进程上，否则返回未知会话，客户端按 Last-Event-ID / from 重新连接即可续播。
+    """
+
+    def __init__(self, park_ttl: float):
+        self.park_ttl = park_ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.parked = 0
+
+    def open(self, user_id: int, lesson_id: str) -> PlaybackSession:
+        session = PlaybackSession(user_id, lesson_id)
+        with self._lock:
+            self._expire()
+            self._sessions[session.id] = session
+            self.opened += 1
+        return session
+
+    def close(self, session: PlaybackSession):
+        with self._lock:
+            self._sessions.pop(session.id, None)
+
+    def park(self, session: PlaybackSession, index: int):
+        """播放流在互动段 index 处结束连接，会话保留到确认与重连"""
+        with self._lock:
+            session.parked_index = index
+            session.parked_at = time.monotonic()
+            self.parked += 1
+
+    def resume(self, session_id: str, user_id: int, lesson_id: str):
+        """取回停住的会话并重新标记为推送中；不存在、已过期或不属于该用户 / 课程时返回 None"""
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is None or session.user_id != user_id or session.lesson_id != lesson_id:
+                return None
+            if session.parked_at is None:
+                return None  # 仍有连接在推送该会话
+            session.parked_at = None
+            return session
+
+    def _expire(self):
+        """调用方持有 _lock"""
+        cutoff = time.monotonic() - self.park_ttl
+        expired = [sid for sid, s in self._sessions.items() if s.parked_at is not None and s.parked_at < cutoff]
+        for sid in expired:
+            del self._sessions[sid]
+
+    def get(self, session_id: str, user_id: int):
+        session = self._sessions.get(session_id)
+        if session is None or session.user_id != user_id:
+            return None
+        return session
+
+    def stats(self) -> dict:
+        with self._lock:
+            waiting = sum(1 for s in self._sessions.values() if s.parked_at is not None)
+            return {"open": len(self._sessions) - waiting, "parked": waiting, "opened": self.opened, "parks": self.parked}
+
+
+playback_sessions = PlaybackRegistry(config.PLAYBACK_ACK_TIMEOUT)
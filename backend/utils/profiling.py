@@ -0,0 +1,222 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+from datetime import datetime
+
+from flask import g, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from config import config
+
+PROFILE_HEADER = "X-Profile-Token"
+logger = logging.getLogger("app")
+_UNSAFE_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class ProfileRing:
+    """磁盘上的定长环：每次剖析写一个 .prof（pstats 格式）与同名 .json 元数据，超过容量删除最旧的"""
+
+    def __init__(self, directory: str, size: int):
+        self.directory = directory
+        self.size = max(1, size)
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def save(self, profile: cProfile.Profile, meta: dict) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        endpoint = _UNSAFE_RE.sub("_", meta.get("endpoint") or "unmatched")[:60]
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{seq:04d}-{endpoint}"
+        profile.dump_stats(os.path.join(self.directory, name + ".prof"))
+        with open(os.path.join(self.directory, name + ".json"), "w", encoding="utf-8") as f:
+            json.dump({"name": name, **meta}, f, ensure_ascii=False)
+        self._trim()
+        return name
+
+    def _trim(self):
+        with self._lock:
+            names = sorted(self._names(), key=self._mtime)
+            for name in names[:-self.size]:
+                for ext in (".prof", ".json"):
+                    try:
+                        os.remove(os.path.join(self.directory, name + ext))
+                    except OSError:
+                        pass
+
+    def _names(self):
+        try:
+            files = os.listdir(self.directory)
+        except OSError:
+            return []
+        return [f[:-5] for f in files if f.endswith(".json")]
+
+    def _mtime(self, name: str) -> float:
+        try:
+            return os.path.getmtime(os.path.join(self.directory, name + ".json"))
+        except OSError:
+            return 0.0
+
+    def list(self) -> list:
+        entries = []
+        for name in sorted(self._names(), key=self._mtime, reverse=True):
+            try:
+                with open(os.path.join(self.directory, name + ".json"), "r", encoding="utf-8") as f:
+                    entries.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return entries
+
+    def path(self, name: str):
+        """profile 文件路径；名称不合法或不存在返回 None"""
+        if _UNSAFE_RE.search(name) or name.startswith("."):
+            return None
+        path = os.path.join(self.directory, name + ".prof")
+        return path if os.path.exists(path) else None
+
+    def summary(self, name: str, sort: str = "cumulative", limit: int = 40):
+        path = self.path(name)
+        if path is None:
+            return None
+        out = io.StringIO()
+        stats = pstats.Stats(path, stream=out)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+class RequestProfiler:
+    """
+    按需剖析单个请求（cProfile，确定性）。两种触发方式：
+    - 请求头 X-Profile-Token：管理接口签发的带时效令牌，限定路径前缀，可跨 worker 使用；
+    - 管理开关：在本进程内为匹配路径前缀的后续 N 个请求开启剖析。
+    未触发时每个请求只多一次请求头查找与一次计数判断。
+    """
+
+    def __init__(self, ring: ProfileRing, token_ttl: int, secret: str):
+        self.ring = ring
+        self.token_ttl = token_ttl
+        # 令牌使用独立密钥，不与登录令牌共用 SECRET_KEY（其默认值公开，可被伪造）；未配置时令牌触发关闭
+        self._serializer = URLSafeTimedSerializer(secret, salt="request-profile") if secret else None
+        self._lock = threading.Lock()
+        self._armed_prefix = None
+        self._armed_left = 0
+        self.captured = 0
+
+    def init_app(self, app):
+        # 最先注册：before_request 最先运行、after_request 最后运行，剖析范围覆盖其他钩子
+        app.before_request(self._start)
+        app.after_request(self._record_status)
+        app.teardown_request(self._stop)
+
+    # ---- 触发 ----
+
+    @property
+    def tokens_enabled(self) -> bool:
+        return self._serializer is not None
+
+    def issue_token(self, path_prefix: str = "/"):
+        """未配置 PROFILE_SECRET 时返回 None"""
+        if self._serializer is None:
+            return None
+        return self._serializer.dumps({"path": path_prefix or "/"})
+
+    def arm(self, path_prefix: str, count: int):
+        with self._lock:
+            self._armed_prefix = path_prefix or "/"
+            self._armed_left = max(0, count)
+
+    def disarm(self):
+        self.arm("/", 0)
+
+    def _token_allows(self, token: str) -> bool:
+        if self._serializer is None:
+            return False
+        try:
+            payload = self._serializer.loads(token, max_age=self.token_ttl)
+        except BadSignature:
+            return False
+        return request.path.startswith(payload.get("path") or "/")
+
+    def _take_armed(self) -> bool:
+        with self._lock:
+            if self._armed_left <= 0 or not request.path.startswith(self._armed_prefix):
+                return False
+            self._armed_left -= 1
+            return True
+
+    def _should_profile(self) -> bool:
+        if request.path.startswith("/__admin"):
+            return False
+        token = request.headers.get(PROFILE_HEADER)
+        if token is not None:
+            return self._token_allows(token)
+        return self._armed_left > 0 and self._take_armed()
+
+    # ---- 请求钩子 ----
+
+    def _start(self):
+        token_present = PROFILE_HEADER in request.headers
+        if not token_present and self._armed_left <= 0:
+            return
+        if not self._should_profile():
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # 同一线程已有其他剖析器在运行
+            return
+        g.profile = profile
+        g.profile_started = time.perf_counter()
+
+    @staticmethod
+    def _record_status(response):
+        if "profile" in g:
+            g.profile_status = response.status_code
+        return response
+
+    def _stop(self, exception=None):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return
+        profile.disable()
+        elapsed = time.perf_counter() - g.pop("profile_started")
+        user = g.get("current_user")
+        name = self.ring.save(profile, {
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": g.pop("profile_status", 500 if exception is not None else None),
+            "ms": round(elapsed * 1000, 2),
+            "user": getattr(user, "id", None),
+            "pid": os.getpid(),
+            "createdAt": datetime.utcnow().isoformat(),
+        })
+        with self._lock:
+            self.captured += 1
+        logger.info("request profiled", extra={"fields": {"profile": name, "path": request.path}})
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "armed_prefix": self._armed_prefix if self._armed_left > 0 else None,
+                "armed_left": self._armed_left,
+                "tokens_enabled": self.tokens_enabled,
+                "captured": self.captured,
+                "ring_size": self.ring.size,
+                "directory": self.ring.directory,
+            }
+
+
+request_profiler = RequestProfiler(
+    ProfileRing(config.PROFILE_DIR, config.PROFILE_RING_SIZE),
+    token_ttl=config.PROFILE_TOKEN_TTL,
+    secret=config.PROFILE_SECRET,
+)
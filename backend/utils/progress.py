@@ -0,0 +1,235 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import case, insert
+
+from config import config
+from db import SessionLocal, dialect_insert
+from models import LessonProgress, ProgressEvent
+from utils.reports import apply_progress
+
+logger = logging.getLogger("app")
+
+
+def _upsert_statement(session, rewind: bool):
+    insert = dialect_insert(session)
+    stmt = insert(LessonProgress)
+    excluded = stmt.excluded
+    if rewind:
+        new_index = excluded.current_index
+    else:
+        # 默认只前进不后退：客户端回看旧段落时不会覆盖已达到的最远位置
+        new_index = case(
+            (excluded.current_index > LessonProgress.current_index, excluded.current_index),
+            else_=LessonProgress.current_index,
+        )
+    return stmt.on_conflict_do_update(
+        index_elements=[LessonProgress.user_id, LessonProgress.lesson_id],
+        set_={"current_index": new_index, "updated_at": excluded.updated_at},
+    ).returning(
+        LessonProgress.user_id,
+        LessonProgress.lesson_id,
+        LessonProgress.current_index,
+        LessonProgress.updated_at,
+    )
+
+
+def _event_row(entry: dict, now: datetime) -> dict:
+    return {
+        "user_id": entry["user_id"],
+        "lesson_id": entry["lesson_id"],
+        "current_index": entry["current_index"],
+        "rewind": bool(entry.get("rewind")),
+        "created_at": entry.get("updated_at") or now,
+    }
+
+
+def upsert_progress(session, entries, events=None):
+    """
+    单语句写入进度（INSERT ... ON CONFLICT DO UPDATE），多条时走 executemany。
+    entries: [{"user_id", "lesson_id", "current_index", "rewind"(可选)}]
+    events: 要追加到 progress_events 的原始保存记录，缺省时每条 entry 记一条
+    返回写入后的行：[{"userId", "lessonId", "currentIndex", "updatedAt"}]
+    """
+    now = datetime.utcnow()
+    event_rows = [_event_row(e, now) for e in (entries if events is None else events)]
+    if event_rows:
+        session.execute(insert(ProgressEvent), event_rows)
+
+    groups = {False: [], True: []}
+    for entry in entries:
+        groups[bool(entry.get("rewind"))].append({
+            "user_id": entry["user_id"],
+            "lesson_id": entry["lesson_id"],
+            "current_index": entry["current_index"],
+            "updated_at": entry.get("updated_at") or now,
+        })
+
+    saved = []
+    for rewind, rows in groups.items():
+        if not rows:
+            continue
+        result = session.execute(_upsert_statement(session, rewind), rows)
+        for row in result:
+            saved.append({
+                "userId": row.user_id,
+                "lessonId": row.lesson_id,
+                "currentIndex": row.current_index,
+                "updatedAt": row.updated_at.isoformat() if row.updated_at else None,
+            })
+
+    # 同一事务内增量维护报表汇总
+    apply_progress(session, saved)
+    return saved
+
+
+class ProgressWriteBuffer:
+    """
+    写后缓冲：同一 (user, lesson) 的多次保存在内存中合并，由后台线程按间隔批量落库。
+    仅在 PROGRESS_WRITE_BEHIND 开启时使用；进程退出时会尽量把剩余数据写入。
+    """
+
+    def __init__(self, enabled: bool, flush_interval: float, max_pending: int):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.max_pending = max(1, max_pending)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._events = []
+        self._thread = None
+        self._pid = None
+        self._received = 0
+        self._flushed = 0
+
+    def _ensure_thread(self):
+        # fork 后的子进程需要自己的刷新线程
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="progress-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def add(self, user_id: int, lesson_id: str, index: int, rewind: bool = False) -> dict:
+        key = (user_id, lesson_id)
+        now = datetime.utcnow()
+        with self._lock:
+            # 事件流水不做合并，原样保留每次保存
+            self._events.append({
+                "user_id": user_id,
+                "lesson_id": lesson_id,
+                "current_index": index,
+                "rewind": rewind,
+                "updated_at": now,
+            })
+            previous = self._pending.get(key)
+            if previous and not rewind:
+                index = max(index, previous["current_index"])
+                rewind = previous["rewind"]
+            entry = {
+                "user_id": user_id,
+                "lesson_id": lesson_id,
+                "current_index": index,
+                "rewind": rewind,
+                "updated_at": now,
+            }
+            self._pending[key] = entry
+            self._received += 1
+            full = len(self._pending) >= self.max_pending or len(self._events) >= self.max_pending
+
+        self._ensure_thread()
+        if full:
+            self.flush()
+        return entry
+
+    def pending_for_user(self, user_id: int) -> dict:
+        with self._lock:
+            return {lesson: dict(e) for (uid, lesson), e in self._pending.items() if uid == user_id}
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                events, self._events = self._events, []
+            if not batch:
+                return 0
+
+            session = SessionLocal()
+            try:
+                upsert_progress(session, list(batch.values()), events=events)
+                session.commit()
+            except Exception:
+                session.rollback()
+                logger.exception("progress flush failed")
+                # 写入失败：放回缓冲区，与期间新到的保存按同样规则合并
+                with self._lock:
+                    self._events[:0] = events
+                    for key, entry in batch.items():
+                        newer = self._pending.get(key)
+                        if newer is None:
+                            self._pending[key] = entry
+                        elif not newer["rewind"]:
+                            newer["current_index"] = max(newer["current_index"], entry["current_index"])
+                return 0
+            finally:
+                session.close()
+
+            with self._lock:
+                self._flushed += len(batch)
+            return len(batch)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "pending": len(self._pending),
+                "received": self._received,
+                "flushed": self._flushed,
+            }
+
+
+def merge_pending(row: dict, entry: dict) -> dict:
+    """把缓冲中尚未落库的保存叠加到数据库读出的进度上（与 upsert 规则一致）"""
+    current = row.get("currentIndex", -1) if row else -1
+    if entry["rewind"] or entry["current_index"] > current:
+        current = entry["current_index"]
+    return {
+        "lessonId": entry["lesson_id"],
+        "currentIndex": current,
+        "updatedAt": entry["updated_at"].isoformat(),
+    }
+
+
+def saved_index(session, user_id: int, lesson_id: str) -> int:
+    """已保存的进度位置（叠加写后缓冲中尚未落库的保存），没有记录时为 -1"""
+    row = (
+        session.query(LessonProgress.current_index)
+        .filter_by(user_id=user_id, lesson_id=lesson_id)
+        .first()
+    )
+    current = row.current_index if row else -1
+    if progress_buffer.enabled:
+        entry = progress_buffer.pending_for_user(user_id).get(lesson_id)
+        if entry:
+            current = merge_pending({"currentIndex": current}, entry)["currentIndex"]
+    return current
+
+
+progress_buffer = ProgressWriteBuffer(
+    enabled=config.PROGRESS_WRITE_BEHIND,
+    flush_interval=config.PROGRESS_FLUSH_INTERVAL,
+    max_pending=config.PROGRESS_BUFFER_MAX,
+)
+atexit.register(progress_buffer.flush)
@@ -0,0 +1,162 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from config import config
+from db import SessionLocal
+from models import QuizAttempt
+from utils.reports import apply_quiz
+
+logger = logging.getLogger("app")
+
+
+def check_answer(lesson, index: int, choice) -> dict:
+    """按剧本答案索引判题；不是测验段时返回带 error 的结果"""
+    answer = lesson.answers.get(index)
+    if answer is None:
+        return {"index": index, "error": "not a quiz segment"}
+    label = choice.strip()[:1].upper() if isinstance(choice, str) else ""
+    if not label:
+        return {"index": index, "error": "choice is required"}
+    return {"index": index, "choice": label, "correct": label == answer, "answer": answer}
+
+
+class QuizAttemptBuffer:
+    """
+    作答记录缓冲：判题在请求内完成，作答记录进入内存队列，由后台线程批量插入 quiz_attempts
+    并在同一事务中更新报表汇总。进程退出时会尽量把剩余记录写入。
+    整批写入失败时逐条重试以隔离出错的记录；同一条记录失败 max_retries 次后丢弃并记入日志，不阻塞后续写入
+    """
+
+    def __init__(self, flush_interval: float, max_pending: int, max_retries: int):
+        self.flush_interval = flush_interval
+        self.max_pending = max(1, max_pending)
+        self.max_retries = max(1, max_retries)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._retry = []  # [(已失败次数, 记录)]，下次刷新时排在新记录之前
+        self._thread = None
+        self._pid = None
+        self._received = 0
+        self._flushed = 0
+        self._dropped = 0
+
+    def _ensure_thread(self):
+        # fork 后的子进程需要自己的刷新线程
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="quiz-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def add(self, user_id: int, lesson_id: str, results) -> int:
+        now = datetime.utcnow()
+        rows = [
+            {
+                "user_id": user_id,
+                "lesson_id": lesson_id,
+                "segment_index": r["index"],
+                "choice": r["choice"],
+                "correct": r["correct"],
+                "created_at": now,
+            }
+            for r in results if "error" not in r
+        ]
+        if not rows:
+            return 0
+        with self._lock:
+            self._pending.extend(rows)
+            self._received += len(rows)
+            full = len(self._pending) >= self.max_pending
+
+        self._ensure_thread()
+        if full:
+            self.flush()
+        return len(rows)
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                retry, self._retry = self._retry, []
+            if not batch and not retry:
+                return 0
+
+            # 重试的记录在前，保持"首次作答"的判定顺序
+            entries = retry + [(0, row) for row in batch]
+            if self._write([row for _, row in entries]):
+                written = len(entries)
+            else:
+                written = self._write_each(entries)
+
+            with self._lock:
+                self._flushed += written
+            return written
+
+    def _write(self, rows) -> bool:
+        session = SessionLocal()
+        try:
+            session.execute(insert(QuizAttempt), rows)
+            apply_quiz(session, rows)
+            session.commit()
+            return True
+        except Exception:
+            session.rollback()
+            logger.exception("quiz attempts flush failed (%d rows)", len(rows))
+            return False
+        finally:
+            session.close()
+
+    def _write_each(self, entries) -> int:
+        """逐条写入；失败的记录留待下次刷新，累计失败 max_retries 次的丢弃"""
+        written = 0
+        retry = []
+        for failures, row in entries:
+            if self._write([row]):
+                written += 1
+            elif failures + 1 < self.max_retries:
+                retry.append((failures + 1, row))
+            else:
+                logger.error("quiz attempt dropped after %d failures: %s", failures + 1, row)
+                with self._lock:
+                    self._dropped += 1
+        with self._lock:
+            # 待重试的记录不超过 max_pending 条，数据库长时间不可用时丢弃最早的
+            overflow = max(0, len(retry) - self.max_pending)
+            if overflow:
+                logger.error("quiz retry queue full, dropped %d attempts", overflow)
+                self._dropped += overflow
+            self._retry = retry[overflow:]
+        return written
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "retrying": len(self._retry),
+                "received": self._received,
+                "flushed": self._flushed,
+                "dropped": self._dropped,
+            }
+
+
+quiz_buffer = QuizAttemptBuffer(
+    flush_interval=config.QUIZ_FLUSH_INTERVAL,
+    max_pending=config.QUIZ_BUFFER_MAX,
+    max_retries=config.QUIZ_MAX_RETRIES,
+)
+atexit.register(quiz_buffer.flush)
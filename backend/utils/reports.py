@@ -0,0 +1,153 @@
+from datetime import datetime
+
+from models import LessonProgress, QuizAttempt, UserReport
+from utils.lessons import XP_PER_SEGMENT, lesson_completion, lesson_meta
+
+
+def _lesson_entry(lesson_id: str, current_index: int) -> dict:
+    completed, ratio = lesson_completion(lesson_id, current_index)
+    return {"completed": completed, "ratio": ratio}
+
+
+def rebuild_report(session, user_id: int, report=None):
+    """从 lesson_progress 全量重建某个用户的汇总（首次访问或数据修复时使用）"""
+    if report is None:
+        report = UserReport(user_id=user_id, version=0)
+        session.add(report)
+    lessons = {}
+    for lesson_id, current_index in (
+        session.query(LessonProgress.lesson_id, LessonProgress.current_index)
+        .filter(LessonProgress.user_id == user_id)
+    ):
+        lessons[lesson_id] = _lesson_entry(lesson_id, current_index)
+
+    quiz = {}
+    for lesson_id, segment_index, correct in (
+        session.query(QuizAttempt.lesson_id, QuizAttempt.segment_index, QuizAttempt.correct)
+        .filter(QuizAttempt.user_id == user_id)
+        .order_by(QuizAttempt.id)
+    ):
+        quiz.setdefault(lesson_id, {}).setdefault(str(segment_index), int(bool(correct)))
+
+    report.lessons = lessons
+    report.quiz = quiz
+    report.total_xp = sum(e["completed"] for e in lessons.values()) * XP_PER_SEGMENT
+    report.ratio_sum = sum(e["ratio"] for e in lessons.values())
+    report.lesson_count = len(lessons)
+    report.version = (report.version or 0) + 1
+    report.updated_at = datetime.utcnow()
+    return report
+
+
+def apply_progress(session, saved_rows):
+    """
+    进度写入后增量更新汇总：只按变化的课程调整 XP 与比例，不再扫描用户全部进度。
+    saved_rows 为 upsert_progress 返回的行（含 userId/lessonId/currentIndex）。
+    """
+    by_user = {}
+    for row in saved_rows:
+        by_user.setdefault(row["userId"], []).append(row)
+    if not by_user:
+        return
+
+    reports = {
+        r.user_id: r
+        for r in session.query(UserReport)
+        .filter(UserReport.user_id.in_(list(by_user)))
+        .with_for_update()
+    }
+    now = datetime.utcnow()
+    for user_id, rows in by_user.items():
+        report = reports.get(user_id)
+        if report is None:
+            # 尚无汇总（老用户）：直接全量构建，已包含本次写入
+            rebuild_report(session, user_id)
+            continue
+
+        lessons = dict(report.lessons or {})
+        xp_delta = 0
+        for row in rows:
+            old = lessons.get(row["lessonId"])
+            new = _lesson_entry(row["lessonId"], row["currentIndex"])
+            if old:
+                xp_delta += (new["completed"] - old["completed"]) * XP_PER_SEGMENT
+                report.ratio_sum += new["ratio"] - old["ratio"]
+            else:
+                xp_delta += new["completed"] * XP_PER_SEGMENT
+                report.ratio_sum += new["ratio"]
+                report.lesson_count += 1
+            lessons[row["lessonId"]] = new
+
+        report.lessons = lessons
+        report.total_xp += xp_delta
+        report.version += 1
+        report.updated_at = now
+
+
+def apply_quiz(session, attempts):
+    """
+    测验作答写入后增量更新汇总：每道题只记首次作答的对错，重复作答不改变正确率。
+    attempts: [{"user_id", "lesson_id", "segment_index", "correct"}]
+    """
+    by_user = {}
+    for attempt in attempts:
+        by_user.setdefault(attempt["user_id"], []).append(attempt)
+    if not by_user:
+        return
+
+    reports = {
+        r.user_id: r
+        for r in session.query(UserReport)
+        .filter(UserReport.user_id.in_(list(by_user)))
+        .with_for_update()
+    }
+    now = datetime.utcnow()
+    for user_id, rows in by_user.items():
+        report = reports.get(user_id)
+        if report is None:
+            # 全量构建时已包含同一事务中刚写入的作答
+            rebuild_report(session, user_id)
+            continue
+        quiz = {lesson_id: dict(answers) for lesson_id, answers in (report.quiz or {}).items()}
+        for row in rows:
+            quiz.setdefault(row["lesson_id"], {}).setdefault(str(row["segment_index"]), int(bool(row["correct"])))
+        report.quiz = quiz
+        report.version += 1
+        report.updated_at = now
+
+
+def quiz_accuracy(report) -> dict:
+    """各课程测验正确率（0-1），只包含有作答记录的课程"""
+    return {
+        lesson_id: sum(answers.values()) / len(answers)
+        for lesson_id, answers in (report.quiz or {}).items()
+        if answers
+    }
+
+
+def get_report(session, user_id: int, write_session_factory=None):
+    """读取汇总；尚未生成时用 write_session_factory() 取得的会话（缺省为 session）构建并写入"""
+    report = session.get(UserReport, user_id)
+    if report is None:
+        write_session = write_session_factory() if write_session_factory else session
+        report = rebuild_report(write_session, user_id)
+        write_session.flush()
+    return report
+
+
+def report_summary(report) -> dict:
+    scores = {}
+    for lesson_id, entry in (report.lessons or {}).items():
+        scores[lesson_meta(lesson_id)["title"]] = int(entry["ratio"] * 100)
+    accuracy = quiz_accuracy(report)
+    if accuracy:
+        # 有测验作答时按各课程的测验正确率取平均；尚未作答的用户沿用完成度
+        avg = sum(accuracy.values()) / len(accuracy)
+    else:
+        avg = report.ratio_sum / report.lesson_count if report.lesson_count else 0.0
+    return {
+        "scoresByLesson": scores,
+        "accuracyByLesson": {lesson_meta(k)["title"]: int(v * 100) for k, v in accuracy.items()},
+        "totalXp": report.total_xp,
+        "avgAccuracy": round(avg, 2),
+    }
@@ -0,0 +1,84 @@
+import csv
+from datetime import datetime
+
+from sqlalchemy import select
+
+from db import dialect_insert
+from models import User
+from utils.auth import normalize_email
+from utils.hashing import password_hasher
+
+# 返回结果中最多列出的无效行数，避免错误名册撑爆响应
+MAX_REPORTED_ERRORS = 100
+
+
+def _read_row(row: dict):
+    email = normalize_email(row.get("email"))
+    password = (row.get("password") or "").strip()
+    display_name = (row.get("displayName") or row.get("display_name") or row.get("name") or "").strip()
+
+    if not email or "@" not in email:
+        return None, "邮箱无效"
+    if len(password) < 6:
+        return None, "密码长度至少 6 位"
+    return {"email": email, "password": password, "display_name": display_name or email.split("@")[0]}, None
+
+
+def _flush_batch(session, batch, result):
+    # 一次集合查询排除已注册邮箱
+    emails = [item["email"] for item in batch]
+    existing = set(session.scalars(select(User.email).where(User.email.in_(emails))))
+    fresh = [item for item in batch if item["email"] not in existing]
+    result["skipped"] += len(batch) - len(fresh)
+    if not fresh:
+        return
+
+    hashes = password_hasher.hash_many(item["password"] for item in fresh)
+    now = datetime.utcnow()
+    rows = [
+        {
+            "email": item["email"],
+            "display_name": item["display_name"],
+            "password_hash": pwhash,
+            "created_at": now,
+        }
+        for item, pwhash in zip(fresh, hashes)
+    ]
+    # 列表参数走 executemany，一个批次一次往返；查询之后被并发注册的邮箱由 ON CONFLICT 跳过
+    stmt = dialect_insert(session)(User).on_conflict_do_nothing(index_elements=["email"]).returning(User.id)
+    created = len(session.execute(stmt, rows).all())
+    session.commit()
+    result["created"] += created
+    result["skipped"] += len(rows) - created
+
+
+def import_roster(session, text_stream, batch_size: int = 500) -> dict:
+    """
+    流式导入 CSV 名册（表头需包含 email,password，可选 displayName）。
+    按 batch_size 分块：集合查询去重 -> 进程池并行哈希 -> executemany 批量插入，每块单独提交。
+    """
+    result = {"created": 0, "skipped": 0, "invalid": 0, "errors": []}
+    seen = set()
+    batch = []
+
+    reader = csv.DictReader(text_stream)
+    for raw in reader:
+        item, error = _read_row(raw)
+        if error:
+            result["invalid"] += 1
+            if len(result["errors"]) < MAX_REPORTED_ERRORS:
+                # 引号内含换行的字段会跨多行，line_num 为该记录结束的行号
+                result["errors"].append({"line": reader.line_num, "error": error})
+            continue
+        if item["email"] in seen:
+            result["skipped"] += 1
+            continue
+        seen.add(item["email"])
+        batch.append(item)
+        if len(batch) >= batch_size:
+            _flush_batch(session, batch, result)
+            batch = []
+
+    if batch:
+        _flush_batch(session, batch, result)
+    return result
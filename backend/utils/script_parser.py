@@ -0,0 +1,132 @@
+import re
+
+# 段落之间以一个或多个空行分隔（兼容 \r\n 与 \n）
+_PARAGRAPH_SPLIT_RE = re.compile(r'\r?\n\s*\r?\n+')
+_SCENE_RE = re.compile(r'^\s*\[(.*?)\]\s*(.*)$', re.DOTALL)
+# 以 A. / B. / C. 等开头的选项行（允许多种格式）
+_CHOICE_RE = re.compile(r'^\s*([A-Z])\s*[\.：:)\-]?\s*(.+)$', re.IGNORECASE)
+# 答案标注，例如：【答案:B】 或 【答案: B】 或 (答案:B)
+_ANSWER_RES = (
+    re.compile(r'【\s*答案\s*[:：]\s*([A-Z])\s*】', re.IGNORECASE),
+    re.compile(r'\(答案\s*[:：]?\s*([A-Z])\)', re.IGNORECASE),
+)
+
+# 整条答案标注（含前导空白），下发给前端的内容中去掉
+_ANSWER_TAG_RE = re.compile(r'\s*(?:【\s*答案\s*[:：]\s*[A-Z]\s*】|\(答案\s*[:：]?\s*[A-Z]\))', re.IGNORECASE)
+# 正文里直接说出答案，例如 "正确答案是B！"
+_REVEALED_ANSWER_RE = re.compile(r'答案\s*(?:是|为|[:：])\s*[A-Z](?![A-Za-z])', re.IGNORECASE)
+
+# 严格的选项行：大写字母后紧跟分隔符（A. / B、/ C：/ D)），排除 "AI教师：" "Sigmoid…" 这类以字母开头的普通行
+_OPTION_LINE_RE = re.compile(r'^\s*([A-Z])\s*[\.．、:：)）]\s*(\S.*)$')
+
+INTERACTION_KEYWORDS = ('互动提问', '提问', '问题', '选择', 'A.', 'B.', 'C.')
+
+
+def _find_answer(text: str):
+    for pattern in _ANSWER_RES:
+        m = pattern.search(text)
+        if m:
+            return m.group(1).upper()
+    return None
+
+
+def parse_script_segments(content: str):
+    """
+    按空行分段；若段落包含以 A. B. C. 开头的选项，则提取 choices（列表）
+    并尝试解析紧随段落中或下一行的答案标注形式：【答案: X】
+    """
+    segments = []
+    if not content:
+        return segments
+
+    for part in _PARAGRAPH_SPLIT_RE.split(content):
+        text = part.strip()
+        if not text:
+            continue
+
+        scene = ""
+        m = _SCENE_RE.match(text)
+        if m:
+            scene = m.group(1).strip()
+            body = m.group(2).strip()
+        else:
+            body = text
+
+        lines = [ln.strip() for ln in body.splitlines() if ln.strip()]
+        choices = []
+        other_lines = []
+        for ln in lines:
+            cm = _CHOICE_RE.match(ln)
+            if cm:
+                choices.append({'label': cm.group(1).upper(), 'text': cm.group(2).strip().strip('"“”')})
+            else:
+                other_lines.append(ln)
+
+        answer = _find_answer(body)
+        # 如果没有在 body 找到答案，也尝试在 other_lines 的末尾（可能作者在下一行单独标注）
+        if not answer and other_lines:
+            for ol in reversed(other_lines[-2:]):
+                answer = _find_answer(ol)
+                if answer:
+                    break
+
+        segment = {
+            'type': 'dialogue',
+            'scene': scene,
+            'content': body,
+        }
+        if choices:
+            segment['choices'] = choices
+        if answer:
+            segment['answer'] = answer  # 仅服务器端保存，响应给前端时会剥离
+        segments.append(segment)
+
+    return segments
+
+
+def option_choices(segment) -> list:
+    """
+    段落中真正的选择题选项：取第一组至少两行、连续出现且字母从 A 起依次递增（A、B、C…）的选项行，
+    没有时返回空列表。parse_script_segments 的 choices 为宽松匹配（保持旧接口输出不变），
+    课程图与答案索引以这里的结果为准
+    """
+    content = segment.get('content', '') if isinstance(segment, dict) else segment
+    run = []
+    for ln in (content or '').splitlines():
+        m = _OPTION_LINE_RE.match(ln)
+        if m and m.group(1) == chr(ord('A') + len(run)):
+            run.append({'label': m.group(1), 'text': m.group(2).strip().strip('"“”')})
+            continue
+        if len(run) >= 2:
+            return run
+        # 当前行可能是新一组的 A 选项
+        run = [{'label': 'A', 'text': m.group(2).strip().strip('"“”')}] if m and m.group(1) == 'A' else []
+    return run if len(run) >= 2 else []
+
+
+def strip_answer_tags(text: str) -> str:
+    return _ANSWER_TAG_RE.sub('', text or '').strip()
+
+
+def reveals_answer(text: str) -> bool:
+    """去掉答案标注后，正文是否仍直接给出答案（这样的段不能作为测验判题）"""
+    return bool(_REVEALED_ANSWER_RE.search(strip_answer_tags(text)))
+
+
+def is_interaction_point(segment) -> bool:
+    content = segment['content'] if isinstance(segment, dict) else segment
+    return any(keyword in content for keyword in INTERACTION_KEYWORDS)
+
+
+def sanitize_segment_for_client(seg: dict):
+    """将要返回给前端的 segment 剥离敏感字段（如 answer）"""
+    if not isinstance(seg, dict):
+        return seg
+    allowed = {k: v for k, v in seg.items() if k != "answer"}
+    if "content" in allowed:
+        allowed["content"] = strip_answer_tags(allowed["content"])
+    # 确保至少包含基础字段
+    allowed.setdefault("scene", seg.get("scene", ""))
+    allowed.setdefault("content", seg.get("content", ""))
+    allowed.setdefault("type", seg.get("type", "dialogue"))
+    return allowed
@@ -0,0 +1,33 @@
+"""
+启动耗时记录：按阶段（模块导入、建表、剧本预解析等）计时，启动完成后输出一条汇总日志。
+本模块只依赖标准库，需在 app.py 中最先导入，以便覆盖后续导入的耗时。
+"""
+import time
+from contextlib import contextmanager
+
+
+class StartupProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []  # [(名称, 毫秒)]
+        self.ready_ms = None
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, round((time.perf_counter() - started) * 1000, 2)))
+
+    def mark_ready(self):
+        self.ready_ms = round((time.perf_counter() - self.started) * 1000, 2)
+
+    def report(self) -> dict:
+        return {
+            "total_ms": self.ready_ms,
+            "phases": dict(self.phases),
+        }
+
+
+startup = StartupProfile()
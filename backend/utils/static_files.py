@@ -0,0 +1,169 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from flask import Response
+
+# 可选依赖：未安装 brotli 时只提供 gzip 变体
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Vite 构建产物形如 assets/index-Dvq2Nu_D.js，文件名带内容哈希，可永久缓存
+HASHED_ASSET_RE = re.compile(r"^assets/.+[-.][A-Za-z0-9_]{8,}\.[A-Za-z0-9]+$")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+COMPRESSIBLE_TYPES = {
+    "text/html",
+    "text/css",
+    "text/plain",
+    "text/javascript",
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+}
+# 部分系统（如 Windows 注册表）对 .js 的类型登记不可靠，这里固定下来
+MIMETYPE_OVERRIDES = {
+    ".js": "text/javascript",
+    ".mjs": "text/javascript",
+    ".css": "text/css",
+    ".html": "text/html",
+    ".json": "application/json",
+    ".svg": "image/svg+xml",
+}
+MIN_COMPRESS_SIZE = 512
+# 超过该大小的文件不常驻内存（平台前端目前远小于此）
+MAX_INMEMORY_SIZE = 8 * 1024 * 1024
+
+
+class StaticAsset:
+    __slots__ = ("path", "mimetype", "body", "variants", "etag", "cache_control")
+
+    def __init__(self, path, mimetype, body, variants, etag, cache_control):
+        self.path = path
+        self.mimetype = mimetype
+        self.body = body
+        self.variants = variants
+        self.etag = etag
+        self.cache_control = cache_control
+
+
+def _mimetype(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    return MIMETYPE_OVERRIDES.get(ext) or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def _read(path: str):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+class StaticManifest:
+    """
+    启动时扫描前端构建目录（frontend/dist），把文件及其 br/gzip 预压缩变体放入内存。
+    目录中已有的 .br/.gz 文件优先使用，否则在加载时压缩一次。
+    preload=False 时推迟到第一次请求静态资源时再扫描。
+    """
+
+    def __init__(self, root: str, preload: bool = True):
+        self.root = root
+        self.assets = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        if preload:
+            self.load()
+
+    def load(self):
+        assets = {}
+        if os.path.isdir(self.root):
+            for dirpath, _dirs, files in os.walk(self.root):
+                for name in files:
+                    if name.endswith((".gz", ".br")):
+                        continue
+                    full = os.path.join(dirpath, name)
+                    rel = os.path.relpath(full, self.root).replace(os.sep, "/")
+                    asset = self._build_asset(rel, full)
+                    if asset is not None:
+                        assets[rel] = asset
+        self.assets = assets
+        self._loaded = True
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self.load()
+
+    def _build_asset(self, rel: str, full: str):
+        if os.path.getsize(full) > MAX_INMEMORY_SIZE:
+            return None
+        body = _read(full)
+        if body is None:
+            return None
+        mimetype = _mimetype(rel)
+
+        variants = {}
+        if mimetype in COMPRESSIBLE_TYPES and len(body) >= MIN_COMPRESS_SIZE:
+            br = _read(full + ".br")
+            if br is None and brotli is not None:
+                br = brotli.compress(body, quality=11)
+            if br is not None and len(br) < len(body):
+                variants["br"] = br
+            gz = _read(full + ".gz")
+            if gz is None:
+                gz = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(gz) < len(body):
+                variants["gzip"] = gz
+
+        etag = hashlib.sha1(body).hexdigest()[:20]
+        cache_control = IMMUTABLE_CACHE if HASHED_ASSET_RE.match(rel) else REVALIDATE_CACHE
+        return StaticAsset(rel, mimetype, body, variants, etag, cache_control)
+
+    def lookup(self, path: str):
+        """按路径查找；非资源路径回退到 index.html 以支持前端路由"""
+        self._ensure_loaded()
+        path = (path or "index.html").lstrip("/")
+        asset = self.assets.get(path)
+        if asset is not None:
+            return asset
+        if path.startswith("assets/"):
+            return None
+        return self.assets.get("index.html")
+
+    def respond(self, asset: StaticAsset, request):
+        encoding = None
+        if asset.variants:
+            accepted = request.accept_encodings
+            for candidate in ("br", "gzip"):
+                if candidate in asset.variants and accepted[candidate]:
+                    encoding = candidate
+                    break
+
+        body = asset.variants[encoding] if encoding else asset.body
+        resp = Response(body, mimetype=asset.mimetype)
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+        if asset.variants:
+            resp.headers["Vary"] = "Accept-Encoding"
+        resp.headers["Cache-Control"] = asset.cache_control
+        # 不同编码是不同的表示，ETag 需要区分
+        resp.set_etag(f"{asset.etag}-{encoding or 'identity'}")
+        return resp.make_conditional(request)
+
+    def stats(self) -> dict:
+        return {
+            "root": self.root,
+            "loaded": self._loaded,
+            "files": len(self.assets),
+            "bytes": sum(len(a.body) for a in self.assets.values()),
+            "compressed_bytes": sum(len(v) for a in self.assets.values() for v in a.variants.values()),
+        }
@@ -0,0 +1,7 @@
+"""
+生产入口：gunicorn -c gunicorn.conf.py wsgi:app
+导入本模块即完成应用创建、建表与剧本预解析；配合 preload_app 在 master 中执行一次。
+"""
+from app import app
+
+__all__ = ["app"]
@@ -19,23 +19,16 @@ export default function Courses() {
     }
 
     let cancelled = false
-    Promise.all(
-      courses.map(course =>
-        api.get(`/progress/${course.id}`).then(res => ({
-          lessonId: course.id,
-          currentIndex: typeof res.data.currentIndex === 'number' ? res.data.currentIndex : -1
-        })).catch(() => ({
-          lessonId: course.id,
-          currentIndex: -1
-        }))
-      )
-    ).then(results => {
+    const lessonIds = courses.map(course => course.id).join(',')
+    api.get('/progress', { params: { lessons: lessonIds } }).then(res => {
       if (cancelled) return
       const nextMap = {}
-      for (const item of results) {
-        nextMap[item.lessonId] = item.currentIndex
+      for (const item of res.data.progress ?? []) {
+        nextMap[item.lessonId] = typeof item.currentIndex === 'number' ? item.currentIndex : -1
       }
       setProgressMap(nextMap)
+    }).catch(() => {
+      if (!cancelled) setProgressMap({})
     })
 
     return () => {